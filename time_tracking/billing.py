@@ -0,0 +1,183 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from time_tracking.models import Record
+from time_tracking.rows import iterate_chunked
+
+NO_ROUNDING = 'none'
+ROUND_RECORDS = 'record'
+ROUND_DAYS = 'day'
+ROUNDING_CHOICES = [
+    (NO_ROUNDING, 'No rounding'),
+    (ROUND_RECORDS, 'Round every record'),
+    (ROUND_DAYS, 'Round every day'),
+]
+
+CENT = Decimal('0.01')
+
+
+def round_up(seconds, increment):
+    """
+        Round the seconds up to a multiple of the increment (in seconds).
+    """
+    if not increment:
+        return seconds
+    return -(-seconds // increment) * increment
+
+
+def amount(seconds, rate):
+    """
+        Amount billed for the seconds at the hourly rate, in cents.
+    """
+    return (Decimal(seconds) * rate / 3600).quantize(CENT, ROUND_HALF_UP)
+
+
+class BillingReport(object):
+    """
+        Billing report of the closed records of a project that were started
+        between two days (by their start_date, like the project totals).
+
+        lines() yields the records and, after each day, the subtotals of the
+        day per category, in one ordered pass over the records.  The billed
+        time is the tracked time rounded up to the increment (in seconds)
+        per record or per day (rounding), amounts are computed on the day
+        subtotals from the rate of the category or of the project.  Once the
+        lines have been read, subtotals holds the totals per category and
+        total the ones of the report.
+    """
+
+    def __init__(self, project, first_day, last_day, rounding=NO_ROUNDING,
+                 increment=0, using=None, chunk_size=1000):
+        self.project = project
+        self.first_day = first_day
+        self.last_day = last_day
+        self.rounding = rounding
+        self.increment = increment if rounding != NO_ROUNDING else 0
+        self.using = using
+        self.chunk_size = chunk_size
+
+        project_rate = Decimal(project.hourly_rate or 0).quantize(CENT)
+        self.categories = {None: ('', project_rate)}
+        for pk, name, rate in project.category_set.using(using).values_list(
+                'pk', 'name', 'hourly_rate'):
+            self.categories[pk] = (name, project_rate if rate is None
+                                   else Decimal(rate).quantize(CENT))
+
+        self.subtotals = {}
+        self.total = self.new_total('Total', None)
+
+    def new_total(self, name, rate, day=None):
+        """
+            Return an empty subtotal line.
+        """
+        return {'type': 'subtotal', 'day': day, 'category': name,
+                'rate': rate, 'tracked_seconds': 0, 'billed_seconds': 0,
+                'amount': Decimal(0)}
+
+    def add(self, total, line):
+        """
+            Add a day subtotal line to the total.
+        """
+        total['tracked_seconds'] += line['tracked_seconds']
+        total['billed_seconds'] += line['billed_seconds']
+        total['amount'] += line['amount']
+
+    def records(self):
+        """
+            (start_date, start_time, end_time, category, brief_description,
+            duration_seconds) of the records of the report, in the order of
+            their start, read in chunks.
+        """
+        records = Record.objects.using(self.using).filter(
+            project=self.project,
+            start_date__range=(self.first_day, self.last_day)
+        ).exclude(end_time=None)
+        return iterate_chunked(records, ('start_date', 'start_time',
+            'end_time', 'category', 'brief_description', 'duration_seconds'),
+            ('start_date', 'start_time', 'pk'), self.chunk_size)
+
+    def close_day(self, day, totals):
+        """
+            Compute the billed time and amounts of the day, per category,
+            and add them to the totals of the report.
+        """
+        lines = []
+        for category in sorted(totals, key=lambda pk: self.categories[pk][0]):
+            tracked, billed = totals[category]
+            if self.rounding == ROUND_DAYS:
+                billed = round_up(tracked, self.increment)
+
+            name, rate = self.categories[category]
+            line = self.new_total(name, rate, day)
+            line.update({'tracked_seconds': tracked, 'billed_seconds': billed,
+                         'amount': amount(billed, rate)})
+            lines.append(line)
+
+            if category not in self.subtotals:
+                self.subtotals[category] = self.new_total(name, rate)
+            self.add(self.subtotals[category], line)
+            self.add(self.total, line)
+
+        return lines
+
+    def lines(self):
+        """
+            Yield the record lines of the report followed, after each day, by
+            the subtotal lines of the day.
+        """
+        day = None
+        totals = {}
+        for (start_date, start_time, end_time, category, description,
+                duration_seconds) in self.records():
+            if start_date != day:
+                for line in self.close_day(day, totals):
+                    yield line
+                day = start_date
+                totals = {}
+
+            tracked = duration_seconds or 0
+            billed = tracked
+            if self.rounding == ROUND_RECORDS:
+                billed = round_up(tracked, self.increment)
+
+            if category not in self.categories:
+                category = None
+            day_tracked, day_billed = totals.get(category, (0, 0))
+            totals[category] = (day_tracked + tracked, day_billed + billed)
+
+            yield {'type': 'record', 'day': day,
+                   'start_time': start_time,
+                   'end_time': end_time,
+                   'category': self.categories[category][0],
+                   'description': description,
+                   'tracked_seconds': tracked,
+                   'billed_seconds': (billed if self.rounding != ROUND_DAYS
+                                      else None)}
+
+        for line in self.close_day(day, totals):
+            yield line
+
+    def sorted_subtotals(self):
+        """
+            The subtotals per category, by category name.
+        """
+        return sorted(self.subtotals.values(),
+            key=lambda line: line['category'])
@@ -0,0 +1,206 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
+
+
+def timeout():
+    """
+        Number of seconds that cached values are kept.
+    """
+    return getattr(settings, 'TIME_TRACKING_CACHE_SECONDS', 3600)
+
+
+def choices_key(model, project_id):
+    """
+        Cache key of the choices of the model for the project.
+    """
+    return 'time_tracking.choices.%s.%s' % (model._meta.object_name.lower(),
+        project_id)
+
+
+def cached_choices(model, project_id):
+    """
+        Return the (pk, name, slug) of the objects of the model (Category or
+        Location) that belong to the project, from the cache when they are
+        there.
+    """
+    key = choices_key(model, project_id)
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(model.objects.filter(project=project_id).values_list(
+            'pk', 'name', 'slug'))
+        cache.set(key, choices, timeout())
+    return choices
+
+
+def invalidate_choices(model, project_id):
+    """
+        Forget the cached choices of the model for the project.
+    """
+    cache.delete(choices_key(model, project_id))
+
+
+class CachedModelChoiceField(forms.ChoiceField):
+    """
+        Choice of one of the categories or locations of a project, listed
+        from the cached choices.  Submitted values are checked against the
+        same list, the object is built from it without reading the database.
+    """
+
+    def __init__(self, model, project_id, *args, **kwargs):
+        self.model = model
+        self.project_id = project_id
+        choices = cached_choices(model, project_id)
+        self.objects = dict((pk, (name, slug)) for pk, name, slug in choices)
+
+        super(CachedModelChoiceField, self).__init__(*args, **kwargs)
+
+        self.choices = [('', '---------')] + [(pk, name) for pk, name, slug
+            in choices]
+
+    @classmethod
+    def replace(cls, form, name, project_id):
+        """
+            Replace the model choice field of the form with a cached one.
+        """
+        field = form.fields[name]
+        form.fields[name] = cls(field.queryset.model, project_id,
+            required=field.required, label=field.label,
+            help_text=field.help_text)
+
+    def to_python(self, value):
+        """
+            Return the object chosen, or None.
+        """
+        if value in EMPTY_VALUES:
+            return None
+
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            pk = None
+        if pk not in self.objects:
+            raise ValidationError(self.error_messages['invalid_choice'] % {
+                'value': value})
+
+        name, slug = self.objects[pk]
+        return self.model(pk=pk, project_id=self.project_id, name=name,
+            slug=slug)
+
+    def validate(self, value):
+        """
+            The choice has been checked by to_python already.
+        """
+        forms.Field.validate(self, value)
+
+    def prepare_value(self, value):
+        """
+            The initial value can be the object or its pk.
+        """
+        if isinstance(value, self.model):
+            return value.pk
+        return value
+
+
+class CachedChoicesMixin(object):
+    """
+        Mixin for model forms using CachedModelChoiceField, leaving the
+        fields out of the model validation that would look the chosen object
+        up in the database again.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super(CachedChoicesMixin, self)._get_validation_exclusions()
+        return exclude + [name for name, field in self.fields.items()
+                          if isinstance(field, CachedModelChoiceField)]
+
+
+def sidebar_key(project_id):
+    """
+        Cache key of the sidebar menu of the project.
+    """
+    return 'time_tracking.sidebar.%s' % project_id
+
+
+def project_sidebar(project):
+    """
+        Return what the sidebar menu of the project pages shows: the
+        categories and locations of the project (name and url) and its
+        number of open records, from the cache when they are there.
+    """
+    key = sidebar_key(project.pk)
+    sidebar = cache.get(key)
+    if sidebar is None:
+        sidebar = {
+            'categories': [{'name': name, 'url': reverse(
+                'category_detail_view', kwargs={'project_slug': project.slug,
+                    'category_slug': slug})}
+                for name, slug in project.category_set.values_list('name',
+                    'slug')],
+            'locations': [{'name': name, 'url': reverse(
+                'location_detail_view', kwargs={'project_slug': project.slug,
+                    'location_slug': slug})}
+                for name, slug in project.location_set.values_list('name',
+                    'slug')],
+            'open_record_count': project.record_set.filter(
+                end_time=None).count(),
+        }
+        cache.set(key, sidebar, timeout())
+    return sidebar
+
+
+def invalidate_sidebar(project_id):
+    """
+        Forget the cached sidebar menu of the project.
+    """
+    cache.delete(sidebar_key(project_id))
+
+
+def webhooks_key(project_id):
+    """
+        Cache key of the webhooks of the project.
+    """
+    return 'time_tracking.webhook_secrets.%s' % project_id
+
+
+def cached_webhooks(model, project_id):
+    """
+        Return the (url, secret) pairs of the active webhooks (model) of the
+        project, from the cache when they are there.
+    """
+    key = webhooks_key(project_id)
+    pairs = cache.get(key)
+    if pairs is None:
+        pairs = list(model.objects.filter(project=project_id,
+            active=True).values_list('url', 'secret'))
+        cache.set(key, pairs, timeout())
+    return pairs
+
+
+def invalidate_webhooks(project_id):
+    """
+        Forget the cached webhooks of the project.
+    """
+    cache.delete(webhooks_key(project_id))
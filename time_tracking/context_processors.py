@@ -28,7 +28,8 @@ def time_tracker(request):
     return_value = {}
 
     if request.user.is_authenticated():
-        projects = Project.objects.filter(owner=request.user, template=False)
+        projects = Project.objects.filter(owner=request.user, template=False,
+            deleting=False)
         return_value['active_projects'] = projects
         
     return return_value
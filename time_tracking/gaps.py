@@ -0,0 +1,94 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.utils import timezone
+import datetime
+
+from time_tracking.models import Record
+from time_tracking.rows import iterate_chunked
+
+
+def day_bounds(first_day, last_day, time_zone):
+    """
+        Start of the first day and end of the last one in the time zone.
+    """
+    start = timezone.make_aware(datetime.datetime.combine(first_day,
+        datetime.time.min), time_zone)
+    end = timezone.make_aware(datetime.datetime.combine(
+        last_day + datetime.timedelta(days=1), datetime.time.min), time_zone)
+    return start, end
+
+
+def user_intervals(user, first_day, last_day, time_zone, chunk_size=1000):
+    """
+        (start_time, end_time) of the records of all of the projects of the
+        user that overlap the days, in the order of their start, read in
+        chunks.  Open records end now.
+    """
+    start, end = day_bounds(first_day, last_day, time_zone)
+    now = timezone.now()
+
+    records = Record.objects.filter(
+        project__owner=user,
+        project__deleting=False,
+        start_time__lt=end
+    ).exclude(
+        end_time__lte=start
+    )
+
+    for start_time, end_time in iterate_chunked(records,
+            ('start_time', 'end_time'), ('start_time', 'pk'), chunk_size):
+        yield start_time, end_time if end_time is not None else now
+
+
+def find_gaps(intervals, first_day, last_day, time_zone, min_seconds=0):
+    """
+        Yield (start, end) of the untracked time between the records of a
+        day, from the intervals ordered by their start, in a single sweep.
+        Time is untracked when no interval covers it; the time before the
+        first and after the last record of a day isn't a gap.  Gaps shorter
+        than min_seconds are left out.
+    """
+    covered = None
+    for start, end in intervals:
+        if covered is not None and start > covered:
+            day = timezone.localtime(start, time_zone).date()
+            if (timezone.localtime(covered, time_zone).date() == day and
+                    first_day <= day <= last_day and
+                    (start - covered).total_seconds() >= min_seconds):
+                yield covered, start
+
+        if covered is None or end > covered:
+            covered = end
+
+
+def daily_gap_totals(gaps, time_zone):
+    """
+        Return (day, seconds) of the untracked time of every day with gaps,
+        from the gaps ordered by their start.
+    """
+    totals = []
+    for start, end in gaps:
+        day = timezone.localtime(start, time_zone).date()
+        seconds = int((end - start).total_seconds())
+        if totals and totals[-1][0] == day:
+            totals[-1] = (day, totals[-1][1] + seconds)
+        else:
+            totals.append((day, seconds))
+    return totals
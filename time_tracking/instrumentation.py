@@ -0,0 +1,147 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from contextlib import contextmanager
+from time import time
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.util import CursorWrapper
+
+_state = threading.local()
+
+
+class InstrumentedCursor(object):
+    """
+        Cursor wrapper that reports every statement that is executed to the
+        query listeners that are registered for the current thread.
+    """
+
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+
+    def execute(self, sql, params=()):
+        """
+            Execute the statement, timing it when somebody is listening.
+        """
+        listeners = getattr(_state, 'listeners', None)
+        if not listeners:
+            return self.cursor.execute(sql, params)
+
+        start = time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            notify(listeners, self.db, sql, params, time() - start)
+
+    def executemany(self, sql, param_list):
+        """
+            Execute the statement for every set of parameters, timing it when
+            somebody is listening.
+        """
+        listeners = getattr(_state, 'listeners', None)
+        if not listeners:
+            return self.cursor.executemany(sql, param_list)
+
+        start = time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            notify(listeners, self.db, sql, None, time() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+def notify(listeners, connection, sql, params, duration):
+    """
+        Hand the executed statement to the listeners.  A listener that issues
+        statements of its own is not told about them.
+    """
+    _state.listeners = []
+    try:
+        for listener in listeners:
+            listener(connection, sql, params, duration)
+    finally:
+        _state.listeners = listeners
+
+
+def instrument(connection):
+    """
+        Make the connection create instrumented cursors.  The cursor that
+        would otherwise have been created, including the debug cursor that
+        records connection.queries, is wrapped rather than replaced.
+    """
+    if getattr(connection, 'time_tracking_instrumented', False):
+        return
+
+    make_debug_cursor = connection.make_debug_cursor
+    use_debug_cursor = connection.use_debug_cursor
+
+    def make_cursor(cursor):
+        if (use_debug_cursor or
+                (use_debug_cursor is None and settings.DEBUG)):
+            wrapped = make_debug_cursor(cursor)
+        else:
+            wrapped = CursorWrapper(cursor, connection)
+        return InstrumentedCursor(wrapped, connection)
+
+    connection.make_debug_cursor = make_cursor
+    connection.use_debug_cursor = True
+    connection.time_tracking_instrumented = True
+
+
+def add_query_listener(listener):
+    """
+        Call listener(connection, sql, params, duration) for every statement
+        executed by the current thread until it is removed again.
+    """
+    for connection in connections.all():
+        instrument(connection)
+
+    listeners = getattr(_state, 'listeners', None)
+    if listeners is None:
+        listeners = _state.listeners = []
+    listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    """
+        Stop calling the listener for the statements of the current thread.
+    """
+    listeners = getattr(_state, 'listeners', None)
+    if listeners and listener in listeners:
+        listeners.remove(listener)
+
+
+@contextmanager
+def query_listener(listener):
+    """
+        Context manager version of add_query_listener.
+    """
+    add_query_listener(listener)
+    try:
+        yield listener
+    finally:
+        remove_query_listener(listener)
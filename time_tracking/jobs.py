@@ -0,0 +1,270 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import json
+import logging
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from time_tracking.models import Job, send_pending_events
+
+logger = logging.getLogger(__name__)
+
+## Functions that execute the jobs, by job name.
+registry = {}
+
+## Functions returning the number of seconds between runs of the jobs that
+## are enqueued periodically (None to not run them), by job name.
+schedule = {}
+
+
+def job(name):
+    """
+        Decorator registering the function that executes the jobs with the
+        name.  It is called with the Job and the keyword arguments that were
+        given to enqueue.
+    """
+    def decorator(function):
+        registry[name] = function
+        return function
+    return decorator
+
+
+def periodic(name, interval):
+    """
+        Decorator registering the job to be enqueued by the workers every
+        interval() seconds.
+    """
+    def decorator(function):
+        schedule[name] = interval
+        return job(name)(function)
+    return decorator
+
+
+def run_inline():
+    """
+        Whether jobs are executed as soon as they are enqueued, in the
+        thread that enqueued them.  Meant for tests.
+    """
+    return getattr(settings, 'TIME_TRACKING_JOBS_INLINE', False)
+
+
+def enqueue(name, owner=None, **arguments):
+    """
+        Store a job to be executed by the workers and return it.
+    """
+    new_job = Job.objects.create(name=name, owner=owner,
+        arguments=json.dumps(arguments))
+
+    if run_inline():
+        if claim(new_job):
+            execute(new_job)
+    else:
+        workers.wake()
+
+    return new_job
+
+
+def claim(queued_job):
+    """
+        Atomically move the job from queued to running, returning False when
+        another worker got to it first.
+    """
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=queued_job.pk,
+        status=Job.QUEUED).update(status=Job.RUNNING, started=now,
+        heartbeat=now)
+
+    if claimed:
+        queued_job.status = Job.RUNNING
+        queued_job.started = queued_job.heartbeat = now
+    return bool(claimed)
+
+
+def requeue_stale(now=None):
+    """
+        Put the running jobs that haven't reported their progress for
+        longer than TIME_TRACKING_JOB_TIMEOUT_SECONDS back in the queue, the
+        worker that claimed them is assumed to have died along with its
+        process.  Returns the number of requeued jobs.
+    """
+    if now is None:
+        now = timezone.now()
+    seconds = getattr(settings, 'TIME_TRACKING_JOB_TIMEOUT_SECONDS', 3600)
+    cutoff = now - datetime.timedelta(seconds=seconds)
+    requeued = Job.objects.filter(Q(heartbeat__lt=cutoff) |
+        Q(heartbeat=None, started__lt=cutoff), status=Job.RUNNING).update(
+        status=Job.QUEUED, started=None, heartbeat=None)
+    if requeued:
+        logger.warning('Requeued %d stale jobs', requeued)
+    return requeued
+
+
+def claim_next():
+    """
+        Claim the oldest queued job, None when there is nothing to do.
+    """
+    while True:
+        queued = list(Job.objects.filter(status=Job.QUEUED).order_by(
+            'created', 'pk')[:1])
+        if not queued:
+            return None
+        if claim(queued[0]):
+            return queued[0]
+
+
+def execute(running_job):
+    """
+        Execute a claimed job and store the outcome.
+    """
+    ## The job functions register themselves when their module is imported.
+    import time_tracking.tasks
+
+    try:
+        function = registry[running_job.name]
+        arguments = dict((str(key), value) for key, value in
+                         json.loads(running_job.arguments).items())
+        function(running_job, **arguments)
+    except Exception as error:
+        logger.exception('Job %s (%s) failed', running_job.pk,
+            running_job.name)
+        running_job.status = Job.FAILED
+        running_job.message = ('%s' % error)[:255]
+    else:
+        running_job.status = Job.DONE
+
+    running_job.finished = timezone.now()
+    Job.objects.filter(pk=running_job.pk).update(status=running_job.status,
+        message=running_job.message, finished=running_job.finished)
+    send_pending_events()
+
+
+def enqueue_due():
+    """
+        Enqueue the periodic jobs that haven't been enqueued in their
+        interval and aren't waiting or running already.
+    """
+    import time_tracking.tasks
+
+    now = timezone.now()
+    for name, interval in schedule.items():
+        seconds = interval()
+        if seconds is None:
+            continue
+
+        jobs = Job.objects.filter(name=name)
+        if jobs.filter(status__in=(Job.QUEUED, Job.RUNNING)).exists():
+            continue
+        if jobs.filter(created__gt=now - datetime.timedelta(
+                seconds=seconds)).exists():
+            continue
+
+        Job.objects.create(name=name)
+
+
+def run_pending():
+    """
+        Execute queued jobs until there are none left, stale ones included,
+        returning how many were executed.
+    """
+    requeue_stale()
+    count = 0
+    while True:
+        queued_job = claim_next()
+        if queued_job is None:
+            return count
+        execute(queued_job)
+        count += 1
+
+
+class WorkerPool(object):
+    """
+        Threads of the current process that execute the queued jobs.  The
+        database is the queue, the in memory queue only wakes the threads up
+        so that they don't have to wait for the next poll.
+    """
+
+    def __init__(self):
+        self.wakeups = Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+            Start the worker threads unless they are running already.
+        """
+        with self.lock:
+            if self.threads:
+                return
+            count = getattr(settings, 'TIME_TRACKING_JOB_WORKERS', 2)
+            for index in range(count):
+                thread = threading.Thread(target=self.work,
+                    name='time_tracking-job-worker-%d' % index)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def wake(self):
+        """
+            Let a worker know that there is a new job.
+        """
+        self.start()
+        self.wakeups.put(None)
+
+    def work(self):
+        """
+            Main loop of a worker thread.
+        """
+        poll_seconds = getattr(settings, 'TIME_TRACKING_JOB_POLL_SECONDS', 5)
+        while True:
+            try:
+                enqueue_due()
+                run_pending()
+            except Exception:
+                logger.exception('Job worker failed')
+            finally:
+                for connection in connections.all():
+                    connection.close()
+
+            try:
+                self.wakeups.get(timeout=poll_seconds)
+            except Empty:
+                pass
+
+
+workers = WorkerPool()
+
+
+def start_workers():
+    """
+        Start the worker threads of this process, unless the jobs are
+        executed inline or left to the run_jobs command.
+    """
+    if not run_inline() and getattr(settings, 'TIME_TRACKING_JOB_WORKERS', 2):
+        workers.start()
@@ -0,0 +1,398 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import re
+import sys
+import threading
+import time
+
+try:
+    from queue import Queue, Empty
+    from http import client as http_client, cookies as http_cookies
+    import socketserver
+except ImportError:
+    from Queue import Queue, Empty
+    import httplib as http_client
+    import Cookie as http_cookies
+    import SocketServer as socketserver
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import WSGIServer, WSGIRequestHandler
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.core.signals import got_request_exception
+from django.core.urlresolvers import reverse
+from django.db import DatabaseError, close_connection
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.utils.importlib import import_module
+
+from time_tracking.models import Project, Record, Category, Location
+
+CSRF_INPUT = re.compile(
+    r'''name=['"]csrfmiddlewaretoken['"]\s+value=['"]([^'"]+)['"]''')
+
+## Actions of a scenario, in the order they are run.
+ACTIONS = ('create_form', 'create', 'edit_form', 'edit', 'close')
+
+
+def percentile(values, fraction):
+    """
+        Nearest rank percentile of the sorted values.
+    """
+    if not values:
+        return None
+    index = max(int(-(-len(values) * fraction // 1)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def is_lock_error(error):
+    """
+        True when the exception comes from the database waiting on a lock
+        (sqlite's database is locked, deadlocks and lock wait timeouts).
+    """
+    return isinstance(error, DatabaseError) and 'lock' in str(error).lower()
+
+
+def set_cookie_headers(response):
+    """
+        Values of the Set-Cookie headers of the response, one per cookie.
+    """
+    if hasattr(response.msg, 'get_all'):
+        return response.msg.get_all('Set-Cookie') or []
+    return [header.split(':', 1)[1].strip() for header in
+            response.msg.getallmatchingheaders('Set-Cookie')]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+        Request handler that doesn't log every request.
+    """
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedServer(socketserver.ThreadingMixIn, WSGIServer):
+    """
+        WSGI server handling every request in a thread of its own.
+    """
+    daemon_threads = True
+
+
+class LoadTestServer(object):
+    """
+        Serves the site from a local threaded WSGI server, on a free port
+        unless one is given, counting the requests that failed on a
+        database lock.
+    """
+
+    def __init__(self, port=0):
+        self.httpd = ThreadedServer(('127.0.0.1', port), QuietRequestHandler)
+        self.httpd.set_app(get_internal_wsgi_application())
+        self.port = self.httpd.server_port
+        self.lock_errors = 0
+        self.other_errors = 0
+        self.errors_lock = threading.Lock()
+
+    def count_exception(self, sender, **kwargs):
+        """
+            Receiver of got_request_exception.
+        """
+        with self.errors_lock:
+            if is_lock_error(sys.exc_info()[1]):
+                self.lock_errors += 1
+            else:
+                self.other_errors += 1
+
+    def start(self):
+        got_request_exception.connect(self.count_exception)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        got_request_exception.disconnect(self.count_exception)
+
+
+class LoadTestClient(object):
+    """
+        Browser of a user: keeps the session cookie and the CSRF token
+        across requests, and times every request.
+    """
+
+    def __init__(self, port, session_key, results):
+        self.port = port
+        self.cookies = {settings.SESSION_COOKIE_NAME: session_key}
+        self.csrf_token = None
+        self.results = results
+
+    def request(self, action, method, path, data=None, expect=(200, 302)):
+        """
+            Send the request and return the body of the response, or None
+            when it hasn't got one of the expected statuses.
+        """
+        headers = {'Cookie': '; '.join('%s=%s' % item
+                                       for item in self.cookies.items())}
+        body = None
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.csrf_token or
+                        self.cookies.get(settings.CSRF_COOKIE_NAME, ''))
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        start = time.time()
+        connection = http_client.HTTPConnection('127.0.0.1', self.port,
+            timeout=60)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+            status = response.status
+            set_cookies = set_cookie_headers(response)
+        except (IOError, http_client.HTTPException):
+            content, status, set_cookies = None, None, []
+        finally:
+            connection.close()
+        self.results.add(action, time.time() - start, status in expect)
+
+        for header in set_cookies:
+            cookie = http_cookies.SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+
+        if status not in expect:
+            return None
+
+        content = content.decode('utf-8', 'replace')
+        match = CSRF_INPUT.search(content)
+        if match:
+            self.csrf_token = match.group(1)
+        return content
+
+
+class LoadTestResults(object):
+    """
+        Latencies and failures of the requests, per action.
+    """
+
+    def __init__(self):
+        self.latencies = dict((action, []) for action in ACTIONS)
+        self.failures = dict((action, 0) for action in ACTIONS)
+        self.lock = threading.Lock()
+        self.elapsed = 0
+
+    def add(self, action, seconds, ok):
+        with self.lock:
+            self.latencies[action].append(seconds)
+            if not ok:
+                self.failures[action] += 1
+
+    def requests(self):
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def throughput(self):
+        """
+            Requests per second.
+        """
+        return self.requests() / float(self.elapsed) if self.elapsed else 0
+
+    def summary(self):
+        """
+            (action, requests, failures, p50, p90, p99, max) of every action
+            and of all of them, latencies in seconds.
+        """
+        rows = []
+        everything = []
+        for action in ACTIONS:
+            latencies = sorted(self.latencies[action])
+            everything.extend(latencies)
+            rows.append(self.row(action, latencies, self.failures[action]))
+        rows.append(self.row('total', sorted(everything),
+            sum(self.failures.values())))
+        return rows
+
+    def row(self, name, latencies, failures):
+        return (name, len(latencies), failures, percentile(latencies, 0.5),
+                percentile(latencies, 0.9), percentile(latencies, 0.99),
+                latencies[-1] if latencies else None)
+
+
+class LoadTest(object):
+    """
+        Simulates users creating, editing and closing records at the same
+        time through the record views, each user from a thread of its own
+        against a local server.  Every user gets an account and a project of
+        its own, which are deleted afterwards unless keep is set.  Accounts
+        left by an earlier run are only reused with keep, as they may not
+        be load test accounts.
+    """
+    USERNAME = 'load-test-%d'
+
+    def __init__(self, users=10, iterations=10, port=0, keep=False):
+        self.users = users
+        self.iterations = iterations
+        self.port = port
+        self.keep = keep
+        self.results = LoadTestResults()
+        self.accounts = []
+        self.created_users = []
+
+    def set_up(self):
+        """
+            Create the users, their projects and their sessions.  Raise
+            ValueError when some of the users exist already, unless keep is
+            set.
+        """
+        usernames = [self.USERNAME % index for index in range(self.users)]
+        existing = sorted(User.objects.filter(
+            username__in=usernames).values_list('username', flat=True))
+        if existing and not self.keep:
+            raise ValueError('%s already exist, run with keep to reuse '
+                'them' % ', '.join(existing))
+
+        engine = import_module(settings.SESSION_ENGINE)
+        for username in usernames:
+            user, created = User.objects.get_or_create(username=username)
+            if created:
+                self.created_users.append(user)
+            project, created = Project.objects.get_or_create(owner=user,
+                slug='load-test', defaults={'name': 'Load Test'})
+            category, created = Category.objects.get_or_create(
+                project=project, slug='load-test',
+                defaults={'name': 'Load Test'})
+            location, created = Location.objects.get_or_create(
+                project=project, slug='load-test',
+                defaults={'name': 'Load Test'})
+
+            session = engine.SessionStore()
+            session[SESSION_KEY] = user.pk
+            session[BACKEND_SESSION_KEY] = \
+                'django.contrib.auth.backends.ModelBackend'
+            session.save()
+            self.accounts.append((project, category, location,
+                                  session.session_key))
+
+    def tear_down(self):
+        """
+            Delete the sessions, and the users created by this run along
+            with their projects unless keep is set.
+        """
+        engine = import_module(settings.SESSION_ENGINE)
+        for project, category, location, session_key in self.accounts:
+            engine.SessionStore(session_key).delete()
+        if not self.keep:
+            for user in self.created_users:
+                for project in Project.objects.filter(owner=user):
+                    project.delete_in_chunks()
+                user.delete()
+        self.accounts = []
+        self.created_users = []
+
+    def record_data(self, category, location, description):
+        now = timezone.localtime(timezone.now())
+        return {'start_time_0': now.strftime('%Y-%m-%d'),
+                'start_time_1': now.strftime('%H:%M:%S'),
+                'start_time_tz': settings.TIME_ZONE,
+                'end_time_0': '', 'end_time_1': '', 'end_time_tz': '',
+                'brief_description': description, 'category': category.pk,
+                'location': location.pk, 'description': ''}
+
+    def scenario(self, number):
+        """
+            Run the iterations of a user: fetch the form and create a record,
+            fetch the form and edit it, and close it.
+        """
+        project, category, location, session_key = self.accounts[number]
+        client = LoadTestClient(self.server.port, session_key, self.results)
+        kwargs = {'project_slug': project.slug}
+
+        for iteration in range(self.iterations):
+            description = 'Load test %d.%d' % (number, iteration)
+            path = reverse('record_create_view', kwargs=kwargs)
+            if client.request('create_form', 'GET', path) is None:
+                continue
+            if client.request('create', 'POST', path, self.record_data(
+                    category, location, description), expect=(302,)) is None:
+                continue
+
+            pk = Record.objects.filter(project=project,
+                brief_description=description).values_list('pk',
+                flat=True)[0]
+            kwargs['pk'] = pk
+            path = reverse('record_edit_view', kwargs=kwargs)
+            if client.request('edit_form', 'GET', path) is not None:
+                client.request('edit', 'POST', path, self.record_data(
+                    category, location, description + ' (edited)'),
+                    expect=(302,))
+            client.request('close', 'GET', reverse('record_close_view',
+                kwargs=kwargs), expect=(302,))
+            del kwargs['pk']
+
+    def work(self, numbers):
+        """
+            Main loop of a client thread, running the scenarios of the users
+            left in the queue.
+        """
+        while True:
+            try:
+                number = numbers.get_nowait()
+            except Empty:
+                return
+            try:
+                self.scenario(number)
+            finally:
+                close_connection()
+
+    def run(self, threads=None):
+        """
+            Run the scenarios of all of the users on a pool of client threads
+            (a thread per user unless given) and return the results.
+        """
+        try:
+            self.set_up()
+        except Exception:
+            self.tear_down()
+            raise
+        self.server = LoadTestServer(self.port)
+        self.server.start()
+        try:
+            numbers = Queue()
+            for number in range(self.users):
+                numbers.put(number)
+
+            start = time.time()
+            pool = [threading.Thread(target=self.work, args=(numbers, ))
+                    for index in range(threads or self.users)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            self.results.elapsed = time.time() - start
+        finally:
+            self.server.stop()
+            self.tear_down()
+
+        self.results.lock_errors = self.server.lock_errors
+        self.results.other_errors = self.server.other_errors
+        return self.results
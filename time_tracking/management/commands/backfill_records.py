@@ -0,0 +1,71 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from time_tracking.models import Record
+
+
+class Command(BaseCommand):
+    """
+        Computes the derived columns of the records that were stored before
+        the columns existed (see Record.derived_values).  The records are
+        processed in batches by primary key, each batch in a transaction of
+        its own, so the command can be interrupted and run again.
+    """
+    help = 'Fill in the derived columns of existing records.'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+            default=1000,
+            help='Number of records handled per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        """
+            Walk the records in primary key order and update the ones whose
+            derived columns are out of date.
+        """
+        batch_size = options['batch_size']
+        derived = sorted(Record().derived_values())
+        fields = ['pk', 'start_time', 'start_time_tz', 'end_time'] + derived
+
+        last_pk = 0
+        checked = updated = 0
+        while True:
+            rows = list(Record.objects.filter(pk__gt=last_pk).order_by(
+                'pk').values(*fields)[:batch_size])
+            if not rows:
+                break
+
+            with transaction.commit_on_success():
+                for row in rows:
+                    values = Record(start_time=row['start_time'],
+                        start_time_tz=row['start_time_tz'],
+                        end_time=row['end_time']).derived_values()
+                    if any(row[name] != values[name] for name in derived):
+                        Record.objects.filter(pk=row['pk']).update(**values)
+                        updated += 1
+
+            checked += len(rows)
+            last_pk = rows[-1]['pk']
+            self.stdout.write('%d records checked, %d updated' % (checked,
+                updated))
@@ -0,0 +1,44 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from time_tracking.tasks import close_stale_records
+
+
+class Command(BaseCommand):
+    """
+        Closes the records that have been left open for longer than the
+        threshold of their project.
+    """
+    help = 'Cap records that have been open for too long.'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size',
+            default=1000,
+            help='Number of records updated per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        """
+            Cap the stale records of every project.
+        """
+        capped = close_stale_records(chunk_size=options['chunk_size'])
+        self.stdout.write('Capped %d stale records' % capped)
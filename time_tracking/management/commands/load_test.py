@@ -0,0 +1,75 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from time_tracking.loadtest import LoadTest
+
+
+def milliseconds(seconds):
+    return '-' if seconds is None else '%.1f' % (seconds * 1000)
+
+
+class Command(BaseCommand):
+    """
+        Simulates users creating, editing and closing records at the same
+        time, and reports the throughput, the latencies and the database
+        lock errors.
+    """
+    help = 'Load test the record views from concurrent users.'
+    option_list = BaseCommand.option_list + (
+        make_option('--users', type='int', dest='users', default=10,
+            help='Number of simulated users.'),
+        make_option('--iterations', type='int', dest='iterations',
+            default=10,
+            help='Number of records created, edited and closed per user.'),
+        make_option('--threads', type='int', dest='threads', default=None,
+            help='Number of client threads, one per user by default.'),
+        make_option('--port', type='int', dest='port', default=0,
+            help='Port of the local server, a free one by default.'),
+        make_option('--keep', action='store_true', dest='keep',
+            default=False,
+            help='Keep the users, projects and records that were created, '
+                'and reuse the ones left by an earlier run.'),
+    )
+
+    def handle(self, *args, **options):
+        """
+            Run the load test and print its results.
+        """
+        try:
+            results = LoadTest(users=options['users'],
+                iterations=options['iterations'], port=options['port'],
+                keep=options['keep']).run(threads=options['threads'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write('%d requests in %.1f s, %.1f requests per second' % (
+            results.requests(), results.elapsed, results.throughput()))
+        self.stdout.write('%d database lock errors, %d other errors' % (
+            results.lock_errors, results.other_errors))
+        self.stdout.write('%-12s %8s %8s %8s %8s %8s %8s' % ('action',
+            'requests', 'failures', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+        for name, requests, failures, p50, p90, p99, slowest in \
+                results.summary():
+            self.stdout.write('%-12s %8d %8d %8s %8s %8s %8s' % (name,
+                requests, failures, milliseconds(p50), milliseconds(p90),
+                milliseconds(p99), milliseconds(slowest)))
@@ -0,0 +1,74 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from time_tracking.models import Project, Record, DescriptionSuggestion
+
+
+class Command(BaseCommand):
+    """
+        Rebuilds the brief description frequency table of every project from
+        the records that are already stored.
+    """
+    help = 'Rebuild the brief description autocomplete suggestions.'
+
+    def handle(self, *args, **options):
+        """
+            Replace the suggestions of each project with one grouped query
+            over its records.
+        """
+        for project in Project.objects.all():
+            uses = Record.objects.filter(
+                project=project
+            ).exclude(
+                brief_description=''
+            ).values(
+                'brief_description'
+            ).annotate(
+                use_count=Count('pk'), last_used=Max('start_time')
+            ).order_by()
+
+            ## Descriptions that only differ in surrounding white space are
+            ## counted together, the same way DescriptionSuggestion does.
+            suggestions = {}
+            for use in uses:
+                text = use['brief_description'].strip()
+                if not text:
+                    continue
+                if text in suggestions:
+                    suggestion = suggestions[text]
+                    suggestion.use_count += use['use_count']
+                    suggestion.last_used = max(suggestion.last_used,
+                        use['last_used'])
+                else:
+                    suggestions[text] = DescriptionSuggestion(
+                        project=project, text=text, key=text.lower(),
+                        use_count=use['use_count'],
+                        last_used=use['last_used'])
+
+            with transaction.commit_on_success():
+                DescriptionSuggestion.objects.filter(project=project).delete()
+                DescriptionSuggestion.objects.bulk_create(
+                    list(suggestions.values()))
+
+            self.stdout.write('%s: %d suggestions\n' % (project,
+                len(suggestions)))
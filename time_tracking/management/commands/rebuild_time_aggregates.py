@@ -0,0 +1,42 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.core.management.base import BaseCommand
+
+from time_tracking.models import Project, TimeAggregate, DurationBucket
+
+
+class Command(BaseCommand):
+    """
+        Rebuilds the precomputed totals and duration sketches of every
+        project from the records that are already stored.
+    """
+    help = 'Rebuild the time totals and duration sketches.'
+
+    def handle(self, *args, **options):
+        """
+            Replace the totals and sketches of each project with grouped
+            queries over its records.
+        """
+        for project in Project.objects.filter(deleting=False):
+            TimeAggregate.objects.rebuild(project)
+            DurationBucket.objects.rebuild(project)
+            self.stdout.write('%s: %d totals, %d sketch buckets\n' % (
+                project, TimeAggregate.objects.filter(project=project).count(),
+                DurationBucket.objects.filter(project=project).count()))
@@ -0,0 +1,54 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+
+from time_tracking import jobs
+
+
+class Command(BaseCommand):
+    """
+        Executes the queued time_tracking jobs, for deployments that would
+        rather run them in a separate process than in the web server.
+    """
+    help = 'Execute queued time_tracking jobs.'
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once',
+            default=False,
+            help='Exit once there are no queued jobs left.'),
+        make_option('--poll', type='int', dest='poll', default=5,
+            help='Seconds to wait between looking for new jobs.'),
+    )
+
+    def handle(self, *args, **options):
+        """
+            Execute the queued jobs, along with the periodic jobs that are
+            due, polling for new ones unless --once is given.
+        """
+        while True:
+            jobs.enqueue_due()
+            count = jobs.run_pending()
+            if count:
+                self.stdout.write('Executed %d jobs' % count)
+            if options['once']:
+                return
+            time.sleep(options['poll'])
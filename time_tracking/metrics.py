@@ -0,0 +1,198 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from bisect import bisect_left
+import threading
+
+
+## Upper bounds of the histogram buckets for durations (seconds) and for the
+## number of SQL queries issued by a view.
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+## The metrics that are recorded per view: name, help text and buckets.
+VIEW_METRICS = (
+    ('view_seconds', 'Wall time spent handling the view.', SECONDS_BUCKETS),
+    ('sql_queries', 'Number of SQL queries issued by the view.',
+        QUERY_BUCKETS),
+    ('sql_seconds', 'Time spent executing SQL queries.', SECONDS_BUCKETS),
+    ('template_seconds', 'Time spent rendering the template.',
+        SECONDS_BUCKETS),
+)
+
+METRIC_BUCKETS = dict((metric, buckets) for metric, _, buckets in VIEW_METRICS)
+
+
+class Histogram(object):
+    """
+        Fixed bucket histogram that can be shared between threads.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """
+            Add a value to the histogram.
+        """
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative_counts(self):
+        """
+            Return (upper bound, count of values <= upper bound) pairs, the
+            last upper bound being infinity.
+        """
+        with self.lock:
+            counts = list(self.counts)
+
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def mean(self):
+        """
+            Average of the values that have been observed.
+        """
+        if not self.count:
+            return 0.0
+        return self.sum / self.count
+
+    def quantile(self, q):
+        """
+            Estimate the q quantile by interpolating within the bucket that
+            contains it.
+        """
+        cumulative = self.cumulative_counts()
+        total = cumulative[-1][1]
+        if not total:
+            return 0.0
+
+        rank = q * total
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in cumulative:
+            if count >= rank:
+                if bound == float('inf'):
+                    return lower_bound
+                if count == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (
+                    (rank - lower_count) / float(count - lower_count))
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+
+class ViewMetrics(object):
+    """
+        In process store of the histograms for each of the VIEW_METRICS,
+        keyed by the name of the url that was requested.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, metric, view_name):
+        """
+            Return the histogram of the metric for the view, creating it on
+            first use.
+        """
+        key = (metric, view_name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = Histogram(METRIC_BUCKETS[metric])
+                    self.histograms[key] = histogram
+        return histogram
+
+    def observe(self, view_name, **values):
+        """
+            Record the measured metric values of a single request.
+        """
+        for metric, value in values.items():
+            self.histogram(metric, view_name).observe(value)
+
+    def view_names(self):
+        """
+            Names of the views that have been measured.
+        """
+        return sorted(set(view_name for _, view_name in self.histograms))
+
+    def summary(self):
+        """
+            Per view summary of the metrics for the stats page.
+        """
+        views = []
+        for view_name in self.view_names():
+            row = {'name': view_name}
+            for metric, _, _ in VIEW_METRICS:
+                histogram = self.histogram(metric, view_name)
+                row[metric] = {
+                    'count': histogram.count,
+                    'mean': histogram.mean(),
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                }
+            views.append(row)
+        return views
+
+    def prometheus(self):
+        """
+            Render the histograms in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric, help_text, _ in VIEW_METRICS:
+            name = 'time_tracking_%s' % metric
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s histogram' % name)
+            for view_name in self.view_names():
+                histogram = self.histogram(metric, view_name)
+                for bound, count in histogram.cumulative_counts():
+                    if bound == float('inf'):
+                        bound = '+Inf'
+                    lines.append('%s_bucket{view="%s",le="%s"} %d' % (
+                        name, view_name, bound, count))
+                lines.append('%s_sum{view="%s"} %r' % (name, view_name,
+                    histogram.sum))
+                lines.append('%s_count{view="%s"} %d' % (name, view_name,
+                    histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+            Forget everything that has been measured.
+        """
+        with self.lock:
+            self.histograms = {}
+
+
+view_metrics = ViewMetrics()
@@ -0,0 +1,241 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from time import time
+import threading
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from time_tracking.instrumentation import add_query_listener
+from time_tracking.instrumentation import remove_query_listener
+from time_tracking.metrics import view_metrics
+from time_tracking import slow_queries
+from time_tracking import routers
+from time_tracking import jobs
+
+_state = threading.local()
+
+
+def time_tracking_url_names():
+    """
+        Names of the urls that are defined by time_tracking.urls.
+    """
+    from time_tracking.urls import urlpatterns
+    return set(pattern.name for pattern in urlpatterns
+               if getattr(pattern, 'name', None))
+
+
+class ViewMeasurement(object):
+    """
+        Measurements of a single request to a time_tracking view.
+    """
+
+    def __init__(self, view_name):
+        self.view_name = view_name
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_start = None
+        self.start = time()
+        add_query_listener(self.query_executed)
+
+    def query_executed(self, connection, sql, params, duration):
+        """
+            Query listener counting the statements and their time.
+        """
+        self.sql_queries += 1
+        self.sql_seconds += duration
+
+    def template_started(self):
+        """
+            Called when the template response is about to be rendered.
+        """
+        self.template_start = time()
+
+    def template_rendered(self, response):
+        """
+            Post render callback of the template response.
+        """
+        if self.template_start is not None:
+            self.template_seconds += time() - self.template_start
+            self.template_start = None
+
+    def stop(self):
+        """
+            Stop listening to queries.
+        """
+        remove_query_listener(self.query_executed)
+
+    def finish(self):
+        """
+            Stop measuring and add the values to the view histograms.
+        """
+        self.stop()
+        view_metrics.observe(self.view_name,
+            view_seconds=time() - self.start,
+            sql_queries=self.sql_queries,
+            sql_seconds=self.sql_seconds,
+            template_seconds=self.template_seconds)
+
+
+class ViewMetricsMiddleware(object):
+    """
+        Records the wall time, SQL query count, SQL time and template render
+        time of every request to a named time_tracking url.  Only installed
+        when settings.TIME_TRACKING_METRICS is set, otherwise django drops the
+        middleware and there is no overhead at all.
+    """
+
+    def __init__(self):
+        if not getattr(settings, 'TIME_TRACKING_METRICS', False):
+            raise MiddlewareNotUsed()
+        self.url_names = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+            Start measuring when the view belongs to time_tracking.
+        """
+        ## A measurement that was never finished belongs to a request that
+        ## did not make it to process_response.
+        stale = getattr(_state, 'measurement', None)
+        if stale is not None:
+            stale.stop()
+            _state.measurement = None
+
+        if self.url_names is None:
+            self.url_names = time_tracking_url_names()
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.url_name not in self.url_names:
+            return None
+
+        _state.measurement = ViewMeasurement(match.url_name)
+        return None
+
+    def process_template_response(self, request, response):
+        """
+            Time the rendering of the template response.
+        """
+        measurement = getattr(_state, 'measurement', None)
+        if measurement is not None:
+            measurement.template_started()
+            response.add_post_render_callback(measurement.template_rendered)
+        return response
+
+    def process_response(self, request, response):
+        """
+            Finish the measurement of the request.
+        """
+        measurement = getattr(_state, 'measurement', None)
+        if measurement is not None:
+            _state.measurement = None
+            measurement.finish()
+        return response
+
+
+class SlowQueryMiddleware(object):
+    """
+        Debugging aid that captures the statements of the time_tracking views
+        that take longer than settings.TIME_TRACKING_SLOW_QUERY_MS, together
+        with their query plan.  Removes itself when the setting is not
+        defined.
+    """
+
+    def __init__(self):
+        if slow_queries.threshold_ms() is None:
+            raise MiddlewareNotUsed()
+        self.url_names = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+            Start capturing under the name of the time_tracking url.
+        """
+        slow_queries.reset_capturing()
+
+        if self.url_names is None:
+            self.url_names = time_tracking_url_names()
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name in self.url_names:
+            slow_queries.start_capturing(match.url_name)
+        return None
+
+    def process_response(self, request, response):
+        """
+            Stop capturing once the response has been rendered.
+        """
+        slow_queries.reset_capturing()
+        return response
+
+
+class ReplicaRouterMiddleware(object):
+    """
+        Lets the views marked with routers.reporting_view read from the
+        replica.  Requests that write, and the requests of the same client for
+        settings.TIME_TRACKING_REPLICA_PIN_SECONDS after that, read from the
+        primary so that users always see their own changes.
+    """
+    cookie_name = 'time_tracking_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self):
+        if routers.replica_database() is None:
+            raise MiddlewareNotUsed()
+
+    def process_request(self, request):
+        """
+            Forget the state of a previous request of the thread.
+        """
+        routers.stop_reporting()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+            Start reporting for the marked views.
+        """
+        if getattr(view_func, 'reads_from_replica', False):
+            routers.start_reporting(pinned=(
+                request.method not in self.safe_methods or
+                self.cookie_name in request.COOKIES))
+        return None
+
+    def process_response(self, request, response):
+        """
+            Pin the client to the primary for a while after it has written.
+        """
+        if request.method not in self.safe_methods or routers.is_pinned():
+            if self.cookie_name not in request.COOKIES:
+                response.set_cookie(self.cookie_name, '1',
+                    max_age=getattr(settings,
+                        'TIME_TRACKING_REPLICA_PIN_SECONDS', 10),
+                    httponly=True)
+        routers.stop_reporting()
+        return response
+
+
+class JobWorkerMiddleware(object):
+    """
+        Starts the job workers along with the web server, so that the periodic
+        jobs run without waiting for a job to be enqueued.  Removes itself
+        right away, it has nothing to do for the requests.
+    """
+
+    def __init__(self):
+        jobs.start_workers()
+        raise MiddlewareNotUsed()
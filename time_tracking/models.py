@@ -17,11 +17,51 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from django.db import models
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import F, Count, Max, Min, Sum
+from django.db.models.sql import DeleteQuery
+from django.db.models.signals import post_init, pre_save, post_save
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
+from django.core.validators import MinValueValidator
 from django.utils import timezone
+from django.utils.crypto import get_random_string
+from time_tracking.signals import records_closed
+from time_tracking.caching import invalidate_choices, invalidate_sidebar
+from time_tracking.caching import cached_webhooks, invalidate_webhooks
+from time_tracking import webhooks
+from time_tracking.sketches import DurationSketch
+import datetime
+import json
 import pytz
+import threading
+
+
+class ProjectManager(models.Manager):
+    """
+        Manager providing the projects along with the totals of their
+        records.
+    """
+
+    def with_totals(self):
+        """
+            Annotate each project with total_seconds of the closed records,
+            the record_count, closed_record_count and the last start and end
+            time of its records (see Project.open_record_count and
+            Project.last_activity), in a single query.
+        """
+        return self.get_query_set().annotate(
+            total_seconds=Sum('record__duration_seconds'),
+            record_count=Count('record'),
+            closed_record_count=Count('record__end_time'),
+            last_start=Max('record__start_time'),
+            last_end=Max('record__end_time'),
+        )
 
 
 class Project(models.Model):
@@ -34,11 +74,104 @@ class Project(models.Model):
     slug = models.SlugField(editable=False)
     template = models.BooleanField(default=False)
     description = models.TextField(blank=True, default="")
+    deleting = models.BooleanField(default=False, editable=False)
+    stale_record_hours = models.PositiveIntegerField(null=True, blank=True,
+        validators=[MinValueValidator(1)],
+        help_text='Open records older than this many hours are closed '
+                  'automatically.')
+    hourly_rate = models.DecimalField(max_digits=10, decimal_places=2,
+        null=True, blank=True,
+        help_text='Rate billed for the categories without their own.')
+
+    objects = ProjectManager()
 
     class Meta:
         unique_together = (('slug', 'owner'),)
         ordering = ['name']
 
+    def open_record_count(self):
+        """
+            Number of records of the project that haven't been closed, for
+            projects that were fetched with Project.objects.with_totals().
+        """
+        return (getattr(self, 'record_count', 0) -
+                getattr(self, 'closed_record_count', 0))
+
+    def last_activity(self):
+        """
+            Most recent start or end time of the records of the project, for
+            projects that were fetched with Project.objects.with_totals().
+        """
+        times = [time for time in (getattr(self, 'last_start', None),
+                                   getattr(self, 'last_end', None)) if time]
+        if times:
+            return max(times)
+        return None
+
+    def mark_deleting(self):
+        """
+            Hide the project until delete_in_chunks has removed it.  The slug
+            is replaced with one that slugify can not produce, so that its
+            urls stop working and a new project can take the name right away.
+        """
+        self.deleting = True
+        self.slug = '~deleting-%d' % self.pk
+        Project.objects.filter(pk=self.pk).update(deleting=self.deleting,
+            slug=self.slug)
+        Change.objects.log([self], Change.DELETE)
+
+    def delete_in_chunks(self, chunk_size=1000, progress=None):
+        """
+            Delete the project by removing its records, the tables derived
+            from them, its budgets, webhooks, categories and locations
+            chunk_size rows at a time, each chunk in a transaction of its
+            own.  Unlike delete(), this never holds more than a chunk in
+            memory or locks the tables for longer than a chunk takes, and
+            the final delete of the project has nothing left to cascade to.
+
+            The records are deleted without the cascade collector and without
+            sending the delete signals.  Their receivers would only update
+            the time aggregates and duration buckets, which are deleted
+            right after them, invalidate the sidebar, which the deletion of
+            the project does, log changes, which the deletion logged by
+            mark_deleting stands for, and post webhook events, which are
+            not posted for the records of a deleted project.  progress is
+            called with the number of rows deleted so far and the total.
+        """
+        querysets = (
+            Record.objects.filter(project=self),
+            TimeAggregate.objects.filter(project=self),
+            DurationBucket.objects.filter(project=self),
+            DescriptionSuggestion.objects.filter(project=self),
+            BudgetCrossing.objects.filter(budget__project=self),
+            Budget.objects.filter(project=self),
+            Webhook.objects.filter(project=self),
+            Category.objects.filter(project=self),
+            Location.objects.filter(project=self),
+        )
+        total = sum(queryset.count() for queryset in querysets)
+        deleted = 0
+
+        for queryset in querysets:
+            while True:
+                pks = list(queryset.order_by().values_list('pk',
+                    flat=True)[:chunk_size])
+                if not pks:
+                    break
+
+                with transaction.commit_on_success():
+                    if queryset.model is Record:
+                        DeleteQuery(Record).delete_batch(pks, queryset.db)
+                    else:
+                        queryset.model.objects.filter(pk__in=pks).delete()
+
+                deleted += len(pks)
+                if progress is not None:
+                    progress(deleted, total)
+
+        with transaction.commit_on_success():
+            Project.objects.filter(pk=self.pk).delete()
+
     def get_absolute_url(self):
         """
             Return the URL for the project.
@@ -46,6 +179,20 @@ class Project(models.Model):
         return reverse('project_detail_view',
             kwargs={'project_slug': self.slug})
 
+    def get_heatmap_url(self):
+        """
+            Return URL for the calendar heatmap of the project.
+        """
+        return reverse('project_heatmap_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_statistics_url(self):
+        """
+            Return URL for the duration statistics of the project.
+        """
+        return reverse('project_statistics_view',
+            kwargs={'project_slug': self.slug})
+
     def get_edit_url(self):
         """
             Return URL for editing a project.
@@ -74,6 +221,48 @@ class Project(models.Model):
         return reverse('location_create_view',
             kwargs={'project_slug': self.slug})
 
+    def get_location_list_url(self):
+        """
+            Return URL for the usage of the locations of this project.
+        """
+        return reverse('location_list_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_budget_list_url(self):
+        """
+            Return URL for the budgets and goals of this project.
+        """
+        return reverse('budget_list_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_add_budget_url(self):
+        """
+            Return URL for adding a budget or goal to this project.
+        """
+        return reverse('budget_create_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_webhook_list_url(self):
+        """
+            Return URL for the webhooks of this project.
+        """
+        return reverse('webhook_list_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_add_webhook_url(self):
+        """
+            Return URL for adding a webhook to this project.
+        """
+        return reverse('webhook_create_view',
+            kwargs={'project_slug': self.slug})
+
+    def get_billing_report_url(self):
+        """
+            Return URL for the billing report of this project.
+        """
+        return reverse('billing_report_view',
+            kwargs={'project_slug': self.slug})
+
     def get_copy_project_url(self):
         """
             Return URL for copying the project to a new value.
@@ -88,6 +277,14 @@ class Project(models.Model):
         return reverse('record_create_view',
             kwargs={'project_slug': self.slug})
 
+    def get_description_autocomplete_url(self):
+        """
+            Return the URL that provides brief description suggestions for
+            the records of this project.
+        """
+        return reverse('record_autocomplete_view',
+            kwargs={'project_slug': self.slug})
+
     def __unicode__(self):
         """
             Human readable strin representing the project.
@@ -103,6 +300,10 @@ class Category(models.Model):
     name = models.CharField(max_length=50)
     slug = models.SlugField(editable=False)
     description = models.TextField(blank=True, default="")
+    hourly_rate = models.DecimalField(max_digits=10, decimal_places=2,
+        null=True, blank=True,
+        help_text='Rate billed for this category instead of the one of the '
+                  'project.')
 
     class Meta:
         unique_together = (('slug', 'project'),)
@@ -117,6 +318,22 @@ class Category(models.Model):
             kwargs={'project_slug': self.project.slug,
                     'category_slug': self.slug})
 
+    def get_heatmap_url(self):
+        """
+            Return the url of the calendar heatmap of this object.
+        """
+        return reverse('category_heatmap_view',
+            kwargs={'project_slug': self.project.slug,
+                    'category_slug': self.slug})
+
+    def get_statistics_url(self):
+        """
+            Return the url of the duration statistics of this object.
+        """
+        return reverse('category_statistics_view',
+            kwargs={'project_slug': self.project.slug,
+                    'category_slug': self.slug})
+
     def get_edit_url(self):
         """
             Return the url that will be used to edit this object.
@@ -140,6 +357,24 @@ class Category(models.Model):
         return self.name
 
 
+class LocationManager(models.Manager):
+    """
+        Manager providing the locations along with how they have been used.
+    """
+
+    def with_usage(self):
+        """
+            Annotate each location with the total_seconds of its closed
+            records, its record_count and the start of the last record
+            (last_used), in a single query.
+        """
+        return self.get_query_set().annotate(
+            total_seconds=Sum('record__duration_seconds'),
+            record_count=Count('record'),
+            last_used=Max('record__start_time'),
+        )
+
+
 class Location(models.Model):
     """
         Location that can be applied to records to show that the time was spent
@@ -151,6 +386,8 @@ class Location(models.Model):
     address = models.CharField(max_length=255, blank=True, default="")
     description = models.TextField(blank=True, default="")
 
+    objects = LocationManager()
+
     class Meta:
         unique_together = (('project', 'slug'),)
         ordering = ['name']
@@ -163,6 +400,23 @@ class Location(models.Model):
             kwargs={'project_slug': self.project.slug,
                     'location_slug': self.slug})
 
+    def get_heatmap_url(self):
+        """
+            Return the absolute url for the calendar heatmap of this object.
+        """
+        return reverse('location_heatmap_view',
+            kwargs={'project_slug': self.project.slug,
+                    'location_slug': self.slug})
+
+    def get_statistics_url(self):
+        """
+            Return the absolute url for the duration statistics of this
+            object.
+        """
+        return reverse('location_statistics_view',
+            kwargs={'project_slug': self.project.slug,
+                    'location_slug': self.slug})
+
     def get_edit_url(self):
         """
             Return the absolute url for the editing of this object.
@@ -182,6 +436,100 @@ class Location(models.Model):
     def __unicode__(self):
         return self.name
 
+class RecordManager(models.Manager):
+    """
+        Manager making sure that records created in bulk get their derived
+        columns as well.
+    """
+
+    def bulk_create(self, records, *args, **kwargs):
+        """
+            Fill in the derived columns before inserting the records, and
+            count them in the time totals and the cached sidebar as post_save
+            isn't sent.  The records are logged in the change log when they
+            were given their primary keys, as the ones the database picks
+            aren't returned.
+        """
+        for record in records:
+            record.set_derived_values()
+        created = super(RecordManager, self).bulk_create(records, *args,
+            **kwargs)
+        states = [record_state(record) for record in records]
+        TimeAggregate.objects.add_records(states)
+        DurationBucket.objects.add_records(states)
+        for project_id in set(record.project_id for record in records
+                              if record.end_time is None):
+            invalidate_sidebar(project_id)
+        Change.objects.log([record for record in records
+                            if record.pk is not None], Change.CREATE)
+        return created
+
+    def cap_stale(self, project_id, hours, now=None, chunk_size=1000,
+                  progress=None):
+        """
+            Close the records of the project that have been open for longer
+            than hours, ending them hours after they started.  Works through
+            the records chunk_size at a time with set based updates, never
+            loading them as model instances.  The records of a chunk are
+            locked and checked to still be open before they are capped, so
+            that a record closed meanwhile isn't counted twice, and
+            records_closed is sent for them within the same transaction,
+            their webhook events are queued once it is committed.  progress
+            is called with the number of records capped by every chunk.
+            Returns the number of capped records.
+        """
+        if now is None:
+            now = timezone.now()
+        limit = datetime.timedelta(hours=hours)
+        seconds = int(limit.total_seconds())
+
+        stale = self.filter(project=project_id, end_time=None,
+            start_time__lt=now - limit).order_by()
+
+        capped = 0
+        while True:
+            pks = list(stale.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return capped
+
+            with transaction.commit_on_success():
+                pks = list(self.select_for_update().filter(pk__in=pks,
+                    end_time=None).values_list('pk', flat=True))
+                updated = self.filter(pk__in=pks, end_time=None).update(
+                    end_time=F('start_time') + limit,
+                    end_time_tz=F('start_time_tz'),
+                    duration_seconds=seconds)
+                if updated != len(pks):
+                    ## Closed meanwhile on a database without row locks,
+                    ## keep the records that carry the cap.
+                    pks = list(self.filter(pk__in=pks,
+                        end_time=F('start_time') + limit,
+                        duration_seconds=seconds).values_list('pk',
+                        flat=True))
+                if pks:
+                    records_closed.send(sender=Record, pks=pks)
+            send_pending_events()
+
+            capped += len(pks)
+            if pks and progress is not None:
+                progress(len(pks))
+
+    def daily_totals(self, project, first_day, last_day):
+        """
+            Return (day, seconds) pairs of the closed records of the project
+            between the two days, by the day the records started on.
+        """
+        totals = self.filter(project=project,
+            start_date__range=(first_day, last_day)
+        ).exclude(
+            end_time=None
+        ).order_by('start_date').values('start_date').annotate(
+            total=Sum('duration_seconds'))
+
+        return [(total['start_date'], total['total'] or 0)
+                for total in totals]
+
+
 # Time zone choices for all of the record date time values.
 timezone_choices = [(time_zone, time_zone)
     for time_zone in pytz.common_timezones]
@@ -205,9 +553,100 @@ class Record(models.Model):
     location = models.ForeignKey(Location, blank=True, null=True,
                 on_delete=models.SET_NULL)
     description = models.TextField(blank=True, null=True)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True,
+        editable=False)
+    start_date = models.DateField(null=True, blank=True, editable=False)
+    start_week = models.DateField(null=True, blank=True, editable=False)
+
+    objects = RecordManager()
 
     class Meta:
         ordering = ['start_time', 'end_time']
+        index_together = [['project', 'start_date'], ['project', 'start_week'],
+                          ['project', 'end_time'], ['category', 'start_time'],
+                          ['location', 'start_time']]
+
+    def local_start_time(self):
+        """
+            The start time in the time zone that the record was started in.
+        """
+        if timezone.is_naive(self.start_time):
+            return self.start_time
+
+        try:
+            start_time_tz = pytz.timezone(self.start_time_tz)
+        except (pytz.UnknownTimeZoneError, AttributeError):
+            start_time_tz = timezone.get_current_timezone()
+        return timezone.localtime(self.start_time, start_time_tz)
+
+    def derived_values(self):
+        """
+            Values of the columns that are computed from the other fields when
+            the record is saved, so that they can be aggregated in SQL:
+                duration_seconds - None while the record is open
+                start_date - the calendar day the record started on, in the
+                             time zone it was started in
+                start_week - the monday of the week of start_date
+        """
+        if self.end_time is None:
+            duration_seconds = None
+        else:
+            duration_seconds = max(0,
+                int((self.end_time - self.start_time).total_seconds()))
+
+        if self.start_time is None:
+            start_date = start_week = None
+        else:
+            start_date = self.local_start_time().date()
+            start_week = start_date - datetime.timedelta(
+                days=start_date.weekday())
+
+        return {
+            'duration_seconds': duration_seconds,
+            'start_date': start_date,
+            'start_week': start_week,
+        }
+
+    def set_derived_values(self):
+        """
+            Bring the derived columns up to date with the other fields.
+        """
+        for name, value in self.derived_values().items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        """
+            Overriden to maintain the derived columns, which are also saved
+            when only some of the fields are.  The record is saved in one
+            transaction with the tables derived from it by the post_save
+            receivers (time totals, duration buckets, budget crossings, the
+            change log), unless the caller has one open already.
+        """
+        self.set_derived_values()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = (set(update_fields) |
+                set(self.derived_values()))
+
+        using = kwargs.get('using') or router.db_for_write(Record,
+            instance=self)
+        if transaction.is_managed(using=using):
+            super(Record, self).save(*args, **kwargs)
+            return
+
+        with transaction.commit_on_success(using=using):
+            super(Record, self).save(*args, **kwargs)
+        send_pending_events()
+
+    def delete(self, *args, **kwargs):
+        """
+            Overriden to queue the webhook event of the deletion, which
+            django runs in a transaction along with the post_delete
+            receivers.
+        """
+        super(Record, self).delete(*args, **kwargs)
+        send_pending_events()
 
     def close(self):
         """
@@ -219,7 +658,7 @@ class Record(models.Model):
             self.end_time_tz = timezone.get_current_timezone()
 
             if self.end_time >= self.start_time:
-                self.save()
+                self.save(update_fields=['end_time', 'end_time_tz'])
 
     def duration(self):
         """
@@ -229,8 +668,19 @@ class Record(models.Model):
         if self.end_time is None:
             return 0
         else:
-            duration = self.end_time - self.start_time
-            return duration.seconds + duration.microseconds / 1E6
+            return (self.end_time - self.start_time).total_seconds()
+
+    def get_day_url(self):
+        """
+            Return URL for the records of the day this record started on,
+            None when its start date hasn't been filled in yet (see the
+            backfill_records command).
+        """
+        if self.start_date is None:
+            return None
+        return reverse('project_day_view',
+            kwargs={'project_slug': self.project.slug,
+                    'day': self.start_date.isoformat()})
 
     def get_edit_url(self):
         """
@@ -257,6 +707,1106 @@ class Record(models.Model):
                     'pk': self.pk})
 
 
+class Job(models.Model):
+    """
+        Heavy operation that is executed outside of the request by the job
+        workers of time_tracking.jobs.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    owner = models.ForeignKey(User, null=True, blank=True)
+    name = models.CharField(max_length=50)
+    arguments = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+        default=QUEUED)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True, default='')
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        index_together = [['status', 'created']]
+
+    def get_absolute_url(self):
+        """
+            Return the URL of the status page of the job.
+        """
+        return reverse('job_detail_view', kwargs={'pk': self.pk})
+
+    def is_finished(self):
+        """
+            Whether the job is done or has failed.
+        """
+        return self.status in (self.DONE, self.FAILED)
+
+    def percent_complete(self):
+        """
+            Progress of the job as a percentage, None when the amount of work
+            is unknown.
+        """
+        if self.status == self.DONE:
+            return 100
+        if not self.total:
+            return None
+        return min(100, int(100 * self.progress / float(self.total)))
+
+    def report(self, progress, total=None, message=None):
+        """
+            Store the progress of the running job, which also tells that its
+            worker is still alive.
+        """
+        values = {'progress': progress, 'heartbeat': timezone.now()}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+
+        for key, value in values.items():
+            setattr(self, key, value)
+        Job.objects.filter(pk=self.pk).update(**values)
+
+    def __unicode__(self):
+        return '%s (%s)' % (self.name, self.status)
+
+
+class DescriptionSuggestionManager(models.Manager):
+    """
+        Manager that maintains and queries the brief description frequency
+        table.
+    """
+
+    def record_use(self, project_id, text, when=None):
+        """
+            Count a use of the brief description text in the project.  The
+            common case of an already known description is a single update.
+        """
+        text = (text or '').strip()
+        if not text:
+            return
+
+        if when is None:
+            when = timezone.now()
+
+        updated = self.filter(project_id=project_id, text=text).update(
+            use_count=F('use_count') + 1, last_used=when)
+
+        if not updated:
+            suggestion, created = self.get_or_create(project_id=project_id,
+                text=text, defaults={'key': text.lower(), 'use_count': 1,
+                                     'last_used': when})
+            if not created:
+                self.filter(pk=suggestion.pk).update(
+                    use_count=F('use_count') + 1, last_used=when)
+
+    def suggest(self, project, prefix='', limit=10):
+        """
+            Return the most frequently and most recently used brief
+            descriptions of the project that start with the prefix.
+        """
+        suggestions = self.filter(project=project)
+
+        prefix = prefix.strip().lower()
+        if prefix:
+            suggestions = suggestions.filter(key__startswith=prefix)
+
+        return list(suggestions.values_list('text', flat=True)[:limit])
+
+
+class DescriptionSuggestion(models.Model):
+    """
+        Frequency table of the brief descriptions that have been used by the
+        records of a project.  Kept up to date as records are saved so that
+        the autocomplete never has to scan the records themselves.
+    """
+    project = models.ForeignKey(Project)
+    text = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    use_count = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField()
+
+    objects = DescriptionSuggestionManager()
+
+    class Meta:
+        unique_together = (('project', 'text'),)
+        index_together = [['project', 'key']]
+        ordering = ['-use_count', '-last_used']
+
+    def __unicode__(self):
+        return self.text
+
+
+def period_start(resolution, day):
+    """
+        First day of the period of the resolution that the day falls in.
+    """
+    if resolution == TimeAggregate.WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    elif resolution == TimeAggregate.MONTH:
+        return day.replace(day=1)
+    elif resolution == TimeAggregate.TOTAL:
+        return TimeAggregate.TOTAL_PERIOD
+    return day
+
+
+def scopes(category_id, location_id):
+    """
+        (category, location) of the totals that a record of the category and
+        location counts in: the ones of the project, where both are None, of
+        the category and of the location.
+    """
+    counted = [(None, None)]
+    if category_id is not None:
+        counted.append((category_id, None))
+    if location_id is not None:
+        counted.append((None, location_id))
+    return counted
+
+
+class TimeAggregateManager(models.Manager):
+    """
+        Maintains the precomputed totals of the closed records.
+    """
+
+    def add(self, project_id, category_id, location_id, day, seconds,
+            records=1):
+        """
+            Add the seconds and number of records (negative to take them
+            away) to the totals of the project, of the category and of the
+            location, at every resolution.
+        """
+        for category, location in scopes(category_id, location_id):
+            for resolution in self.model.RESOLUTIONS:
+                period = period_start(resolution, day)
+                keys = {'project_id': project_id,
+                        'category_id': category,
+                        'location_id': location,
+                        'resolution': resolution,
+                        'period': period}
+
+                if self.filter(**keys).update(
+                        seconds=F('seconds') + seconds,
+                        records=F('records') + records):
+                    continue
+
+                ## Nothing to take the time away from, the totals are gone
+                ## along with their project, category or location.
+                if records < 0:
+                    continue
+
+                aggregate, created = self.get_or_create(defaults={
+                    'seconds': seconds, 'records': records}, **keys)
+                if not created:
+                    self.filter(pk=aggregate.pk).update(
+                        seconds=F('seconds') + seconds,
+                        records=F('records') + records)
+
+    def add_records(self, records, sign=1):
+        """
+            Add the closed records, given as dictionaries of the values of
+            record_state, to the totals.
+        """
+        added = set()
+        for record in records:
+            if (record['duration_seconds'] is not None and
+                    record['start_date'] is not None):
+                self.add(record['project_id'], record['category_id'],
+                    record['location_id'], record['start_date'],
+                    sign * record['duration_seconds'], sign)
+                added.add((record['project_id'], record['category_id'],
+                    record['start_date']))
+
+        if sign > 0:
+            for project_id, category_id, day in added:
+                Budget.objects.mark_crossings(project_id, category_id, day)
+
+    def rebuild(self, project):
+        """
+            Recompute the totals of the project from its records.
+        """
+        days = Record.objects.filter(project=project).exclude(
+            end_time=None).exclude(start_date=None).order_by().values(
+            'category', 'location', 'start_date').annotate(
+            total=Sum('duration_seconds'), count=Count('pk'))
+
+        totals = {}
+        for day in days:
+            for scope in scopes(day['category'], day['location']):
+                for resolution in self.model.RESOLUTIONS:
+                    key = scope + (resolution,
+                        period_start(resolution, day['start_date']))
+                    seconds, records = totals.get(key, (0, 0))
+                    totals[key] = (seconds + (day['total'] or 0),
+                                   records + day['count'])
+
+        with transaction.commit_on_success():
+            self.filter(project=project).delete()
+            self.bulk_create([self.model(project_id=project.pk,
+                category_id=category, location_id=location,
+                resolution=resolution, period=period, seconds=seconds,
+                records=records)
+                for (category, location, resolution, period), (seconds,
+                    records) in totals.items()])
+
+    def summary(self, project, category=None, location=None):
+        """
+            Return the total seconds, the number of closed records, the
+            average seconds per record and the records per week, from the
+            first to the last week with records, of the project or of one of
+            its categories or locations.
+        """
+        summary = self.filter(project=project, category=category,
+            location=location, resolution=self.model.WEEK,
+            records__gt=0).aggregate(seconds=Sum('seconds'),
+            records=Sum('records'), first=Min('period'), last=Max('period'))
+
+        seconds = summary['seconds'] or 0
+        records = summary['records'] or 0
+        if records:
+            weeks = (summary['last'] - summary['first']).days // 7 + 1
+            average_seconds = seconds / float(records)
+            records_per_week = records / float(weeks)
+        else:
+            average_seconds = records_per_week = 0
+
+        return {'total_seconds': seconds, 'records': records,
+                'average_seconds': average_seconds,
+                'records_per_week': records_per_week}
+
+    def totals(self, project, resolution, first_day, last_day,
+               category=None, location=None):
+        """
+            Return (period, seconds) pairs of the project, or of one of its
+            categories or locations, between the two days.
+        """
+        totals = self.filter(project=project, category=category,
+            location=location, resolution=resolution,
+            period__range=(period_start(resolution, first_day), last_day)
+        ).order_by('period').values_list('period', 'seconds')
+
+        return list(totals)
+
+
+class TimeAggregate(models.Model):
+    """
+        Total time of the closed records of a project, category or location
+        (the project rows have neither a category nor a location) that were
+        started in a day, week or month, or ever (total).  Kept up to date
+        from the record writes, so that long periods are shown and budgets
+        are checked without reading the records.
+    """
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    TOTAL = 'total'
+    RESOLUTIONS = (DAY, WEEK, MONTH, TOTAL)
+    CALENDAR_RESOLUTIONS = (DAY, WEEK, MONTH)
+    RESOLUTION_CHOICES = [(resolution, resolution)
+        for resolution in RESOLUTIONS]
+
+    project = models.ForeignKey(Project)
+    category = models.ForeignKey(Category, null=True, blank=True)
+    location = models.ForeignKey(Location, null=True, blank=True)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    period = models.DateField()
+    seconds = models.BigIntegerField(default=0)
+    records = models.IntegerField(default=0)
+
+    ## Period of the totals of the total resolution.
+    TOTAL_PERIOD = datetime.date(1970, 1, 1)
+
+    objects = TimeAggregateManager()
+
+    class Meta:
+        index_together = [['project', 'resolution', 'period']]
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.project_id, self.resolution, self.period)
+
+
+def budget_thresholds():
+    """
+        Percentages of the budgets and goals that are marked when they are
+        reached.
+    """
+    return getattr(settings, 'TIME_TRACKING_BUDGET_THRESHOLDS',
+        (50, 80, 100))
+
+
+class BudgetManager(models.Manager):
+    """
+        Marks the thresholds of the budgets as they are crossed.
+    """
+
+    def mark_crossings(self, project_id, category_id, day):
+        """
+            Mark the thresholds crossed by the budgets of the project, and of
+            the category, for the period of the day, after time has been
+            added to it.
+        """
+        budgets = self.filter(project=project_id).filter(
+            models.Q(category=None) | models.Q(category=category_id))
+
+        for budget in budgets:
+            period = budget.period_of(day)
+            percent = budget.percent(period)
+
+            crossed = [threshold for threshold in budget_thresholds()
+                       if percent >= threshold]
+            if not crossed:
+                continue
+
+            marked = set(budget.budgetcrossing_set.filter(
+                period=period).values_list('threshold', flat=True))
+            for threshold in crossed:
+                if threshold not in marked:
+                    BudgetCrossing.objects.get_or_create(budget=budget,
+                        period=period, threshold=threshold)
+
+
+class Budget(models.Model):
+    """
+        Time budget (a limit) or goal (a target) of a project, or of one of
+        its categories, per week or in total.  The time consumed is read from
+        the time totals, so checking it costs one indexed lookup.
+    """
+    BUDGET = 'budget'
+    GOAL = 'goal'
+    KIND_CHOICES = [(BUDGET, 'Budget'), (GOAL, 'Goal')]
+
+    WEEKLY = TimeAggregate.WEEK
+    TOTAL = TimeAggregate.TOTAL
+    PERIOD_CHOICES = [(WEEKLY, 'Weekly'), (TOTAL, 'Total')]
+
+    project = models.ForeignKey(Project)
+    category = models.ForeignKey(Category, null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES,
+        default=BUDGET)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES,
+        default=WEEKLY)
+    hours = models.PositiveIntegerField()
+
+    objects = BudgetManager()
+
+    class Meta:
+        ordering = ['category', 'period']
+
+    def period_of(self, day):
+        """
+            Start of the period of the budget that the day falls in.
+        """
+        return period_start(self.period, day)
+
+    def current_period(self):
+        """
+            Start of the current period of the budget.
+        """
+        return self.period_of(timezone.localtime(timezone.now()).date())
+
+    def consumed_seconds(self, period=None):
+        """
+            Time spent in the period, the current one by default.
+        """
+        if period is None:
+            period = self.current_period()
+
+        seconds = TimeAggregate.objects.filter(project=self.project_id,
+            category=self.category_id, location=None, resolution=self.period,
+            period=period).values_list('seconds', flat=True)[:1]
+        return seconds[0] if seconds else 0
+
+    def percent(self, period=None):
+        """
+            Percentage of the budget consumed in the period.
+        """
+        if not self.hours:
+            return 0
+        return 100.0 * self.consumed_seconds(period) / (self.hours * 3600)
+
+    def remaining_seconds(self, period=None):
+        """
+            Time left before the budget is used up or the goal is reached.
+        """
+        return max(0, self.hours * 3600 - self.consumed_seconds(period))
+
+    def get_delete_url(self):
+        """
+            Return URL for deleting the budget.
+        """
+        return reverse('budget_delete_view',
+            kwargs={'project_slug': self.project.slug, 'pk': self.pk})
+
+    def __unicode__(self):
+        return u'%s of %d hours %s' % (self.get_kind_display(), self.hours,
+            self.get_period_display().lower())
+
+
+class BudgetCrossing(models.Model):
+    """
+        Threshold (a percentage) of a budget that was reached in one of its
+        periods.
+    """
+    budget = models.ForeignKey(Budget)
+    period = models.DateField()
+    threshold = models.PositiveIntegerField()
+    crossed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('budget', 'period', 'threshold'),)
+        ordering = ['-crossed']
+
+
+## Fields of the records kept in record_state.
+record_state_fields = ['brief_description', 'project_id', 'category_id',
+    'location_id', 'start_date', 'duration_seconds']
+
+
+class DurationBucketManager(models.Manager):
+    """
+        Maintains the duration sketches of the closed records.
+    """
+
+    def add(self, project_id, category_id, location_id, seconds, count=1):
+        """
+            Count the duration (negative count to take it away) in the
+            sketches of the project, of the category and of the location.
+        """
+        key = DurationSketch().key(seconds)
+        for category, location in scopes(category_id, location_id):
+            keys = {'project_id': project_id, 'category_id': category,
+                    'location_id': location, 'key': key}
+
+            if self.filter(**keys).update(count=F('count') + count):
+                continue
+            if count < 0:
+                continue
+
+            bucket, created = self.get_or_create(defaults={'count': count},
+                **keys)
+            if not created:
+                self.filter(pk=bucket.pk).update(count=F('count') + count)
+
+    def add_records(self, records, sign=1):
+        """
+            Add the closed records, given as dictionaries of the values of
+            record_state, to the sketches.
+        """
+        for record in records:
+            if record['duration_seconds'] is not None:
+                self.add(record['project_id'], record['category_id'],
+                    record['location_id'], record['duration_seconds'], sign)
+
+    def rebuild(self, project):
+        """
+            Recompute the sketches of the project from its records.
+        """
+        durations = Record.objects.filter(project=project).exclude(
+            end_time=None).order_by().values('category', 'location',
+            'duration_seconds').annotate(count=Count('pk'))
+
+        sketch = DurationSketch()
+        counts = {}
+        for duration in durations:
+            key = sketch.key(duration['duration_seconds'] or 0)
+            for scope in scopes(duration['category'], duration['location']):
+                counts[scope + (key,)] = (counts.get(scope + (key,), 0) +
+                    duration['count'])
+
+        with transaction.commit_on_success():
+            self.filter(project=project).delete()
+            self.bulk_create([self.model(project_id=project.pk,
+                category_id=category, location_id=location, key=key,
+                count=count)
+                for (category, location, key), count in counts.items()])
+
+    def sketch(self, projects, category=None, location=None):
+        """
+            Return the sketch of the durations of the records of the projects
+            merged together, or of one of their categories or locations.
+        """
+        buckets = self.filter(project__in=projects, category=category,
+            location=location, count__gt=0).order_by().values('key').annotate(
+            total=Sum('count'))
+
+        return DurationSketch(counts=dict((bucket['key'], bucket['total'])
+            for bucket in buckets))
+
+
+class DurationBucket(models.Model):
+    """
+        Bucket of the DurationSketch of the closed records of a project,
+        category or location (the project buckets have neither), counting
+        the records whose duration falls in it.  Kept up to date from the
+        record writes like TimeAggregate.
+    """
+    project = models.ForeignKey(Project)
+    category = models.ForeignKey(Category, null=True, blank=True)
+    location = models.ForeignKey(Location, null=True, blank=True)
+    key = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    objects = DurationBucketManager()
+
+    class Meta:
+        index_together = [['project', 'key']]
+
+    def __unicode__(self):
+        return u'%s %s: %s' % (self.project_id, self.key, self.count)
+
+
+class ChangeEncoder(DjangoJSONEncoder):
+    """
+        Encoder of the values of the fields, the time zone fields can hold
+        time zones as well as their names.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.tzinfo):
+            return str(o)
+        return super(ChangeEncoder, self).default(o)
+
+
+def field_values(instance):
+    """
+        Values of the fields of the instance, by column name.
+    """
+    return dict((field.attname, field.value_from_object(instance))
+        for field in instance._meta.fields)
+
+
+def change_data(instance):
+    """
+        Values of the fields of the instance, as JSON.
+    """
+    return json.dumps(field_values(instance), cls=ChangeEncoder)
+
+
+class ChangeManager(models.Manager):
+    """
+        Manager appending to the change log.
+    """
+
+    def log(self, instances, action):
+        """
+            Append a change with the action for every instance (projects,
+            categories, locations or records), with the values the instance
+            has now unless it was deleted.  The owner of the project of each
+            instance is looked up with a single query when the project isn't
+            loaded already.
+        """
+        owners = {}
+        missing = set()
+        for instance in instances:
+            if isinstance(instance, Project):
+                owners[instance.pk] = instance.owner_id
+            elif hasattr(instance, '_project_cache'):
+                owners[instance.project_id] = instance.project.owner_id
+            else:
+                missing.add(instance.project_id)
+        missing.difference_update(owners)
+        if missing:
+            owners.update(Project.objects.filter(pk__in=missing).values_list(
+                'pk', 'owner'))
+
+        changes = []
+        for instance in instances:
+            project_id = (instance.pk if isinstance(instance, Project)
+                          else instance.project_id)
+            if owners.get(project_id) is None:
+                continue
+            changes.append(self.model(owner_id=owners[project_id],
+                project_id=project_id,
+                model=instance._meta.object_name.lower(),
+                object_id=instance.pk, action=action,
+                data=None if action == Change.DELETE
+                     else change_data(instance)))
+        self.bulk_create(changes)
+
+    def first_recent(self, changes, now=None):
+        """
+            Sequence number of the first of the changes that was logged
+            within the last TIME_TRACKING_CHANGE_SETTLE_SECONDS, None when
+            there is none.
+        """
+        seconds = getattr(settings, 'TIME_TRACKING_CHANGE_SETTLE_SECONDS', 10)
+        cutoff = (now or timezone.now()) - datetime.timedelta(seconds=seconds)
+        return changes.filter(created__gt=cutoff).aggregate(
+            first=Min('pk'))['first']
+
+    def after(self, owner, sequence, limit, now=None):
+        """
+            Changes of the projects of the owner that come after the sequence
+            number, in order, at most limit of them.  Sequence numbers are
+            handed out when the changes are inserted, but transactions may
+            commit in another order, so the changes stop before the first
+            one that was logged within the settle time.  A reader that moved
+            past a sequence number doesn't miss a change committed later
+            with a lower one, as long as transactions take less than the
+            settle time.
+        """
+        changes = self.filter(owner=owner, pk__gt=sequence)
+        first = self.first_recent(changes, now)
+        if first is not None:
+            changes = changes.filter(pk__lt=first)
+        return changes.order_by('pk')[:limit]
+
+    def settled_sequence(self, owner, now=None):
+        """
+            Sequence number that a reader of the changes of the owner can
+            start after without missing changes that aren't committed yet.
+        """
+        changes = self.filter(owner=owner)
+        first = self.first_recent(changes, now)
+        if first is not None:
+            return first - 1
+        return changes.aggregate(last=Max('pk'))['last'] or 0
+
+    def latest_sequences(self, model, object_ids):
+        """
+            Sequence number of the last change of each of the objects of the
+            model (its lower case name), by object id.  Objects that haven't
+            been changed since the change log exists are left out.
+        """
+        return dict(self.filter(model=model, object_id__in=object_ids).values(
+            'object_id').annotate(sequence=Max('pk')).values_list('object_id',
+            'sequence'))
+
+
+class Change(models.Model):
+    """
+        Entry of the append only log of the creation, update, closing and
+        deletion of projects, categories, locations and records, so that
+        other systems can follow the changes by reading the entries after
+        the last sequence number (the primary key) that they have seen.
+        data holds the values of the fields after the change, it is empty
+        for deletions.
+
+        Records of a deleted project are deleted without entries of their
+        own, the deletion of the project stands for them.  The derived
+        columns filled in by backfill_records are not logged either.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    CLOSE = 'close'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (CLOSE, 'Close'),
+        (DELETE, 'Delete'),
+    )
+
+    owner = models.ForeignKey(User)
+    project_id = models.IntegerField()
+    model = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    data = models.TextField(null=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeManager()
+
+    class Meta:
+        index_together = [['owner', 'id'], ['model', 'object_id']]
+
+    def __unicode__(self):
+        return u'%s %s %s %s' % (self.pk, self.action, self.model,
+                                 self.object_id)
+
+    @property
+    def sequence(self):
+        return self.pk
+
+    def as_dict(self):
+        """
+            The change as it is handed out by the change feed.
+        """
+        return {
+            'sequence': self.pk,
+            'model': self.model,
+            'object_id': self.object_id,
+            'project_id': self.project_id,
+            'action': self.action,
+            'data': None if self.data is None else json.loads(self.data),
+            'created': self.created.isoformat(),
+        }
+
+
+def webhook_secret():
+    """
+        New random secret that the bodies posted to a webhook are signed
+        with.
+    """
+    return get_random_string(40)
+
+
+class Webhook(models.Model):
+    """
+        Url of a project that is posted the creation, update, closing and
+        deletion of its records, in batches (see time_tracking.webhooks).
+        Every body is signed with the secret of the webhook.
+    """
+    project = models.ForeignKey(Project)
+    url = models.URLField(max_length=255)
+    secret = models.CharField(max_length=40, default=webhook_secret,
+        editable=False)
+    active = models.BooleanField(default=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created']
+
+    def __unicode__(self):
+        return self.url
+
+    def get_delete_url(self):
+        """
+            Return URL for deleting the webhook.
+        """
+        return reverse('webhook_delete_view',
+            kwargs={'project_slug': self.project.slug, 'pk': self.pk})
+
+
+def record_state(record):
+    """
+        Snapshot of the record values that the derived tables depend on.
+    """
+    return {
+        'brief_description': record.brief_description,
+        'project_id': record.project_id,
+        'category_id': record.category_id,
+        'location_id': record.location_id,
+        'start_date': record.start_date,
+        'duration_seconds': record.duration_seconds,
+    }
+
+
+@receiver(post_init, sender=Record)
+def remember_record_state(sender, instance, **kwargs):
+    """
+        Remember the state the record was loaded with so that the changes can
+        be determined when it is saved.
+    """
+    if instance.pk is None:
+        instance._saved_state = None
+    else:
+        instance._saved_state = record_state(instance)
+
+
+@receiver(pre_save, sender=Record)
+def store_previous_record_state(sender, instance, **kwargs):
+    """
+        Move the loaded state to _previous_state for the post save handlers
+        and start tracking the values that are being saved.
+    """
+    instance._previous_state = getattr(instance, '_saved_state', None)
+    instance._saved_state = record_state(instance)
+
+
+@receiver(post_save, sender=Record)
+def update_description_suggestions(sender, instance, created, raw=False,
+                                   **kwargs):
+    """
+        Count the brief description of new records and of records whose
+        brief description has been changed.
+    """
+    if raw:
+        return
+
+    previous = instance._previous_state
+    if (created or previous is None or
+            previous['brief_description'] != instance.brief_description):
+        DescriptionSuggestion.objects.record_use(instance.project_id,
+            instance.brief_description)
+
+
+@receiver(post_save, sender=Record)
+def update_time_aggregates(sender, instance, created, raw=False, **kwargs):
+    """
+        Move the time of the record from the totals and duration sketches it
+        was counted in to the ones it belongs to now.
+    """
+    if raw:
+        return
+
+    previous = instance._previous_state
+    current = instance._saved_state
+    if previous == current:
+        return
+
+    if previous is not None:
+        TimeAggregate.objects.add_records([previous], -1)
+        DurationBucket.objects.add_records([previous], -1)
+    TimeAggregate.objects.add_records([current])
+    DurationBucket.objects.add_records([current])
+
+
+@receiver(post_delete, sender=Record)
+def remove_from_time_aggregates(sender, instance, **kwargs):
+    """
+        Take the time of a deleted record away from its totals and duration
+        sketches.
+    """
+    state = getattr(instance, '_saved_state', None)
+    if state is not None:
+        TimeAggregate.objects.add_records([state], -1)
+        DurationBucket.objects.add_records([state], -1)
+
+
+@receiver(records_closed, sender=Record)
+def add_closed_records_to_time_aggregates(sender, pks, **kwargs):
+    """
+        Count the records that were closed without being saved one by one.
+    """
+    records = list(Record.objects.filter(pk__in=pks).values(
+        *record_state_fields))
+    TimeAggregate.objects.add_records(records)
+    DurationBucket.objects.add_records(records)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_cached_choices(sender, instance, **kwargs):
+    """
+        Drop the cached choices of the record forms and the cached sidebar
+        of the project when one of its categories or locations changes.
+    """
+    invalidate_choices(sender, instance.project_id)
+    invalidate_sidebar(instance.project_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_sidebar(sender, instance, **kwargs):
+    """
+        Drop the cached sidebar, whose urls contain the slug of the project.
+    """
+    invalidate_sidebar(instance.pk)
+
+
+@receiver(post_save, sender=Record)
+def invalidate_sidebar_open_records(sender, instance, created, **kwargs):
+    """
+        Drop the cached sidebar of the project when a record is opened or
+        closed.
+    """
+    previous = instance._previous_state
+    if (previous is None or (previous['duration_seconds'] is None) !=
+            (instance.duration_seconds is None)):
+        invalidate_sidebar(instance.project_id)
+
+
+@receiver(post_delete, sender=Record)
+def invalidate_sidebar_deleted_record(sender, instance, **kwargs):
+    """
+        Drop the cached sidebar of the project when an open record is
+        deleted.
+    """
+    if instance.end_time is None:
+        invalidate_sidebar(instance.project_id)
+
+
+@receiver(records_closed, sender=Record)
+def invalidate_sidebar_closed_records(sender, pks, **kwargs):
+    """
+        Drop the cached sidebars of the projects of records closed in bulk.
+    """
+    for project_id in set(Record.objects.filter(pk__in=pks).values_list(
+            'project', flat=True)):
+        invalidate_sidebar(project_id)
+
+
+def was_closed(record):
+    """
+        True when the record has just been saved with its end time.
+    """
+    previous = record._previous_state
+    return (previous is not None and previous['duration_seconds'] is None
+            and record.duration_seconds is not None)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Record)
+def log_saved_change(sender, instance, created, raw=False, **kwargs):
+    """
+        Log the creation or update of an object, updates that end a record
+        are logged as closing it.
+    """
+    if raw:
+        return
+
+    action = Change.CREATE if created else Change.UPDATE
+    if sender is Record and not created and was_closed(instance):
+        action = Change.CLOSE
+    Change.objects.log([instance], action)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Record)
+def log_deleted_change(sender, instance, **kwargs):
+    """
+        Log the deletion of an object.  Projects are logged as deleted when
+        they are marked for deletion.
+    """
+    if sender is Project and instance.deleting:
+        return
+    Change.objects.log([instance], Change.DELETE)
+
+
+@receiver(records_closed, sender=Record)
+def log_closed_records(sender, pks, **kwargs):
+    """
+        Log the records that were closed without being saved one by one.
+    """
+    Change.objects.log(list(Record.objects.filter(pk__in=pks)),
+        Change.CLOSE)
+
+
+@receiver(post_save, sender=Webhook)
+@receiver(post_delete, sender=Webhook)
+def invalidate_cached_webhooks(sender, instance, **kwargs):
+    """
+        Drop the cached webhooks of the project when one changes.
+    """
+    invalidate_webhooks(instance.project_id)
+
+
+## Record events of the current thread that wait for their transaction to
+## be over.
+pending_events = threading.local()
+
+
+def comparable_values(instance):
+    """
+        Field values of the instance as they compare to the ones read back
+        from the database, which may have dropped the microseconds.
+    """
+    values = field_values(instance)
+    for name, value in values.items():
+        if isinstance(value, datetime.tzinfo):
+            values[name] = str(value)
+        elif isinstance(value, datetime.datetime):
+            values[name] = value.replace(microsecond=0)
+    return values
+
+
+def send_record_event(record, action):
+    """
+        Queue the event of the record for the webhooks of its project.
+        Within a transaction the event waits in pending_events until
+        send_pending_events is called after the transaction is over.
+    """
+    pairs = cached_webhooks(Webhook, record.project_id)
+    if not pairs:
+        return
+
+    using = record._state.db or 'default'
+    event = (using, pairs, record.pk, action, change_data(record),
+             comparable_values(record))
+    if transaction.is_managed(using=using):
+        if not hasattr(pending_events, 'events'):
+            pending_events.events = []
+        pending_events.events.append(event)
+    else:
+        send_pending_events()
+        webhooks.dispatcher.send(*event[1:5])
+
+
+@receiver(request_finished)
+def send_pending_events(**kwargs):
+    """
+        Queue the events that waited for their transaction once no
+        transaction is open anymore, leaving out the ones that were rolled
+        back: created or closed records that aren't there or open, updates
+        that aren't stored, deleted records that are still there.  Called at
+        the end of every request and after the transactions of this
+        application.
+    """
+    events = getattr(pending_events, 'events', None)
+    if not events or any(transaction.is_managed(using=event[0])
+                         for event in events):
+        return
+    pending_events.events = []
+
+    stored = {}
+    for using in set(event[0] for event in events):
+        pks = set(event[2] for event in events if event[0] == using)
+        stored[using] = dict((record.pk, record) for record in
+            Record.objects.using(using).filter(pk__in=pks))
+
+    for using, pairs, pk, action, payload, values in events:
+        record = stored[using].get(pk)
+        if action == webhooks.DELETED:
+            committed = record is None
+        elif action == webhooks.CREATED:
+            committed = record is not None
+        elif action == webhooks.CLOSED:
+            committed = record is not None and record.end_time is not None
+        else:
+            committed = (record is not None and
+                         comparable_values(record) == values)
+        if committed:
+            webhooks.dispatcher.send(pairs, pk, action, payload)
+
+
+@receiver(post_save, sender=Record)
+def send_saved_record_event(sender, instance, created, raw=False, **kwargs):
+    """
+        Post the creation, closing or update of a record to the webhooks.
+    """
+    if raw:
+        return
+
+    if created:
+        action = webhooks.CREATED
+    elif was_closed(instance):
+        action = webhooks.CLOSED
+    else:
+        action = webhooks.UPDATED
+    send_record_event(instance, action)
+
+
+@receiver(post_delete, sender=Record)
+def send_deleted_record_event(sender, instance, **kwargs):
+    """
+        Post the deletion of a record to the webhooks.
+    """
+    send_record_event(instance, webhooks.DELETED)
+
+
+@receiver(records_closed, sender=Record)
+def send_closed_records_events(sender, pks, **kwargs):
+    """
+        Post the records that were closed in bulk to the webhooks, reading
+        them only for projects that have webhooks.
+    """
+    project_ids = [project_id for project_id in set(Record.objects.filter(
+        pk__in=pks).values_list('project', flat=True))
+        if cached_webhooks(Webhook, project_id)]
+    if project_ids:
+        for record in Record.objects.filter(pk__in=pks,
+                project__in=project_ids):
+            send_record_event(record, webhooks.CLOSED)
+
+
 def convert_time(time_value, timezone_value):
     """
         Converts the time value into the time zone value provided.
@@ -0,0 +1,137 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from contextlib import contextmanager
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+APP_LABEL = 'time_tracking'
+
+
+def primary_database():
+    """
+        Alias of the database that all time_tracking writes go to.
+    """
+    return getattr(settings, 'TIME_TRACKING_PRIMARY_DATABASE', 'default')
+
+
+def replica_database():
+    """
+        Alias of the replica that reporting reads may go to, None when there
+        is no replica.
+    """
+    return getattr(settings, 'TIME_TRACKING_REPLICA_DATABASE', None)
+
+
+def reporting_view(view):
+    """
+        Mark a view as only reading time_tracking data, so that
+        ReplicaRouterMiddleware lets its queries go to the replica.
+    """
+    view.reads_from_replica = True
+    return view
+
+
+def start_reporting(pinned=False):
+    """
+        Let the reads of the current thread go to the replica, unless pinned
+        to the primary for read your writes consistency.
+    """
+    _state.reporting = True
+    _state.pinned = pinned
+
+
+def stop_reporting():
+    """
+        Send the reads of the current thread to the primary again.
+    """
+    _state.reporting = False
+    _state.pinned = False
+
+
+def is_pinned():
+    """
+        Whether the current thread has written to the primary since it started
+        reporting (or was pinned to it from the start).
+    """
+    return getattr(_state, 'pinned', False)
+
+
+@contextmanager
+def reading_from_replica():
+    """
+        Context manager for code outside of the views, such as reports, that
+        only reads time_tracking data.
+    """
+    start_reporting()
+    try:
+        yield
+    finally:
+        stop_reporting()
+
+
+class ReplicaRouter(object):
+    """
+        Database router sending the reads of time_tracking models made while
+        reporting to settings.TIME_TRACKING_REPLICA_DATABASE.  All writes go
+        to the primary, after which the reads of the thread go there as well.
+    """
+
+    def db_for_read(self, model, **hints):
+        """
+            The replica for reporting reads that are not pinned to the
+            primary.
+        """
+        if model._meta.app_label != APP_LABEL:
+            return None
+
+        replica = replica_database()
+        if (replica and getattr(_state, 'reporting', False) and
+                not is_pinned()):
+            return replica
+        return primary_database()
+
+    def db_for_write(self, model, **hints):
+        """
+            Always the primary, even for instances read from the replica.
+        """
+        if model._meta.app_label != APP_LABEL:
+            return None
+
+        _state.pinned = True
+        return primary_database()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+            The replica holds the same data as the primary, so objects from
+            either may be related to each other.
+        """
+        databases = (primary_database(), replica_database())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_syncdb(self, db, model):
+        """
+            No opinion, the replica gets its tables from the primary.
+        """
+        return None
@@ -0,0 +1,150 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.core.urlresolvers import reverse
+from django.db.models import Q
+from django.utils import timezone
+import pytz
+
+
+def after(ordering, values):
+    """
+        Filter selecting the rows that come after the values in the ordering
+        (field names, prefixed with - when descending).
+    """
+    condition = None
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = '%s__%s' % (name, 'lt' if field.startswith('-') else 'gt')
+
+        equal = dict((previous.lstrip('-'), value) for previous, value in
+            zip(ordering[:index], values[:index]))
+        equal[lookup] = values[index]
+
+        if condition is None:
+            condition = Q(**equal)
+        else:
+            condition |= Q(**equal)
+    return condition
+
+
+def iterate_chunked(queryset, fields, ordering=('pk',), chunk_size=1000,
+                    start_after=None):
+    """
+        Iterate over the values of the fields of the rows of the queryset as
+        tuples, in the ordering, fetching chunk_size rows at a time.  Each
+        chunk is found through the index of the ordering after the last row
+        of the previous one, so that only one chunk is held in memory and
+        no chunk costs more than the first.  The ordering fields can not be
+        null and have to end with a unique one.  start_after gives the
+        values of the ordering fields to start after.
+    """
+    names = [field.lstrip('-') for field in ordering]
+    columns = list(fields) + [name for name in names if name not in fields]
+    positions = [columns.index(name) for name in names]
+    extra = len(columns) - len(fields)
+
+    queryset = queryset.order_by(*ordering).values_list(*columns)
+    last = start_after
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(after(ordering, last))
+
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row[:len(row) - extra] if extra else row
+        if len(rows) < chunk_size:
+            return
+
+        last = [rows[-1][position] for position in positions]
+
+
+class RecordRow(object):
+    """
+        Lean, read only version of a record for listings and reports, with
+        the names of its category and location and the slug of its project
+        instead of the objects.
+    """
+    FIELDS = ('pk', 'start_time', 'start_time_tz', 'end_time',
+        'duration_seconds', 'start_date', 'brief_description',
+        'category__name', 'location__name')
+
+    __slots__ = ('project_slug', 'pk', 'start_time', 'start_time_tz',
+        'end_time', 'duration_seconds', 'start_date', 'brief_description',
+        'category', 'location')
+
+    def __init__(self, project_slug, values):
+        self.project_slug = project_slug
+        (self.pk, self.start_time, self.start_time_tz, self.end_time,
+         self.duration_seconds, self.start_date, self.brief_description,
+         self.category, self.location) = values
+
+    def local_start_time(self):
+        """
+            The start time in the time zone that the record was started in.
+        """
+        try:
+            start_time_tz = pytz.timezone(self.start_time_tz)
+        except (pytz.UnknownTimeZoneError, AttributeError):
+            start_time_tz = timezone.get_current_timezone()
+        return timezone.localtime(self.start_time, start_time_tz)
+
+    def url(self, name):
+        return reverse(name, kwargs={'project_slug': self.project_slug,
+                                     'pk': self.pk})
+
+    def get_day_url(self):
+        if self.start_date is None:
+            return None
+        return reverse('project_day_view',
+            kwargs={'project_slug': self.project_slug,
+                    'day': self.start_date.isoformat()})
+
+    def get_edit_url(self):
+        return self.url('record_edit_view')
+
+    def get_delete_url(self):
+        return self.url('record_delete_view')
+
+    def get_close_url(self):
+        return self.url('record_close_view')
+
+
+class RecordRows(object):
+    """
+        Lazy listing of the records of a queryset as RecordRow objects, read
+        in chunks in the ordering.
+    """
+
+    def __init__(self, queryset, project_slug, ordering=('start_time', 'pk'),
+                 chunk_size=1000):
+        self.queryset = queryset
+        self.project_slug = project_slug
+        self.ordering = ordering
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for values in iterate_chunked(self.queryset, RecordRow.FIELDS,
+                self.ordering, self.chunk_size):
+            yield RecordRow(self.project_slug, values)
+
+    def __bool__(self):
+        return self.queryset.exists()
+    __nonzero__ = __bool__
@@ -0,0 +1,125 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+
+## Key of the bucket counting the zero values.
+ZERO_KEY = -1
+
+## Upper bounds (in seconds) of the histogram bins of the durations.
+HISTOGRAM_BOUNDS = (5 * 60, 15 * 60, 30 * 60, 60 * 60, 2 * 3600, 4 * 3600,
+    8 * 3600)
+
+
+class DurationSketch(object):
+    """
+        Quantile sketch of non-negative values with a relative accuracy
+        guarantee.  Values are counted in logarithmic buckets, the value of
+        bucket key k being within relative_accuracy of gamma ** k, so a
+        sketch of any number of values has a few hundred buckets at most.
+        Counts can be added and taken away again, and sketches with the same
+        accuracy are merged by adding their counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, counts=None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.counts = {}
+        for key, count in (counts or {}).items():
+            self.add_key(key, count)
+
+    def key(self, value):
+        """
+            Key of the bucket of the value.
+        """
+        if value <= 0:
+            return ZERO_KEY
+        return max(0, int(math.ceil(math.log(value) / self.log_gamma)))
+
+    def value(self, key):
+        """
+            Value that stands for the values of the bucket.
+        """
+        if key == ZERO_KEY:
+            return 0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add_key(self, key, count=1):
+        """
+            Add the count (negative to take it away) to the bucket.
+        """
+        count = self.counts.get(key, 0) + count
+        if count > 0:
+            self.counts[key] = count
+        else:
+            self.counts.pop(key, None)
+
+    def add(self, value, count=1):
+        """
+            Count the value, count times.
+        """
+        self.add_key(self.key(value), count)
+
+    def merge(self, other):
+        """
+            Add the counts of another sketch with the same accuracy.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Sketches of different accuracies')
+        for key, count in other.counts.items():
+            self.add_key(key, count)
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def quantile(self, q):
+        """
+            Approximate value below which the fraction q of the values are,
+            None for an empty sketch.
+        """
+        count = self.count
+        if not count:
+            return None
+
+        rank = q * (count - 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.counts))
+
+    def histogram(self, bounds=HISTOGRAM_BOUNDS):
+        """
+            Return (lower, upper, count) of the bins between the bounds, the
+            upper bound of the last bin being None.
+        """
+        bins = [0] * (len(bounds) + 1)
+        for key, count in self.counts.items():
+            value = self.value(key)
+            index = 0
+            while index < len(bounds) and value >= bounds[index]:
+                index += 1
+            bins[index] += count
+
+        lowers = (0,) + tuple(bounds)
+        uppers = tuple(bounds) + (None,)
+        return list(zip(lowers, uppers, bins))
@@ -0,0 +1,197 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from time_tracking.instrumentation import add_query_listener
+from time_tracking.instrumentation import remove_query_listener
+
+_state = threading.local()
+
+
+def threshold_ms():
+    """
+        Statements that take at least this many milliseconds are captured,
+        None when the capturing is disabled.
+    """
+    return getattr(settings, 'TIME_TRACKING_SLOW_QUERY_MS', None)
+
+
+class SlowQueryLog(object):
+    """
+        Ring buffer holding the most recently captured slow statements.
+    """
+
+    def __init__(self):
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def add(self, entry):
+        """
+            Store a captured statement, dropping the oldest one when full.
+        """
+        with self.lock:
+            if self.entries is None:
+                self.entries = deque(maxlen=getattr(settings,
+                    'TIME_TRACKING_SLOW_QUERY_LOG_SIZE', 100))
+            self.entries.append(entry)
+
+    def all(self):
+        """
+            Captured statements, most recent first.
+        """
+        with self.lock:
+            return list(reversed(self.entries or ()))
+
+    def clear(self):
+        """
+            Forget all of the captured statements.
+        """
+        with self.lock:
+            self.entries = None
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(connection, sql, params):
+    """
+        Return the query plan of the statement as text.  Only SELECT
+        statements are explained as not all of the backends can explain the
+        others.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        ## pysqlite commits the open transaction before any statement that
+        ## isn't a SELECT or a data change, EXPLAIN included.
+        if transaction.is_managed(using=connection.alias):
+            return 'EXPLAIN is not run within a transaction on sqlite'
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif vendor in ('postgresql', 'mysql'):
+        prefix = 'EXPLAIN '
+    else:
+        return 'EXPLAIN is not supported for %s' % vendor
+
+    ## A failing statement would abort the surrounding transaction on
+    ## postgresql, so the plan is fetched within a savepoint.
+    sid = transaction.savepoint(using=connection.alias)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + sql, params or ())
+        rows = cursor.fetchall()
+    except DatabaseError as error:
+        transaction.savepoint_rollback(sid, using=connection.alias)
+        return 'EXPLAIN failed: %s' % error
+    transaction.savepoint_commit(sid, using=connection.alias)
+
+    return '\n'.join(' | '.join('%s' % column for column in row)
+                     for row in rows)
+
+
+def capture_slow_query(connection, sql, params, duration):
+    """
+        Query listener that explains and stores the statements that are
+        slower than the threshold.
+    """
+    threshold = threshold_ms()
+    if threshold is None or duration * 1000 < threshold:
+        return
+
+    slow_query_log.add({
+        'time': timezone.now(),
+        'origin': ' > '.join(getattr(_state, 'origins', ())),
+        'database': connection.alias,
+        'sql': sql,
+        'params': repr(params),
+        'duration_ms': duration * 1000,
+        'plan': explain(connection, sql, params),
+    })
+
+
+def start_capturing(origin):
+    """
+        Capture the slow statements of the current thread, attributing them
+        to the origin until stop_capturing is called.  Origins nest, so a form
+        that is validated within a view is reported as "view > form".
+    """
+    if threshold_ms() is None:
+        return False
+
+    origins = getattr(_state, 'origins', None)
+    if not origins:
+        origins = _state.origins = []
+        add_query_listener(capture_slow_query)
+    origins.append(origin)
+    return True
+
+
+def stop_capturing():
+    """
+        Undo the most recent start_capturing.
+    """
+    origins = getattr(_state, 'origins', None)
+    if origins:
+        origins.pop()
+        if not origins:
+            remove_query_listener(capture_slow_query)
+
+
+def reset_capturing():
+    """
+        Drop every origin of the current thread.
+    """
+    _state.origins = []
+    remove_query_listener(capture_slow_query)
+
+
+@contextmanager
+def capturing_slow_queries(origin):
+    """
+        Context manager version of start_capturing and stop_capturing.
+    """
+    started = start_capturing(origin)
+    try:
+        yield
+    finally:
+        if started:
+            stop_capturing()
+
+
+def capture_slow_queries(origin):
+    """
+        Decorator that captures the slow statements of the function under the
+        origin name.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with capturing_slow_queries(origin):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
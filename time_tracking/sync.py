@@ -0,0 +1,144 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from time_tracking.models import Project, Category, Location, Record, Change
+from time_tracking.models import field_values
+
+## Number of objects or changes per sync batch.
+SYNC_BATCH_SIZE = 500
+
+## Synchronized models, parents first.
+MODELS = (
+    ('project', Project),
+    ('category', Category),
+    ('location', Location),
+    ('record', Record),
+)
+
+
+def owned(model, user):
+    """
+        The objects of the model that belong to the active projects of the
+        user.
+    """
+    if model is Project:
+        return Project.objects.filter(owner=user, deleting=False)
+    return model.objects.filter(project__owner=user, project__deleting=False)
+
+
+def parse_token(token):
+    """
+        Return the sequence number, and the model and primary key that a
+        snapshot stopped at (None when it is done), of a sync token.  Raise
+        ValueError when the token isn't valid.
+    """
+    if not token:
+        return None, None, None
+
+    parts = token.split(':')
+    if len(parts) == 1:
+        return int(parts[0]), None, None
+    if len(parts) == 3 and parts[1] in dict(MODELS):
+        return int(parts[0]), parts[1], int(parts[2])
+    raise ValueError('invalid sync token %r' % token)
+
+
+def empty_batch():
+    return {'changed': dict((name, []) for name, model in MODELS),
+            'deleted': dict((name, []) for name, model in MODELS)}
+
+
+def snapshot_batch(user, sequence, model_name=None, after=0,
+                   limit=SYNC_BATCH_SIZE):
+    """
+        Batch of the objects of the user, starting after the object of the
+        model with the primary key after.  The changes made from the
+        sequence number on are sent once the snapshot is done, so objects
+        changed while it is read are sent again.
+    """
+    batch = empty_batch()
+    names = [name for name, model in MODELS]
+    start = names.index(model_name) if model_name else 0
+
+    for index, (name, model) in enumerate(MODELS[start:], start):
+        objects = owned(model, user).order_by('pk')
+        if index == start:
+            objects = objects.filter(pk__gt=after)
+        objects = list(objects[:limit])
+
+        sequences = Change.objects.latest_sequences(name,
+            [instance.pk for instance in objects])
+        for instance in objects:
+            values = field_values(instance)
+            values['sequence'] = sequences.get(instance.pk, 0)
+            batch['changed'][name].append(values)
+
+        limit -= len(objects)
+        if not limit:
+            batch['token'] = '%d:%s:%d' % (sequence, name, objects[-1].pk)
+            batch['more'] = True
+            return batch
+
+    batch['token'] = str(sequence)
+    batch['more'] = False
+    return batch
+
+
+def delta_batch(user, sequence, limit=SYNC_BATCH_SIZE):
+    """
+        Batch of the objects of the user that changed after the sequence
+        number, as they are after their last change in the batch, and of the
+        ones that were deleted (tombstones).
+    """
+    changes = list(Change.objects.after(user, sequence, limit + 1))
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {}
+    for change in changes:
+        latest[(change.model, change.object_id)] = change
+
+    batch = empty_batch()
+    for change in sorted(latest.values(), key=lambda change: change.pk):
+        if change.action == Change.DELETE:
+            batch['deleted'][change.model].append({'id': change.object_id,
+                'sequence': change.pk})
+        else:
+            values = change.as_dict()['data']
+            values['sequence'] = change.pk
+            batch['changed'][change.model].append(values)
+
+    batch['token'] = str(changes[-1].pk if changes else sequence)
+    batch['more'] = more
+    return batch
+
+
+def sync_batch(user, token, limit=SYNC_BATCH_SIZE):
+    """
+        Next batch of a client holding the token (empty for a first sync,
+        which starts with a snapshot), along with the token to ask for the
+        following one with.  Raise ValueError when the token isn't valid.
+    """
+    sequence, model_name, after = parse_token(token)
+    if sequence is None:
+        return snapshot_batch(user, Change.objects.settled_sequence(user),
+            limit=limit)
+    if model_name is not None:
+        return snapshot_batch(user, sequence, model_name, after, limit)
+    return delta_batch(user, sequence, limit)
@@ -0,0 +1,100 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from time_tracking.jobs import job, periodic
+from time_tracking.models import Project, Record
+
+logger = logging.getLogger(__name__)
+
+
+@job('delete_project')
+def delete_project(running_job, project_id):
+    """
+        Delete the project along with all of its records, categories and
+        locations, in chunks.
+    """
+    try:
+        project = Project.objects.get(pk=project_id)
+    except Project.DoesNotExist:
+        running_job.report(0, message='Project was already deleted')
+        return
+
+    running_job.report(0, message='Deleting project')
+    project.delete_in_chunks(chunk_size=getattr(settings,
+        'TIME_TRACKING_DELETE_CHUNK_SIZE', 1000),
+        progress=lambda deleted, total: running_job.report(deleted, total))
+    running_job.report(running_job.progress, message='Project deleted')
+
+
+def close_stale_records(now=None, chunk_size=1000, progress=None):
+    """
+        Cap the records that have been left open for longer than the
+        stale_record_hours of their project, or settings.
+        TIME_TRACKING_STALE_RECORD_HOURS for projects without one.  progress
+        is called with the number of records capped so far after every
+        chunk.  Returns the number of records that were capped.  A threshold
+        below one hour leaves the open records alone, rather than capping
+        every running record.
+    """
+    if now is None:
+        now = timezone.now()
+    default_hours = getattr(settings, 'TIME_TRACKING_STALE_RECORD_HOURS',
+        None)
+    if default_hours is not None and default_hours < 1:
+        logger.warning('Ignoring TIME_TRACKING_STALE_RECORD_HOURS of %r, '
+            'it must be at least 1', default_hours)
+        default_hours = None
+
+    projects = Project.objects.filter(deleting=False).exclude(
+        stale_record_hours__lt=1)
+    if default_hours is None:
+        projects = projects.exclude(stale_record_hours=None)
+
+    capped = [0]
+    for project_id, hours in projects.values_list('pk',
+            'stale_record_hours').iterator():
+        if hours is None:
+            hours = default_hours
+
+        def log_chunk(count):
+            logger.info('Capped %d stale records of project %d at %d hours',
+                count, project_id, hours)
+            capped[0] += count
+            if progress is not None:
+                progress(capped[0])
+
+        Record.objects.cap_stale(project_id, hours, now, chunk_size,
+            progress=log_chunk)
+
+    return capped[0]
+
+
+@periodic('close_stale_records', lambda: getattr(settings,
+    'TIME_TRACKING_STALE_RECORD_CHECK_SECONDS', 3600))
+def close_stale_records_job(running_job):
+    """
+        Periodic job version of close_stale_records.
+    """
+    capped = close_stale_records(progress=running_job.report)
+    running_job.report(capped, message='Capped %d stale records' % capped)
@@ -0,0 +1,46 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django import template
+
+from time_tracking import caching
+
+register = template.Library()
+
+
+@register.filter
+def duration(seconds):
+    """
+        Format a number of seconds as hours and minutes, e.g. 12:05.
+    """
+    try:
+        minutes = int(round(float(seconds or 0) / 60))
+    except (TypeError, ValueError):
+        return ''
+    return '%d:%02d' % divmod(minutes, 60)
+
+
+@register.assignment_tag
+def project_sidebar(project):
+    """
+        The cached categories, locations and open record count of the project
+        shown by the sidebar menu.
+    """
+    return caching.project_sidebar(project)
+
@@ -17,7 +17,70 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.urlresolvers import reverse, resolve
+from django.db import connection, connections, router, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+import datetime
+import json
+import threading
+import time
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from decimal import Decimal
+
+from time_tracking import jobs
+from time_tracking.models import Job, Project, Record, Category, Location
+from time_tracking.models import TimeAggregate, Budget, BudgetCrossing
+from time_tracking.models import DescriptionSuggestion
+from time_tracking.routers import ReplicaRouter
+from time_tracking.billing import BillingReport, ROUND_RECORDS
+from time_tracking.sketches import DurationSketch
+from time_tracking.gaps import find_gaps, daily_gap_totals
+from time_tracking.models import DurationBucket, Change, Webhook
+from time_tracking.models import send_pending_events, pending_events
+from time_tracking.views.forms import ProjectForm, WebhookForm
+from time_tracking.views.category import CategoryDetailView
+from time_tracking.views.mixins import encode_cursor, decode_cursor
+from time_tracking import webhooks
+from time_tracking import instrumentation
+from time_tracking.instrumentation import query_listener
+from time_tracking.metrics import Histogram, VIEW_METRICS, view_metrics
+from time_tracking.middleware import ViewMeasurement, ViewMetricsMiddleware
+from time_tracking.middleware import JobWorkerMiddleware
+from time_tracking import slow_queries
+from time_tracking.slow_queries import capture_slow_query, explain
+from time_tracking.slow_queries import slow_query_log
+from time_tracking.tasks import close_stale_records
+from time_tracking.rows import iterate_chunked, RecordRows
+from time_tracking.loadtest import LoadTestResults, percentile, is_lock_error
+from time_tracking.loadtest import LoadTest
+from time_tracking.sync import sync_batch, parse_token
+from time_tracking.templatetags.time_tracking_tags import duration
+from django.db import DatabaseError
+from django.db.models.signals import post_save
+
+
+class CommittingTestCase(TransactionTestCase):
+    """
+        Test case whose writes are committed.  Drops the webhook events held
+        back by the test cases before it, whose transactions are never over,
+        and what they cached for objects that were rolled back.
+    """
+
+    def setUp(self):
+        pending_events.events = []
+        cache.clear()
 
 
 class SimpleTest(TestCase):
@@ -26,3 +89,1729 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+@override_settings(TIME_TRACKING_JOBS_INLINE=True)
+class JobTest(TestCase):
+    """
+        Jobs are executed as soon as they are enqueued in the inline mode,
+        otherwise by the workers that JobWorkerMiddleware starts.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+
+    def test_delete_project(self):
+        self.client.login(username='owner', password='password')
+        response = self.client.post(self.project.get_delete_url())
+
+        job = Job.objects.get()
+        self.assertRedirects(response, job.get_absolute_url())
+        self.assertEqual(job.status, Job.DONE)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+
+    def test_failing_job(self):
+        job = jobs.enqueue('no_such_job', owner=self.user)
+
+        job = Job.objects.get(pk=job.pk)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertTrue(job.finished)
+
+    def test_requeue_stale(self):
+        now = timezone.now()
+        stale = Job.objects.create(name='no_such_job', status=Job.RUNNING,
+            started=now - datetime.timedelta(hours=2),
+            heartbeat=now - datetime.timedelta(hours=2))
+        running = Job.objects.create(name='no_such_job', status=Job.RUNNING,
+            started=now - datetime.timedelta(minutes=10),
+            heartbeat=now - datetime.timedelta(minutes=10))
+        ## Started long ago, but still reporting its progress.
+        reporting = Job.objects.create(name='no_such_job',
+            status=Job.RUNNING, started=now - datetime.timedelta(hours=2),
+            heartbeat=now - datetime.timedelta(hours=2))
+        reporting.report(10)
+
+        with self.settings(TIME_TRACKING_JOB_TIMEOUT_SECONDS=3600):
+            self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=running.pk).status, Job.RUNNING)
+        self.assertEqual(Job.objects.get(pk=reporting.pk).status,
+            Job.RUNNING)
+
+    def test_start_workers(self):
+        started = []
+        self.addCleanup(setattr, jobs, 'workers', jobs.workers)
+        jobs.workers = type('StandInPool', (object, ), {
+            'start': lambda pool: started.append(True)})()
+
+        self.assertRaises(MiddlewareNotUsed, JobWorkerMiddleware)
+        self.assertEqual(started, [])
+        with self.settings(TIME_TRACKING_JOBS_INLINE=False):
+            with self.settings(TIME_TRACKING_JOB_WORKERS=0):
+                self.assertRaises(MiddlewareNotUsed, JobWorkerMiddleware)
+            ## Requests don't start the workers on their own.
+            self.client.get(reverse('project_list_view'))
+            self.assertEqual(started, [])
+            self.assertRaises(MiddlewareNotUsed, JobWorkerMiddleware)
+        self.assertEqual(started, [True])
+
+
+class ProjectDeletionTest(TestCase):
+    """
+        Projects are hidden first, then deleted in chunks along with the
+        tables derived from their records.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = self.populate('project')
+        self.other = self.populate('other')
+
+    def populate(self, slug):
+        project = Project.objects.create(owner=self.user, name=slug,
+            slug=slug)
+        category = Category.objects.create(project=project, name='Category',
+            slug='category')
+        location = Location.objects.create(project=project, name='Location',
+            slug='location')
+        Budget.objects.create(project=project, period=Budget.TOTAL, hours=1)
+        Webhook.objects.create(project=project, url='http://example.com/')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        for hour in range(3):
+            Record.objects.create(project=project, category=category,
+                location=location, brief_description='Work %d' % hour,
+                start_time=start + datetime.timedelta(hours=hour),
+                end_time=start + datetime.timedelta(hours=hour, minutes=50),
+                start_time_tz='UTC')
+        return project
+
+    def rows(self, project):
+        return [model.objects.filter(project=project).count() for model in (
+            Record, Category, Location, TimeAggregate, DurationBucket,
+            DescriptionSuggestion, Budget, Webhook)] + [
+            BudgetCrossing.objects.filter(budget__project=project).count()]
+
+    def test_mark_deleting(self):
+        self.project.mark_deleting()
+
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertTrue(project.deleting)
+        self.assertEqual(project.slug, '~deleting-%d' % project.pk)
+        self.assertEqual(Change.objects.filter(model='project',
+            object_id=project.pk).latest('pk').action, Change.DELETE)
+
+        self.client.login(username='owner', password='password')
+        self.assertEqual(self.client.get(reverse('project_detail_view',
+            kwargs={'project_slug': 'project'})).status_code, 404)
+        ## Nor is it served under its renamed slug.
+        for name, kwargs in (('project_detail_view', {}),
+                             ('project_day_view', {'day': '2013-05-01'})):
+            kwargs['project_slug'] = project.slug
+            self.assertEqual(self.client.get(reverse(name,
+                kwargs=kwargs)).status_code, 404)
+        replacement = Project.objects.create(owner=self.user, name='project',
+            slug='project')
+        self.assertEqual(self.client.get(
+            replacement.get_absolute_url()).status_code, 200)
+
+    def test_delete_in_chunks(self):
+        rows = self.rows(self.project)
+        self.assertTrue(all(rows))
+        other_rows = self.rows(self.other)
+        self.project.mark_deleting()
+        last = Change.objects.latest('pk').pk
+        category = Category.objects.get(project=self.project)
+        location = Location.objects.get(project=self.project)
+
+        progress = []
+        self.project.delete_in_chunks(chunk_size=2,
+            progress=lambda deleted, total: progress.append((deleted, total)))
+
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(self.rows(self.project), [0] * len(rows))
+        self.assertEqual(self.rows(self.other), other_rows)
+        self.assertEqual(list(Change.objects.filter(pk__gt=last).values_list(
+            'model', 'object_id', 'action')), [
+            ('category', category.pk, Change.DELETE),
+            ('location', location.pk, Change.DELETE),
+        ])
+
+        total = sum(rows)
+        self.assertEqual(progress[-1], (total, total))
+        self.assertEqual([deleted for deleted, total in progress],
+            sorted(deleted for deleted, total in progress))
+        self.assertTrue(all(later - earlier <= 2 for (earlier, total), (later,
+            total) in zip([(0, total)] + progress, progress)))
+
+
+@override_settings(TIME_TRACKING_REPLICA_DATABASE='time_tracking_replica',
+    MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+        'time_tracking.middleware.ReplicaRouterMiddleware',))
+class ReplicaRouterTest(TestCase):
+    """
+        Reporting views read from the replica, except for clients that have
+        just written.  The replica is a separate in memory SQLite database
+        that nothing is replicated to, so what a view shows tells where it
+        read from.
+    """
+    replica = 'time_tracking_replica'
+
+    def setUp(self):
+        connections.databases[self.replica] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        self.addCleanup(self.remove_replica)
+        call_command('syncdb', database=self.replica, interactive=False,
+            verbosity=0)
+
+        self.routers = router.routers
+        router.routers = [ReplicaRouter()] + list(self.routers)
+
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        User.objects.using(self.replica).create(pk=self.user.pk,
+            username='owner')
+
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+        Project.objects.using(self.replica).create(pk=self.project.pk,
+            owner_id=self.user.pk, name='Project', slug='project')
+
+        self.client.login(username='owner', password='password')
+
+    def tearDown(self):
+        router.routers = self.routers
+
+    def remove_replica(self):
+        connections[self.replica].close()
+        delattr(connections._connections, self.replica)
+        del connections.databases[self.replica]
+
+    def test_reporting_view_reads_replica(self):
+        Record.objects.create(project=self.project,
+            start_time=timezone.now(), start_time_tz='UTC')
+
+        response = self.client.get(self.project.get_absolute_url())
+        self.assertEqual(response.context['project'].open_record_count(), 0)
+
+    def test_read_your_writes(self):
+        response = self.client.post(self.project.get_add_record_url(), {
+            'start_time_0': '2013-05-01', 'start_time_1': '10:00',
+            'start_time_tz': 'UTC', 'end_time_tz': 'UTC',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Record.objects.using('default').exists())
+        self.assertFalse(Record.objects.using(self.replica).exists())
+
+        response = self.client.get(self.project.get_absolute_url())
+        self.assertEqual(response.context['project'].open_record_count(), 1)
+
+    def test_writes_go_to_primary(self):
+        project = Project.objects.using(self.replica).get(pk=self.project.pk)
+        project.description = 'Changed'
+        project.save()
+
+        self.assertEqual(Project.objects.using('default').get(
+            pk=self.project.pk).description, 'Changed')
+
+
+@override_settings(TIME_TRACKING_METRICS=True,
+    MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+        'time_tracking.middleware.ViewMetricsMiddleware',))
+class ViewMetricsTest(TestCase):
+    """
+        The time_tracking views are timed and their SQL statements counted
+        into per view histograms.
+    """
+
+    def setUp(self):
+        view_metrics.reset()
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+        self.client.login(username='owner', password='password')
+
+    def tearDown(self):
+        view_metrics.reset()
+
+    def test_histogram(self):
+        histogram = Histogram((1, 2, 5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative_counts(),
+            [(1, 2), (2, 3), (5, 4), (float('inf'), 5)])
+        self.assertAlmostEqual(histogram.mean(), 3.2)
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.5)
+        ## The values above the last bucket are reported at its bound.
+        self.assertEqual(histogram.quantile(1.0), 5)
+        self.assertEqual(Histogram((1, 2)).quantile(0.5), 0.0)
+
+    def test_query_listener(self):
+        statements = []
+
+        def listener(connection, sql, params, duration):
+            ## Statements of the listener itself are not reported.
+            Project.objects.count()
+            statements.append(sql)
+
+        with query_listener(listener):
+            Project.objects.count()
+            list(Record.objects.all())
+        Project.objects.count()
+
+        self.assertEqual(len(statements), 2)
+        self.assertIn('time_tracking_record', statements[1])
+
+    def test_sql_counting(self):
+        measurement = ViewMeasurement('project_detail_view')
+        for _ in range(3):
+            Project.objects.count()
+        measurement.finish()
+        Project.objects.count()
+
+        self.assertEqual(view_metrics.histogram('sql_queries',
+            'project_detail_view').sum, 3)
+        self.assertEqual(view_metrics.histogram('view_seconds',
+            'project_detail_view').count, 1)
+
+    def test_view_timing(self):
+        self.client.get(self.project.get_absolute_url())
+        self.client.get(self.project.get_absolute_url())
+
+        self.assertEqual(view_metrics.view_names(), ['project_detail_view'])
+        for metric, _, _ in VIEW_METRICS:
+            self.assertEqual(view_metrics.histogram(metric,
+                'project_detail_view').count, 2)
+        self.assertTrue(view_metrics.histogram('sql_queries',
+            'project_detail_view').sum >= 2)
+        self.assertTrue(view_metrics.histogram('template_seconds',
+            'project_detail_view').sum > 0)
+        ## The measurement stops listening along with the request.
+        self.assertEqual(instrumentation._state.listeners, [])
+
+    def test_other_urls(self):
+        middleware = ViewMetricsMiddleware()
+        request = RequestFactory().get('/accounts/login/')
+        request.resolver_match = resolve('/accounts/login/')
+        middleware.process_view(request, None, (), {})
+        middleware.process_response(request, None)
+
+        self.assertEqual(view_metrics.view_names(), [])
+
+    def test_prometheus(self):
+        view_metrics.observe('project_detail_view', view_seconds=0.003,
+            sql_queries=4, sql_seconds=0.001, template_seconds=0.002)
+        lines = view_metrics.prometheus().splitlines()
+
+        self.assertIn('# TYPE time_tracking_sql_queries histogram', lines)
+        self.assertIn('time_tracking_sql_queries_bucket{'
+            'view="project_detail_view",le="3"} 0', lines)
+        self.assertIn('time_tracking_sql_queries_bucket{'
+            'view="project_detail_view",le="5"} 1', lines)
+        self.assertIn('time_tracking_sql_queries_bucket{'
+            'view="project_detail_view",le="+Inf"} 1', lines)
+        self.assertIn('time_tracking_sql_queries_count{'
+            'view="project_detail_view"} 1', lines)
+
+
+@override_settings(TIME_TRACKING_SLOW_QUERY_MS=5,
+    MIDDLEWARE_CLASSES=settings.MIDDLEWARE_CLASSES + (
+        'time_tracking.middleware.SlowQueryMiddleware',))
+class SlowQueryTest(TestCase):
+    """
+        The statements of the time_tracking views that take longer than the
+        threshold are captured together with their query plan.
+    """
+
+    def setUp(self):
+        slow_query_log.clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+
+    def tearDown(self):
+        slow_queries.reset_capturing()
+        slow_query_log.clear()
+
+    def test_threshold(self):
+        sql = 'SELECT COUNT(*) FROM time_tracking_project WHERE id = %s'
+        with slow_queries.capturing_slow_queries('view'):
+            capture_slow_query(connection, sql, (1,), 0.004)
+            capture_slow_query(connection, sql, (2,), 0.006)
+
+        entries = slow_query_log.all()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['params'], repr((2,)))
+        self.assertAlmostEqual(entries[0]['duration_ms'], 6)
+        self.assertEqual(entries[0]['origin'], 'view')
+        self.assertEqual(entries[0]['database'], 'default')
+        self.assertTrue(entries[0]['plan'])
+
+    @override_settings(TIME_TRACKING_SLOW_QUERY_MS=0)
+    def test_origins(self):
+        with slow_queries.capturing_slow_queries('view'):
+            with slow_queries.capturing_slow_queries('form'):
+                Project.objects.count()
+            Record.objects.count()
+        Location.objects.count()
+
+        self.assertEqual([entry['origin'] for entry in slow_query_log.all()],
+            ['view', 'view > form'])
+
+    def test_disabled(self):
+        with self.settings(TIME_TRACKING_SLOW_QUERY_MS=None):
+            self.assertFalse(slow_queries.start_capturing('view'))
+            capture_slow_query(connection, 'SELECT 1', (), 10)
+        self.assertEqual(slow_query_log.all(), [])
+
+    def test_explain(self):
+        self.assertEqual(explain(connection,
+            'UPDATE time_tracking_project SET name = %s', ('Name',)), '')
+        if connection.vendor == 'sqlite':
+            self.assertEqual(explain(connection,
+                'SELECT * FROM time_tracking_project', ()),
+                'EXPLAIN is not run within a transaction on sqlite')
+        else:
+            self.assertTrue(explain(connection,
+                'SELECT * FROM missing_table', ()).startswith(
+                'EXPLAIN failed'))
+        ## The transaction of the test is still usable.
+        self.assertEqual(Project.objects.count(), 1)
+
+    @override_settings(TIME_TRACKING_SLOW_QUERY_MS=0,
+        TIME_TRACKING_SLOW_QUERY_LOG_SIZE=2)
+    def test_log_size(self):
+        with slow_queries.capturing_slow_queries('view'):
+            for model in (Project, Record, Location):
+                model.objects.count()
+
+        entries = slow_query_log.all()
+        self.assertEqual(len(entries), 2)
+        self.assertIn('time_tracking_location', entries[0]['sql'])
+        self.assertIn('time_tracking_record', entries[1]['sql'])
+
+    @override_settings(TIME_TRACKING_SLOW_QUERY_MS=0)
+    def test_middleware(self):
+        self.client.login(username='owner', password='password')
+        slow_query_log.clear()
+        self.client.get(self.project.get_absolute_url())
+
+        entries = slow_query_log.all()
+        self.assertTrue(entries)
+        self.assertTrue(all(entry['origin'] == 'project_detail_view'
+            for entry in entries))
+        ## Capturing stops along with the request.
+        Project.objects.count()
+        self.assertEqual(len(slow_query_log.all()), len(entries))
+
+
+class TimeAggregateTest(TestCase):
+    """
+        The precomputed totals follow the record writes and match a rebuild
+        from the records.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        self.category = Category.objects.create(project=self.project,
+            name='Category', slug='category')
+        self.start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+
+    def totals(self, resolution, category=None):
+        return TimeAggregate.objects.totals(self.project, resolution,
+            datetime.date(2013, 1, 1), datetime.date(2013, 12, 31),
+            category=category)
+
+    def test_record_writes(self):
+        record = Record.objects.create(project=self.project,
+            category=self.category, start_time=self.start,
+            start_time_tz='UTC')
+        self.assertEqual(self.totals(TimeAggregate.DAY), [])
+
+        record.end_time = self.start + datetime.timedelta(hours=2)
+        record.save()
+        self.assertEqual(self.totals(TimeAggregate.WEEK),
+            [(datetime.date(2013, 4, 29), 7200)])
+        self.assertEqual(self.totals(TimeAggregate.MONTH, self.category),
+            [(datetime.date(2013, 5, 1), 7200)])
+
+        record.start_time = self.start + datetime.timedelta(days=1)
+        record.end_time = record.start_time + datetime.timedelta(hours=1)
+        record.save()
+        self.assertEqual(self.totals(TimeAggregate.DAY), [
+            (datetime.date(2013, 5, 1), 0),
+            (datetime.date(2013, 5, 2), 3600),
+        ])
+
+        record.delete()
+        self.assertEqual(self.totals(TimeAggregate.MONTH),
+            [(datetime.date(2013, 5, 1), 0)])
+
+    def test_rebuild(self):
+        Record.objects.bulk_create([Record(project=self.project,
+            category=self.category, start_time_tz='UTC',
+            start_time=self.start + datetime.timedelta(days=days),
+            end_time=self.start + datetime.timedelta(days=days, hours=1))
+            for days in range(0, 60, 3)])
+        totals = self.totals(TimeAggregate.WEEK)
+
+        TimeAggregate.objects.rebuild(self.project)
+        self.assertEqual(self.totals(TimeAggregate.WEEK), totals)
+
+
+class RecordTransactionTest(CommittingTestCase):
+    """
+        A record is saved in one transaction with the tables derived from
+        it.
+    """
+
+    def test_derived_update_fails(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        budget = Budget.objects.create(project=project, period=Budget.TOTAL,
+            hours=2)
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        record = Record.objects.create(project=project, start_time=start,
+            end_time=start + datetime.timedelta(hours=1),
+            start_time_tz='UTC')
+
+        def fail(sender, instance, **kwargs):
+            raise DatabaseError('derived update failed')
+        post_save.connect(fail, sender=Record)
+        self.addCleanup(post_save.disconnect, fail, sender=Record)
+
+        record.end_time = start + datetime.timedelta(hours=3)
+        self.assertRaises(DatabaseError, record.save)
+
+        self.assertEqual(Record.objects.get(pk=record.pk).duration_seconds,
+            3600)
+        self.assertEqual(budget.consumed_seconds(), 3600)
+        self.assertEqual(list(BudgetCrossing.objects.values_list(
+            'threshold', flat=True)), [50])
+        self.assertEqual(DurationBucket.objects.sketch([project.pk]).count,
+            1)
+        self.assertEqual(Change.objects.filter(model='record').count(), 1)
+
+
+class LocationListTest(TestCase):
+    """
+        The locations of a project are listed with their usage.
+    """
+
+    def test_usage(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        office = Location.objects.create(project=project, name='Office',
+            slug='office')
+        Location.objects.create(project=project, name='Home', slug='home')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        Record.objects.create(project=project, location=office,
+            start_time=start, end_time=start + datetime.timedelta(hours=1),
+            start_time_tz='UTC')
+        Record.objects.create(project=project, location=office,
+            start_time=start + datetime.timedelta(days=1),
+            start_time_tz='UTC')
+
+        self.client.login(username='owner', password='password')
+        response = self.client.get(project.get_location_list_url())
+
+        self.assertEqual([(location.name, location.total_seconds,
+            location.record_count, location.last_used)
+            for location in response.context['locations']],
+            [('Home', None, 0, None),
+             ('Office', 3600, 2, start + datetime.timedelta(days=1))])
+
+
+class CachedChoicesTest(TestCase):
+    """
+        The category and location choices of the record forms come from the
+        cache, which is dropped when a category or location changes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        self.category = Category.objects.create(project=self.project,
+            name='Category', slug='category')
+        self.client.login(username='owner', password='password')
+
+    def test_invalidation(self):
+        response = self.client.get(self.project.get_add_record_url())
+        self.assertContains(response, '>Category</option>')
+
+        self.category.name = 'Renamed'
+        self.category.save()
+
+        response = self.client.get(self.project.get_add_record_url())
+        self.assertContains(response, '>Renamed</option>')
+
+    def test_other_project(self):
+        other = Project.objects.create(owner=self.project.owner,
+            name='Other', slug='other')
+        category = Category.objects.create(project=other, name='Other',
+            slug='other')
+
+        response = self.client.post(self.project.get_add_record_url(), {
+            'start_time_0': '2013-05-01', 'start_time_1': '10:00',
+            'start_time_tz': 'UTC', 'end_time_tz': 'UTC',
+            'category': category.pk,
+        })
+        self.assertFormError(response, 'form', 'category',
+            'Select a valid choice. %d is not one of the available '
+            'choices.' % category.pk)
+
+    def test_sidebar(self):
+        record = Record.objects.create(project=self.project,
+            start_time=timezone.now(), start_time_tz='UTC')
+
+        response = self.client.get(self.category.get_absolute_url())
+        self.assertContains(response, 'Open Records: 1')
+
+        record.close()
+        Category.objects.create(project=self.project, name='Added',
+            slug='added')
+
+        response = self.client.get(self.category.get_absolute_url())
+        self.assertContains(response, 'Open Records: 0')
+        self.assertContains(response, '>Added</a>')
+
+
+class BudgetTest(TestCase):
+    """
+        Budgets read the time consumed from the totals and mark the
+        thresholds as the records cross them.
+    """
+
+    def test_crossings(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        budget = Budget.objects.create(project=project, period=Budget.TOTAL,
+            hours=2)
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+
+        record = Record.objects.create(project=project, start_time=start,
+            end_time=start + datetime.timedelta(hours=1),
+            start_time_tz='UTC')
+        self.assertEqual(budget.consumed_seconds(), 3600)
+        self.assertEqual(list(BudgetCrossing.objects.values_list(
+            'threshold', flat=True)), [50])
+
+        record.end_time = start + datetime.timedelta(hours=3)
+        record.save()
+        self.assertEqual(budget.percent(), 150)
+        self.assertEqual(sorted(BudgetCrossing.objects.values_list(
+            'threshold', flat=True)), [50, 80, 100])
+
+        record.delete()
+        self.assertEqual(budget.remaining_seconds(), 7200)
+
+
+class ProjectTotalsTest(TestCase):
+    """
+        The project list shows the totals and the last activity of every
+        project, read in a single query.
+    """
+
+    def test_with_totals(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        busy = Project.objects.create(owner=user, name='Busy', slug='busy')
+        idle = Project.objects.create(owner=user, name='Idle', slug='idle')
+        for start, minutes in (((2013, 5, 1, 10), 60), ((2013, 5, 2, 9), 30),
+                               ((2013, 5, 3, 8), None)):
+            start = datetime.datetime(*start, tzinfo=timezone.utc)
+            Record.objects.create(project=busy, start_time=start,
+                end_time=minutes and start + datetime.timedelta(
+                    minutes=minutes), start_time_tz='UTC')
+
+        projects = dict((project.slug, project)
+            for project in Project.objects.with_totals())
+        busy, idle = projects['busy'], projects['idle']
+        self.assertEqual((busy.total_seconds, busy.record_count,
+            busy.closed_record_count, busy.open_record_count()),
+            (5400, 3, 2, 1))
+        self.assertEqual(busy.last_activity(),
+            datetime.datetime(2013, 5, 3, 8, tzinfo=timezone.utc))
+        self.assertEqual((idle.total_seconds, idle.record_count,
+            idle.open_record_count(), idle.last_activity()),
+            (None, 0, 0, None))
+
+        self.assertEqual(duration(5400), '1:30')
+        self.assertEqual(duration(59), '0:01')
+        self.assertEqual(duration(None), '0:00')
+        self.assertEqual(duration('x'), '')
+
+        self.client.login(username='owner', password='password')
+        response = self.client.get(reverse('project_list_view'))
+        self.assertContains(response, 'Total: 1:30,')
+        self.assertContains(response, 'Total: 0:00,')
+        self.assertContains(response, 'Last Activity: None')
+
+
+class RunningRecordsTest(TestCase):
+    """
+        The open records of all of the projects of the user are listed
+        together.
+    """
+
+    def test_running_records(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        other = User.objects.create_user('other', 'other@example.com',
+            'password')
+        first = Project.objects.create(owner=user, name='First',
+            slug='first')
+        second = Project.objects.create(owner=user, name='Second',
+            slug='second')
+        deleting = Project.objects.create(owner=user, name='Deleting',
+            slug='deleting')
+        foreign = Project.objects.create(owner=other, name='Foreign',
+            slug='foreign')
+        category = Category.objects.create(project=second, name='Category',
+            slug='category')
+
+        now = timezone.now()
+
+        def record(project, hours, closed=False, category=None):
+            start = now - datetime.timedelta(hours=hours)
+            return Record.objects.create(project=project, category=category,
+                brief_description='%s %d' % (project.name, hours),
+                start_time=start, start_time_tz='UTC',
+                end_time=now if closed else None)
+
+        later = record(first, 1)
+        earlier = record(second, 3, category=category)
+        record(first, 2, closed=True)
+        record(deleting, 4)
+        record(foreign, 5)
+        deleting.mark_deleting()
+
+        self.client.login(username='owner', password='password')
+        response = self.client.get(reverse('running_records_view'),
+            {'format': 'json'})
+        records = json.loads(response.content.decode('utf-8'))
+
+        self.assertEqual([(record['id'], record['project'],
+                           record['category']) for record in records],
+            [(earlier.pk, 'Second', 'Category'), (later.pk, 'First', None)])
+        self.assertTrue(10790 <= records[0]['elapsed_seconds'] <= 10830)
+        self.assertEqual(records[1]['close_url'], reverse('record_close_view',
+            kwargs={'project_slug': 'first', 'pk': later.pk}))
+
+        response = self.client.get(reverse('running_records_view'))
+        self.assertContains(response, 'Second 3')
+        self.assertNotContains(response, 'Deleting 4')
+        self.assertNotContains(response, 'Foreign 5')
+
+
+class DurationSecondsTest(TestCase):
+    """
+        The stored duration of a record follows every way a record is
+        written.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        self.start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+
+    def stored(self, record):
+        return Record.objects.filter(pk=record.pk).values_list(
+            'duration_seconds', flat=True)[0]
+
+    def test_save_and_edit(self):
+        record = Record.objects.create(project=self.project,
+            start_time=self.start, start_time_tz='UTC')
+        self.assertEqual(self.stored(record), None)
+
+        record.end_time = self.start + datetime.timedelta(minutes=90)
+        record.save()
+        self.assertEqual(self.stored(record), 5400)
+
+        record.start_time = self.start - datetime.timedelta(minutes=30)
+        record.save(update_fields=['start_time'])
+        self.assertEqual(self.stored(record), 7200)
+
+        record.end_time = record.start_time - datetime.timedelta(minutes=1)
+        record.save()
+        self.assertEqual(self.stored(record), 0)
+
+        record.end_time = None
+        record.save()
+        self.assertEqual(self.stored(record), None)
+
+    def test_close(self):
+        record = Record.objects.create(project=self.project,
+            start_time=timezone.now() - datetime.timedelta(hours=2),
+            start_time_tz='UTC')
+        record.close()
+
+        record = Record.objects.get(pk=record.pk)
+        self.assertEqual(record.duration_seconds,
+            int((record.end_time - record.start_time).total_seconds()))
+        self.assertTrue(7200 <= record.duration_seconds < 7260)
+
+    def test_bulk_create(self):
+        Record.objects.bulk_create([
+            Record(project=self.project, start_time=self.start,
+                end_time=self.start + datetime.timedelta(minutes=30),
+                start_time_tz='UTC'),
+            Record(project=self.project, start_time=self.start,
+                start_time_tz='UTC'),
+        ])
+        self.assertEqual(sorted(Record.objects.values_list(
+            'duration_seconds', flat=True)), [None, 1800])
+
+    def test_backfill_records(self):
+        for minutes in (15, 45, None):
+            Record.objects.create(project=self.project, start_time=self.start,
+                end_time=minutes and self.start + datetime.timedelta(
+                    minutes=minutes), start_time_tz='UTC')
+        Record.objects.update(duration_seconds=None, start_date=None,
+            start_week=None)
+
+        call_command('backfill_records', batch_size=2, stdout=StringIO())
+        self.assertEqual(sorted(Record.objects.values_list(
+            'duration_seconds', flat=True)), [None, 900, 2700])
+        self.assertEqual(set(Record.objects.values_list('start_date',
+            flat=True)), set([datetime.date(2013, 5, 1)]))
+
+
+class RecordPagingTest(TestCase):
+    """
+        The records of a category are paged through their start time and pk,
+        so no record is skipped or shown twice when start times are equal.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+        self.category = Category.objects.create(project=self.project,
+            name='Category', slug='category')
+        self.client.login(username='owner', password='password')
+
+        CategoryDetailView.records_paginate_by = 3
+
+        ## Three records of the first week start at the same time.
+        hour = datetime.timedelta(hours=1)
+        self.closed = []
+        for start, length in (
+                (datetime.datetime(2013, 5, 6, 9), hour),
+                (datetime.datetime(2013, 5, 6, 9), hour),
+                (datetime.datetime(2013, 5, 6, 9), hour),
+                (datetime.datetime(2013, 5, 7, 9), 2 * hour),
+                (datetime.datetime(2013, 5, 20, 9), hour / 2),
+                (datetime.datetime(2013, 5, 20, 10), hour / 2),
+                (datetime.datetime(2013, 5, 21, 9), hour)):
+            start = start.replace(tzinfo=timezone.utc)
+            self.closed.append(Record.objects.create(project=self.project,
+                category=self.category, start_time=start,
+                end_time=start + length, start_time_tz='UTC'))
+        Record.objects.create(project=self.project, category=self.category,
+            start_time=datetime.datetime(2013, 5, 22, 9,
+                tzinfo=timezone.utc), start_time_tz='UTC')
+
+    def tearDown(self):
+        del CategoryDetailView.records_paginate_by
+
+    def test_cursor(self):
+        start = datetime.datetime(2013, 5, 6, 9, 30, 15, 250,
+            tzinfo=timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(start, 12)), (start, 12))
+        for cursor in ('', 'garbage', '20130506T093015.000250',
+                       '20130506T093015.000250_x', '2013_12_1'):
+            self.assertRaises(ValueError, decode_cursor, cursor)
+
+    def test_pages(self):
+        response = self.client.get(self.category.get_absolute_url())
+        self.assertEqual(len(response.context['open_records']['records']), 1)
+        self.assertEqual(response.context['open_records']['next_url'], None)
+
+        page = response.context['closed_records']
+        pks = [row.pk for row in page['records']]
+        pages = 1
+        while page['next_url']:
+            page = self.client.get(page['next_url']).context['page']
+            pks.extend(row.pk for row in page['records'])
+            pages += 1
+
+        expected = sorted(self.closed, key=lambda record:
+            (record.start_time, record.pk), reverse=True)
+        self.assertEqual(pks, [record.pk for record in expected])
+        self.assertEqual(pages, 3)
+
+    def test_bad_page(self):
+        url = self.category.get_absolute_url()
+        for query in ('state=bogus', 'state=closed&after=garbage',
+                      'state=closed&after=20130506T090000.000000_x',
+                      'state=closed&after=20131306T090000.000000_1'):
+            response = self.client.get('%s?%s' % (url, query))
+            self.assertEqual(response.status_code, 404)
+
+    def test_metrics(self):
+        response = self.client.get(self.category.get_absolute_url())
+        metrics = response.context['metrics']
+        self.assertEqual(metrics['total_seconds'], 7 * 3600)
+        self.assertEqual(metrics['records'], 7)
+        self.assertEqual(metrics['average_seconds'], 3600)
+        ## From the week of May 6th to the week of May 20th.
+        self.assertAlmostEqual(metrics['records_per_week'], 7 / 3.0)
+
+
+class RecordDayTest(TestCase):
+    """
+        Records are filed under the day and week they started on in the time
+        zone they were started in.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+
+    def test_time_zones(self):
+        ## Sunday 23:30 UTC, Sunday evening in New York, Monday morning in
+        ## Tokyo.
+        start = datetime.datetime(2013, 5, 5, 23, 30, tzinfo=timezone.utc)
+        for time_zone, start_date, start_week in (
+                ('UTC', datetime.date(2013, 5, 5), datetime.date(2013, 4, 29)),
+                ('America/New_York', datetime.date(2013, 5, 5),
+                 datetime.date(2013, 4, 29)),
+                ('Asia/Tokyo', datetime.date(2013, 5, 6),
+                 datetime.date(2013, 5, 6))):
+            record = Record.objects.create(project=self.project,
+                start_time=start, start_time_tz=time_zone)
+            record = Record.objects.get(pk=record.pk)
+            self.assertEqual((record.start_date, record.start_week),
+                (start_date, start_week))
+            self.assertEqual(record.get_day_url(), reverse('project_day_view',
+                kwargs={'project_slug': 'project',
+                        'day': start_date.isoformat()}))
+
+    def test_missing_start_date(self):
+        start = timezone.now() - datetime.timedelta(hours=2)
+        Record.objects.create(project=self.project, start_time=start,
+            start_time_tz='UTC')
+        Record.objects.create(project=self.project, start_time=start,
+            end_time=start + datetime.timedelta(hours=1), start_time_tz='UTC')
+        ## Records written before the derived columns existed.
+        Record.objects.update(start_date=None, start_week=None)
+
+        for record in Record.objects.all():
+            self.assertEqual(record.get_day_url(), None)
+        for row in RecordRows(Record.objects.all(), 'project'):
+            self.assertEqual(row.get_day_url(), None)
+
+        self.client.login(username='owner', password='password')
+        response = self.client.get(self.project.get_absolute_url())
+        self.assertContains(response, 'Unknown day', count=2)
+
+
+class DescriptionSuggestionTest(TestCase):
+    """
+        The brief descriptions of the records are counted so that the
+        autocomplete suggests the most used ones.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+
+    def test_record_use(self):
+        earlier = timezone.now() - datetime.timedelta(days=1)
+        DescriptionSuggestion.objects.record_use(self.project.pk, ' Review ',
+            earlier)
+        DescriptionSuggestion.objects.record_use(self.project.pk, 'Review')
+        DescriptionSuggestion.objects.record_use(self.project.pk, 'Report',
+            earlier)
+        DescriptionSuggestion.objects.record_use(self.project.pk, '  ')
+
+        suggestions = DescriptionSuggestion.objects.filter(
+            project=self.project)
+        self.assertEqual([(suggestion.text, suggestion.key,
+                           suggestion.use_count)
+                          for suggestion in suggestions],
+            [('Review', 'review', 2), ('Report', 'report', 1)])
+        self.assertTrue(suggestions[0].last_used > earlier)
+
+        record = Record.objects.create(project=self.project,
+            brief_description='Report', start_time=timezone.now(),
+            start_time_tz='UTC')
+        record.save()
+        record.brief_description = 'Planning'
+        record.save()
+        self.assertEqual(dict(suggestions.values_list('text', 'use_count')),
+            {'Review': 2, 'Report': 2, 'Planning': 1})
+
+    def test_suggest(self):
+        for text, uses in (('Review', 3), ('Report', 1), ('Rework', 2),
+                           ('Meeting', 4)):
+            for use in range(uses):
+                DescriptionSuggestion.objects.record_use(self.project.pk,
+                    text)
+        other = Project.objects.create(owner=self.user, name='Other',
+            slug='other')
+        DescriptionSuggestion.objects.record_use(other.pk, 'Retro')
+
+        self.assertEqual(DescriptionSuggestion.objects.suggest(self.project,
+            ' RE'), ['Review', 'Rework', 'Report'])
+        self.assertEqual(DescriptionSuggestion.objects.suggest(self.project,
+            limit=2), ['Meeting', 'Review'])
+
+        self.client.login(username='owner', password='password')
+        url = reverse('record_autocomplete_view',
+            kwargs={'project_slug': 'project'})
+        for limit, count in (('2', 2), ('0', 1), ('-5', 1), ('100', 3)):
+            response = self.client.get(url, {'q': 're', 'limit': limit})
+            self.assertEqual(len(json.loads(response.content.decode(
+                'utf-8'))), count)
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code,
+            400)
+
+
+class BillingReportTest(TestCase):
+    """
+        The billing report matches the project totals and bills the rounded
+        time at the rate of the category or of the project.
+    """
+
+    def test_report(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project', hourly_rate=Decimal('60'))
+        category = Category.objects.create(project=project, name='Category',
+            slug='category', hourly_rate=Decimal('120'))
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        Record.objects.bulk_create([Record(project=project,
+            category=category if minutes % 2 else None, start_time_tz='UTC',
+            start_time=start + datetime.timedelta(hours=minutes),
+            end_time=start + datetime.timedelta(hours=minutes,
+                minutes=minutes))
+            for minutes in range(1, 41)])
+
+        report = BillingReport(project, datetime.date(2013, 5, 1),
+            datetime.date(2013, 5, 31), rounding=ROUND_RECORDS,
+            increment=15 * 60, chunk_size=7)
+        lines = list(report.lines())
+
+        self.assertEqual(len([line for line in lines
+                              if line['type'] == 'record']), 40)
+        self.assertEqual(report.total['tracked_seconds'],
+            sum(seconds for day, seconds in Record.objects.daily_totals(
+                project, datetime.date(2013, 5, 1),
+                datetime.date(2013, 5, 31))))
+        ## The odd minutes of the category are billed as 8 * 15 + 7 * 30 +
+        ## 5 * 45 = 555 minutes, the even ones as 7 * 15 + 8 * 30 + 5 * 45 =
+        ## 570 minutes.
+        self.assertEqual(report.total['billed_seconds'], (555 + 570) * 60)
+        self.assertEqual(report.subtotals[category.pk]['amount'],
+            Decimal('1110.00'))
+        self.assertEqual(report.total['amount'], Decimal('1680.00'))
+
+
+class DurationSketchTest(TestCase):
+    """
+        Duration sketches answer quantiles within their relative accuracy,
+        merge, and follow the record writes.
+    """
+
+    def test_quantiles(self):
+        durations = [(value * 7919) % 36000 for value in range(10000)]
+        sketch = DurationSketch()
+        other = DurationSketch()
+        for index, duration in enumerate(durations):
+            (sketch if index % 2 else other).add(duration)
+        sketch.merge(other)
+
+        durations.sort()
+        for q in (0.5, 0.9, 0.99):
+            exact = durations[int(q * (len(durations) - 1))]
+            self.assertTrue(abs(sketch.quantile(q) - exact) <= 0.01 * exact)
+
+        for duration in durations:
+            sketch.add(duration, -1)
+        self.assertEqual(sketch.count, 0)
+        self.assertEqual(sketch.quantile(0.5), None)
+
+    def test_record_writes(self):
+        user = User.objects.create_user('owner', 'owner@example.com',
+            'password')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        records = [Record.objects.create(project=project, start_time=start,
+            end_time=start + datetime.timedelta(minutes=minutes),
+            start_time_tz='UTC') for minutes in (10, 20, 30)]
+
+        records[0].end_time = start + datetime.timedelta(minutes=40)
+        records[0].save()
+        records[1].delete()
+
+        sketch = DurationBucket.objects.sketch([project.pk])
+        self.assertEqual(sketch.count, 2)
+        self.assertAlmostEqual(sketch.quantile(0), 30 * 60, delta=18)
+        self.assertAlmostEqual(sketch.quantile(1), 40 * 60, delta=24)
+
+
+class GapTest(TestCase):
+    """
+        Gaps are the untracked time between the records of a day.
+    """
+
+    def test_find_gaps(self):
+        def at(day, hour, minute=0):
+            return datetime.datetime(2013, 5, day, hour, minute,
+                tzinfo=timezone.utc)
+
+        intervals = [(at(1, 9), at(1, 10)), (at(1, 9, 30), at(1, 11)),
+            (at(1, 11, 3), at(1, 12)), (at(1, 13), at(1, 14)),
+            (at(1, 13, 10), at(1, 13, 20)), (at(2, 8), at(2, 9)),
+            (at(2, 12), at(2, 13))]
+
+        gaps = list(find_gaps(intervals, datetime.date(2013, 5, 1),
+            datetime.date(2013, 5, 2), timezone.utc, min_seconds=300))
+        self.assertEqual(gaps, [(at(1, 12), at(1, 13)),
+                                (at(2, 9), at(2, 12))])
+        self.assertEqual(daily_gap_totals(gaps, timezone.utc),
+            [(datetime.date(2013, 5, 1), 3600),
+             (datetime.date(2013, 5, 2), 10800)])
+
+
+class RecordRowsTest(TestCase):
+    """
+        Records are listed as lean rows read in chunks.
+    """
+
+    def test_iterate_chunked(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        category = Category.objects.create(project=project, name='Category',
+            slug='category')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        Record.objects.bulk_create([Record(project=project,
+            category=category if index % 2 else None,
+            start_time=start + datetime.timedelta(minutes=index // 2),
+            start_time_tz='UTC') for index in range(7)])
+        pks = list(Record.objects.order_by('start_time', 'pk').values_list(
+            'pk', flat=True))
+
+        records = Record.objects.filter(project=project)
+        self.assertEqual([row[0] for row in iterate_chunked(records, ('pk',),
+            ('start_time', 'pk'), chunk_size=2)], pks)
+        self.assertEqual([row for row in iterate_chunked(records,
+            ('start_time',), ('-start_time', '-pk'), chunk_size=3)],
+            [(start_time,) for start_time in Record.objects.order_by(
+                '-start_time', '-pk').values_list('start_time', flat=True)])
+
+        rows = list(RecordRows(records, project.slug, chunk_size=2))
+        self.assertEqual([row.pk for row in rows], pks)
+        self.assertEqual(rows[1].category, 'Category')
+        self.assertEqual(rows[0].category, None)
+        self.assertEqual(rows[0].get_edit_url(), Record.objects.get(
+            pk=pks[0]).get_edit_url())
+        self.assertFalse(RecordRows(records.filter(end_time__isnull=False),
+            project.slug))
+
+
+class LoadTestResultsTest(TestCase):
+    """
+        Latency percentiles of the load test, and the accounts it sets up.
+    """
+
+    def test_summary(self):
+        results = LoadTestResults()
+        for index in range(100):
+            results.add('create', (index + 1) / 1000.0, index != 0)
+        results.add('close', 0.5, True)
+        results.elapsed = 2
+
+        self.assertEqual(percentile([], 0.5), None)
+        self.assertEqual(results.requests(), 101)
+        self.assertEqual(results.throughput(), 50.5)
+
+        summary = dict((row[0], row[1:]) for row in results.summary())
+        self.assertEqual(summary['create'], (100, 1, 0.05, 0.09, 0.099, 0.1))
+        self.assertEqual(summary['edit'], (0, 0, None, None, None, None))
+        self.assertEqual(summary['total'][:2], (101, 1))
+        self.assertEqual(summary['total'][-1], 0.5)
+
+        self.assertTrue(is_lock_error(DatabaseError('database is locked')))
+        self.assertFalse(is_lock_error(DatabaseError('no such table')))
+        self.assertFalse(is_lock_error(ValueError('locked')))
+
+    def test_accounts(self):
+        load_test = LoadTest(users=2)
+        load_test.set_up()
+        self.assertEqual(Project.objects.filter(
+            owner__username__startswith='load-test-').count(), 2)
+        load_test.tear_down()
+        self.assertFalse(User.objects.filter(
+            username__startswith='load-test-').exists())
+        self.assertFalse(Project.objects.exists())
+
+        existing = User.objects.create_user('load-test-1', '', 'pw')
+        project = Project.objects.create(owner=existing, name='Own',
+            slug='own')
+        load_test = LoadTest(users=2)
+        self.assertRaises(ValueError, load_test.set_up)
+        self.assertEqual(list(User.objects.values_list('username',
+            flat=True)), ['load-test-1'])
+
+        load_test = LoadTest(users=2, keep=True)
+        load_test.set_up()
+        load_test.tear_down()
+        self.assertEqual(sorted(User.objects.values_list('username',
+            flat=True)), ['load-test-0', 'load-test-1'])
+        self.assertTrue(Project.objects.filter(pk=project.pk).exists())
+
+
+@override_settings(TIME_TRACKING_CHANGE_SETTLE_SECONDS=0)
+class ChangeLogTest(TestCase):
+    """
+        Every change of the objects of a user is appended to the change log.
+    """
+
+    def test_change_feed(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        category = Category.objects.create(project=project, name='Category',
+            slug='category')
+        start = timezone.now() - datetime.timedelta(hours=30)
+        record = Record.objects.create(project=project, category=category,
+            start_time=start, start_time_tz='UTC')
+        stale = Record.objects.create(project=project, start_time=start,
+            start_time_tz='UTC')
+
+        record = Record.objects.get(pk=record.pk)
+        record.brief_description = 'Edited'
+        record.save()
+        record.close()
+        Record.objects.cap_stale(project.pk, 24)
+        record_pk = record.pk
+        record.delete()
+        project.mark_deleting()
+        project.delete_in_chunks()
+
+        self.assertEqual([(change.model, change.object_id, change.action)
+                          for change in Change.objects.order_by('pk')], [
+            ('project', project.pk, Change.CREATE),
+            ('category', category.pk, Change.CREATE),
+            ('record', record_pk, Change.CREATE),
+            ('record', stale.pk, Change.CREATE),
+            ('record', record_pk, Change.UPDATE),
+            ('record', record_pk, Change.CLOSE),
+            ('record', stale.pk, Change.CLOSE),
+            ('record', record_pk, Change.DELETE),
+            ('project', project.pk, Change.DELETE),
+            ('category', category.pk, Change.DELETE),
+        ])
+
+        self.client.login(username='user', password='pw')
+        response = self.client.get(reverse('change_feed_view'),
+            {'limit': 4})
+        page = json.loads(response.content.decode('utf-8'))
+        self.assertTrue(page['more'])
+        self.assertEqual(len(page['changes']), 4)
+        self.assertEqual(page['changes'][2]['data']['category_id'],
+            category.pk)
+
+        page = json.loads(self.client.get(page['next_url']).content.decode(
+            'utf-8'))
+        self.assertTrue(page['more'])
+        page = json.loads(self.client.get(page['next_url']).content.decode(
+            'utf-8'))
+        self.assertFalse(page['more'])
+        self.assertEqual([change['action'] for change in page['changes']],
+            [Change.DELETE, Change.DELETE])
+        self.assertEqual(page['changes'][0]['data'], None)
+
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        self.client.login(username='other', password='pw')
+        page = json.loads(self.client.get(reverse(
+            'change_feed_view')).content.decode('utf-8'))
+        self.assertEqual(page['changes'], [])
+        self.assertEqual(self.client.get(reverse('change_feed_view'),
+            {'after': 'x'}).status_code, 400)
+
+    def test_settle_time(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        for name in ('First', 'Second', 'Third'):
+            Category.objects.create(project=project, name=name,
+                slug=name.lower())
+        changes = list(Change.objects.order_by('pk'))
+        self.assertEqual(len(changes), 4)
+
+        with self.settings(TIME_TRACKING_CHANGE_SETTLE_SECONDS=60):
+            self.assertEqual(list(Change.objects.after(user, 0, 10)), [])
+            self.assertEqual(Change.objects.settled_sequence(user),
+                changes[0].pk - 1)
+
+            ## The third change committed before the second one.
+            settled = timezone.now() - datetime.timedelta(minutes=2)
+            Change.objects.filter(pk__in=[changes[0].pk, changes[1].pk,
+                changes[3].pk]).update(created=settled)
+            self.assertEqual(list(Change.objects.after(user, 0, 10)),
+                changes[:2])
+            self.assertEqual(Change.objects.settled_sequence(user),
+                changes[1].pk)
+
+            Change.objects.filter(pk=changes[2].pk).update(created=settled)
+            self.assertEqual(list(Change.objects.after(user,
+                changes[1].pk, 10)), changes[2:])
+            self.assertEqual(Change.objects.settled_sequence(user),
+                changes[3].pk)
+
+
+@override_settings(TIME_TRACKING_CHANGE_SETTLE_SECONDS=0)
+class SyncTest(TestCase):
+    """
+        Offline clients sync through a snapshot followed by the changes, and
+        send their edits back.
+    """
+
+    def test_sync(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        records = [Record.objects.create(project=project,
+            start_time=start + datetime.timedelta(hours=hour),
+            start_time_tz='UTC') for hour in range(3)]
+
+        def sync(token=''):
+            return json.loads(client.get(reverse('sync_view'),
+                {'token': token}).content.decode('utf-8'))
+
+        def post(edits):
+            return client.post(reverse('sync_view'),
+                json.dumps({'records': edits}),
+                content_type='application/json',
+                HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+
+        client = self.client_class(enforce_csrf_checks=True)
+        client.login(username='user', password='pw')
+        snapshot = sync()
+        self.assertFalse(snapshot['more'])
+        self.assertEqual(len(snapshot['changed']['project']), 1)
+        synced = dict((values['id'], values)
+                      for values in snapshot['changed']['record'])
+        self.assertEqual(sorted(synced), [record.pk for record in records])
+
+        records[0].brief_description = 'Changed on the server'
+        records[0].save()
+        deleted_pk = records[1].pk
+        records[1].delete()
+        delta = sync(snapshot['token'])
+        self.assertEqual([values['brief_description'] for values in
+            delta['changed']['record']], ['Changed on the server'])
+        self.assertEqual([values['id'] for values in
+            delta['deleted']['record']], [deleted_pk])
+        self.assertEqual(sync(delta['token'])['changed']['record'], [])
+
+        self.assertEqual(client.post(reverse('sync_view'), json.dumps(
+            {'records': []}), content_type='application/json').status_code,
+            403)
+        response = post([
+            {'id': records[0].pk, 'sequence': synced[records[0].pk][
+                'sequence'], 'data': {'brief_description': 'Offline'}},
+            {'id': records[2].pk, 'sequence': synced[records[2].pk][
+                'sequence'], 'data': {'end_time': '2013-05-01T13:30:00Z'}},
+            {'client_id': 'new', 'data': {'project_id': project.pk,
+                'start_time': '2013-05-02T09:00:00Z', 'start_time_tz': 'UTC',
+                'brief_description': 'New'}},
+        ])
+        results = json.loads(response.content.decode('utf-8'))['results']
+
+        self.assertEqual([result['status'] for result in results],
+            ['conflict', 'saved', 'saved'])
+        self.assertEqual(results[0]['current']['brief_description'],
+            'Changed on the server')
+        self.assertEqual(Record.objects.get(pk=records[2].pk).duration_seconds,
+            5400)
+        self.assertEqual(Record.objects.get(pk=results[2]['id'])
+            .brief_description, 'New')
+        self.assertEqual(len(sync(delta['token'])['changed']['record']), 2)
+
+    def test_snapshot_batches(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        project = Project.objects.create(owner=user, name='Project',
+            slug='project')
+        categories = [Category.objects.create(project=project, name=name,
+            slug=name.lower()) for name in ('First', 'Second')]
+        location = Location.objects.create(project=project, name='Location',
+            slug='location')
+        start = datetime.datetime(2013, 5, 1, 10, tzinfo=timezone.utc)
+        records = [Record.objects.create(project=project, start_time=start,
+            start_time_tz='UTC') for index in range(2)]
+        sequence = Change.objects.latest('pk').pk
+
+        def ids(batch):
+            return dict((name, [values['id'] for values in objects])
+                for name, objects in batch['changed'].items() if objects)
+
+        ## The first batch ends exactly on the last category.
+        batch = sync_batch(user, '', limit=3)
+        self.assertEqual(ids(batch), {'project': [project.pk],
+            'category': [category.pk for category in categories]})
+        self.assertEqual(batch['token'], '%d:category:%d' % (sequence,
+            categories[-1].pk))
+        self.assertTrue(batch['more'])
+
+        batch = sync_batch(user, batch['token'], limit=3)
+        self.assertEqual(ids(batch), {'location': [location.pk],
+            'record': [record.pk for record in records]})
+        self.assertEqual(batch['token'], '%d:record:%d' % (sequence,
+            records[-1].pk))
+        self.assertTrue(batch['more'])
+
+        batch = sync_batch(user, batch['token'], limit=3)
+        self.assertEqual(ids(batch), {})
+        self.assertEqual(batch['token'], str(sequence))
+        self.assertFalse(batch['more'])
+
+        self.assertEqual(parse_token(''), (None, None, None))
+        self.assertEqual(parse_token('12'), (12, None, None))
+        self.assertEqual(parse_token('12:record:3'), (12, 'record', 3))
+        for token in ('x', '12:record', '12:job:3', '12:record:x',
+                      '12:record:3:4'):
+            self.assertRaises(ValueError, parse_token, token)
+
+        self.client.login(username='user', password='pw')
+        self.assertEqual(self.client.get(reverse('sync_view'),
+            {'token': '12:job:3'}).status_code, 400)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+        Webhook receiver answering with the statuses of the server in turn,
+        200 once they run out, after the delay of the server.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.delay)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            self.server.batches.append((self.headers[
+                webhooks.SIGNATURE_HEADER], body))
+        else:
+            self.server.failures += 1
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingDispatcher(object):
+    """
+        Stands in for the webhook dispatcher, keeping the events it is sent.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def send(self, pairs, key, action, payload):
+        self.events.append((key, action))
+
+
+@override_settings(TIME_TRACKING_WEBHOOK_BATCH_SECONDS=0.2,
+                   TIME_TRACKING_WEBHOOK_RETRY_SECONDS=0.1,
+                   TIME_TRACKING_WEBHOOK_IDLE_SECONDS=0.5,
+                   TIME_TRACKING_WEBHOOK_ALLOW_PRIVATE=True)
+class WebhookTest(CommittingTestCase):
+    """
+        Record events are posted to the webhooks of the project in batches,
+        once their transaction is committed.
+    """
+
+    def setUp(self):
+        super(WebhookTest, self).setUp()
+        self.addCleanup(self.wait_for_idle)
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('user', 'user@example.com',
+            'pw')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project')
+
+    def serve(self, statuses=(), delay=0):
+        server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+        server.statuses = list(statuses)
+        server.delay = delay
+        server.failures = 0
+        server.batches = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def record(self):
+        return Record.objects.create(project=self.project,
+            start_time=timezone.now() - datetime.timedelta(hours=1),
+            start_time_tz='UTC')
+
+    def wait_for_idle(self):
+        deadline = time.time() + 10
+        while webhooks.dispatcher.endpoints and time.time() < deadline:
+            time.sleep(0.05)
+
+    def wait_for(self, server, seconds):
+        deadline = time.time() + seconds
+        while not server.batches and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_coalesce(self):
+        endpoint = webhooks.Endpoint(None, 'http://localhost/', 'secret')
+        endpoint.add(1, webhooks.CREATED, '{"id": 1}')
+        endpoint.add(2, webhooks.UPDATED, '{"id": 2}')
+        endpoint.add(1, webhooks.CLOSED, '{"id": 1, "end_time": 1}')
+        endpoint.add(3, webhooks.CREATED, '{"id": 3}')
+        endpoint.add(3, webhooks.DELETED, '{"id": 3}')
+        endpoint.add(2, webhooks.DELETED, '{"id": 2}')
+        endpoint.add(4, webhooks.CLOSED, '{"id": 4, "end_time": 1}')
+        endpoint.add(4, webhooks.UPDATED, '{"id": 4, "end_time": 2}')
+        endpoint.add(5, webhooks.CREATED, '{"id": 5}')
+        endpoint.add(5, webhooks.CLOSED, '{"id": 5, "end_time": 1}')
+        endpoint.add(5, webhooks.DELETED, '{"id": 5}')
+
+        endpoint.take_batch()
+        self.assertEqual(json.loads(endpoint.body().decode('utf-8')), {
+            'events': [
+                {'event': 'created', 'data': {'id': 1, 'end_time': 1}},
+                {'event': 'closed', 'data': {'id': 1, 'end_time': 1}},
+                {'event': 'deleted', 'data': {'id': 2}},
+                {'event': 'closed', 'data': {'id': 4, 'end_time': 2}},
+            ]})
+
+        ## Both events of a record go out in the same batch.
+        endpoint.add(6, webhooks.UPDATED, '{"id": 6}')
+        endpoint.add(7, webhooks.CREATED, '{"id": 7}')
+        endpoint.add(7, webhooks.CLOSED, '{"id": 7, "end_time": 1}')
+        with self.settings(TIME_TRACKING_WEBHOOK_BATCH_SIZE=2):
+            endpoint.take_batch()
+            self.assertEqual(len(endpoint.batch), 1)
+            endpoint.take_batch()
+            self.assertEqual([action for action, payload in endpoint.batch],
+                [webhooks.CREATED, webhooks.CLOSED])
+
+    def test_resolve(self):
+        with self.settings(TIME_TRACKING_WEBHOOK_ALLOW_PRIVATE=False):
+            for url in ('http://127.0.0.1/', 'http://localhost:8000/',
+                        'http://10.1.2.3/', 'http://172.20.0.1/',
+                        'http://192.168.1.1/', 'http://0.0.0.0/',
+                        'http://169.254.169.254/latest/meta-data/',
+                        'http://[::1]/', 'http://[fe80::1]/',
+                        'http://[fd00::1]/', 'http://[::ffff:10.0.0.1]/',
+                        'ftp://93.184.216.34/'):
+                self.assertRaises(ValueError, webhooks.resolve, url)
+            self.assertEqual(webhooks.resolve(
+                'https://93.184.216.34/hook?a=1'),
+                ('https', '93.184.216.34', 443, '/hook?a=1', '93.184.216.34'))
+
+            form = WebhookForm({'url': 'http://169.254.169.254/',
+                'active': True})
+            self.assertFalse(form.is_valid())
+            self.assertIn('url', form.errors)
+
+    def test_delivery(self):
+        server = self.serve(statuses=[500])
+        webhook = Webhook.objects.create(project=self.project,
+            url='http://127.0.0.1:%d/' % server.server_port)
+
+        record = self.record()
+        record.close()
+        self.wait_for(server, 10)
+
+        self.assertEqual(server.failures, 1)
+        events = []
+        for signature, body in server.batches:
+            self.assertEqual(signature, webhooks.sign(webhook.secret, body))
+            events.extend(json.loads(body.decode('utf-8'))['events'])
+        self.assertEqual(set(event['data']['id'] for event in events),
+            set([record.pk]))
+        self.assertEqual(events[0]['event'], 'created')
+        self.assertTrue(events[-1]['data']['end_time'])
+
+    def test_slow_webhook(self):
+        slow = self.serve(delay=2)
+        fast = self.serve()
+        for server in (slow, fast):
+            Webhook.objects.create(project=self.project,
+                url='http://127.0.0.1:%d/' % server.server_port)
+
+        started = time.time()
+        self.record()
+        self.record()
+        self.wait_for(fast, 5)
+
+        self.assertTrue(fast.batches)
+        self.assertTrue(time.time() - started < 1.5)
+        self.assertFalse(slow.batches)
+
+    def test_after_commit(self):
+        Webhook.objects.create(project=self.project, url='http://127.0.0.1/')
+        dispatcher = RecordingDispatcher()
+        self.addCleanup(setattr, webhooks, 'dispatcher', webhooks.dispatcher)
+        webhooks.dispatcher = dispatcher
+
+        sent = self.record()
+        self.assertEqual(dispatcher.events, [(sent.pk, 'created')])
+
+        with transaction.commit_on_success():
+            committed = self.record()
+            self.assertEqual(len(dispatcher.events), 1)
+        send_pending_events()
+        self.assertEqual(dispatcher.events[1:], [(committed.pk, 'created')])
+
+        try:
+            with transaction.commit_on_success():
+                rolled_back = self.record()
+                sent.close()
+                raise DatabaseError('rolled back')
+        except DatabaseError:
+            pass
+        send_pending_events()
+        self.assertFalse(Record.objects.filter(pk=rolled_back.pk).exists())
+        self.assertEqual(len(dispatcher.events), 2)
+
+        pk = committed.pk
+        committed.delete()
+        send_pending_events()
+        self.assertEqual(dispatcher.events[2:], [(pk, 'deleted')])
+
+
+class StaleRecordTest(TestCase):
+    """
+        Records left open for too long are capped at the threshold of their
+        project, and counted once in the derived tables.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com',
+            'pw')
+        self.project = Project.objects.create(owner=self.user,
+            name='Project', slug='project', stale_record_hours=2)
+        self.now = datetime.datetime(2013, 5, 2, 12, tzinfo=timezone.utc)
+
+    def record(self, hours_ago, project=None, closed=False):
+        start = self.now - datetime.timedelta(hours=hours_ago)
+        return Record.objects.create(project=project or self.project,
+            start_time=start, start_time_tz='UTC',
+            end_time=start + datetime.timedelta(minutes=30) if closed
+            else None)
+
+    def total(self, project=None):
+        aggregate = TimeAggregate.objects.get(project=project or self.project,
+            category=None, location=None, resolution=TimeAggregate.TOTAL)
+        return aggregate.seconds, aggregate.records
+
+    def test_cap_stale(self):
+        stale = [self.record(5), self.record(4), self.record(3)]
+        fresh = self.record(1)
+        self.record(10, closed=True)
+
+        chunks = []
+        self.assertEqual(Record.objects.cap_stale(self.project.pk, 2,
+            self.now, chunk_size=2, progress=chunks.append), 3)
+        self.assertEqual(chunks, [2, 1])
+
+        for record in stale:
+            record = Record.objects.get(pk=record.pk)
+            self.assertEqual(record.end_time - record.start_time,
+                datetime.timedelta(hours=2))
+            self.assertEqual(record.duration_seconds, 7200)
+        self.assertEqual(Record.objects.get(pk=fresh.pk).end_time, None)
+
+        self.assertEqual(self.total(), (3 * 7200 + 1800, 4))
+        self.assertEqual(DurationBucket.objects.sketch(
+            [self.project.pk]).count, 4)
+        self.assertEqual(sorted(Change.objects.filter(
+            action=Change.CLOSE).values_list('object_id', flat=True)),
+            sorted(record.pk for record in stale))
+        self.assertEqual(Record.objects.cap_stale(self.project.pk, 2,
+            self.now), 0)
+
+    def test_closed_meanwhile(self):
+        stale = [self.record(5), self.record(4)]
+        closed = []
+
+        def close_concurrently(connection, sql, params, duration):
+            if not closed:
+                closed.append(sql)
+                Record.objects.get(pk=stale[0].pk).close()
+
+        with query_listener(close_concurrently):
+            capped = Record.objects.cap_stale(self.project.pk, 2, self.now)
+
+        self.assertEqual(capped, 1)
+        self.assertTrue(Record.objects.get(pk=stale[0].pk).duration_seconds
+            > 7200)
+        seconds, records = self.total()
+        self.assertEqual(records, 2)
+        self.assertEqual(seconds, 7200 + Record.objects.get(
+            pk=stale[0].pk).duration_seconds)
+        self.assertEqual(Change.objects.filter(action=Change.CLOSE,
+            object_id=stale[0].pk).count(), 1)
+        self.assertEqual(Change.objects.filter(action=Change.CLOSE,
+            object_id=stale[1].pk).count(), 1)
+
+    def test_close_stale_records(self):
+        other = Project.objects.create(owner=self.user, name='Other',
+            slug='other')
+        self.record(5)
+        self.record(30, project=other)
+        self.record(5, project=other)
+
+        self.assertEqual(close_stale_records(self.now), 1)
+        with self.settings(TIME_TRACKING_STALE_RECORD_HOURS=24):
+            self.assertEqual(close_stale_records(self.now, chunk_size=1), 1)
+        self.assertEqual(self.total(other), (24 * 3600, 1))
+        self.assertEqual(Record.objects.filter(end_time=None).count(), 1)
+
+    def test_zero_threshold(self):
+        other = Project.objects.create(owner=self.user, name='Other',
+            slug='other')
+        Project.objects.filter(pk=self.project.pk).update(
+            stale_record_hours=0)
+        self.record(5)
+        self.record(30, project=other)
+
+        with self.settings(TIME_TRACKING_STALE_RECORD_HOURS=0):
+            self.assertEqual(close_stale_records(self.now), 0)
+        self.assertEqual(Record.objects.filter(end_time=None).count(), 2)
+
+        form = ProjectForm({'name': 'Project', 'stale_record_hours': '0'},
+            instance=self.project, initial={'owner': self.user})
+        self.assertIn('stale_record_hours', form.errors)
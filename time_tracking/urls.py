@@ -19,18 +19,34 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from django.conf.urls import patterns, url
 from django.views.generic import TemplateView
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 
 from time_tracking.views.project import ProjectCreateView, ProjectDetailView
 from time_tracking.views.project import ProjectEditView, ProjectDeleteView
 from time_tracking.views.project import ProjectListView, ProjectCopyView
+from time_tracking.views.project import ProjectDayView
 from time_tracking.views.category import CategoryCreateView, CategoryDetailView
 from time_tracking.views.category import CategoryEditView, CategoryDeleteView
 from time_tracking.views.record import RecordCreateView, RecordDeleteView
 from time_tracking.views.record import RecordCloseView, RecordEditView
+from time_tracking.views.record import RecordAutocompleteView
+from time_tracking.views.record import RunningRecordsView
 from time_tracking.views.location import LocationCreateView, LocationDetailView
 from time_tracking.views.location import LocationEditView, LocationDeleteView
 from time_tracking.views.location import LocationListView
+from time_tracking.views.metrics import MetricsView, PrometheusMetricsView
+from time_tracking.views.metrics import SlowQueriesView
+from time_tracking.views.job import JobListView, JobDetailView
+from time_tracking.views.heatmap import HeatmapView
+from time_tracking.views.budget import BudgetListView, BudgetCreateView
+from time_tracking.views.budget import BudgetDeleteView
+from time_tracking.views.webhook import WebhookListView, WebhookCreateView
+from time_tracking.views.webhook import WebhookDeleteView
+from time_tracking.views.report import BillingReportView, GapReportView
+from time_tracking.views.statistics import DurationStatisticsView
+from time_tracking.views.change import ChangeFeedView
+from time_tracking.views.sync import SyncView
+from time_tracking.routers import reporting_view
 
 urlpatterns = patterns('',
 
@@ -39,13 +55,14 @@ urlpatterns = patterns('',
         TemplateView.as_view(template_name="time_tracking/license.html")),
 
     ## Project manipulation
-    url(r'^$', login_required(ProjectListView.as_view()),
+    url(r'^$', login_required(reporting_view(
+        ProjectListView.as_view())),
         name='project_list_view'),
     url(r'^add/project/$', login_required(
         ProjectCreateView.as_view()),
             name='project_create_view'),
-    url(r'^project/(?P<project_slug>[^/]+)/$', login_required(
-        ProjectDetailView.as_view()),
+    url(r'^project/(?P<project_slug>[^/]+)/$', login_required(reporting_view(
+        ProjectDetailView.as_view())),
         name='project_detail_view'),
     url(r'^edit/project/(?P<project_slug>[^/]+)/$', login_required(
         ProjectEditView.as_view()),
@@ -56,8 +73,14 @@ urlpatterns = patterns('',
     url(r'^copy/project/(?P<project_slug>[^/]+)/$', login_required(
         ProjectCopyView.as_view()),
         name='project_copy_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/day/(?P<day>\d{4}-\d{2}-\d{2})/$',
+        login_required(reporting_view(
+        ProjectDayView.as_view())),
+        name='project_day_view'),
 
     ## Record manipulation
+    url(r'^running/$', login_required(RunningRecordsView.as_view()),
+        name='running_records_view'),
     url(r'^project/(?P<project_slug>[^/]+)/add/$',
         login_required(RecordCreateView.as_view()),
         name='record_create_view'),
@@ -70,14 +93,17 @@ urlpatterns = patterns('',
     url(r'^project/(?P<project_slug>[^/]+)/edit/(?P<pk>\d+)/$',
         login_required(RecordEditView.as_view()),
         name='record_edit_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/autocomplete/$',
+        login_required(RecordAutocompleteView.as_view()),
+        name='record_autocomplete_view'),
 
     ## Category manipulation
     url(r'^add/project/(?P<project_slug>[^/]+)/category/$', login_required(
         CategoryCreateView.as_view()),
             name='category_create_view'),
     url(r'^project/(?P<project_slug>[^/]+)/category/'
-        + '(?P<category_slug>[^/]+)/$', login_required(
-        CategoryDetailView.as_view()),
+        + '(?P<category_slug>[^/]+)/$', login_required(reporting_view(
+        CategoryDetailView.as_view())),
         name='category_detail_view'),
     url(r'^edit/project/(?P<project_slug>[^/]+)/category/'
         + '(?P<category_slug>[^/]+)/$', login_required(
@@ -94,8 +120,8 @@ urlpatterns = patterns('',
     url(r'^add/project/(?P<project_slug>[^/]+)/location/$', login_required(
         LocationCreateView.as_view()),
             name='location_create_view'),
-    url(r'^project/(?P<project_slug>[^/]+)/location/(?P<location_slug>[^/]+)/$', login_required(
-        LocationDetailView.as_view()),
+    url(r'^project/(?P<project_slug>[^/]+)/location/(?P<location_slug>[^/]+)/$', login_required(reporting_view(
+        LocationDetailView.as_view())),
         name='location_detail_view'),
     url(r'^edit/project/(?P<project_slug>[^/]+)/location/(?P<location_slug>[^/]+)/$', login_required(
         LocationEditView.as_view()),
@@ -104,7 +130,81 @@ urlpatterns = patterns('',
         LocationDeleteView.as_view()),
         name='location_delete_view'),
 
+    ## Budget manipulation
+    url(r'^project/(?P<project_slug>[^/]+)/budgets/$',
+        login_required(BudgetListView.as_view()),
+        name='budget_list_view'),
+    url(r'^add/project/(?P<project_slug>[^/]+)/budget/$', login_required(
+        BudgetCreateView.as_view()),
+        name='budget_create_view'),
+    url(r'^delete/project/(?P<project_slug>[^/]+)/budget/(?P<pk>\d+)/$',
+        login_required(BudgetDeleteView.as_view()),
+        name='budget_delete_view'),
+
+    ## Webhook manipulation
+    url(r'^project/(?P<project_slug>[^/]+)/webhooks/$',
+        login_required(WebhookListView.as_view()),
+        name='webhook_list_view'),
+    url(r'^add/project/(?P<project_slug>[^/]+)/webhook/$', login_required(
+        WebhookCreateView.as_view()),
+        name='webhook_create_view'),
+    url(r'^delete/project/(?P<project_slug>[^/]+)/webhook/(?P<pk>\d+)/$',
+        login_required(WebhookDeleteView.as_view()),
+        name='webhook_delete_view'),
+
+    ## Background jobs
+    url(r'^jobs/$', login_required(JobListView.as_view()),
+        name='job_list_view'),
+    url(r'^jobs/(?P<pk>\d+)/$', login_required(JobDetailView.as_view()),
+        name='job_detail_view'),
+
+    ## Instrumentation
+    url(r'^metrics/$', user_passes_test(lambda user: user.is_staff)(
+        MetricsView.as_view()),
+        name='metrics_view'),
+    url(r'^metrics/prometheus/$', PrometheusMetricsView.as_view(),
+        name='metrics_prometheus_view'),
+    url(r'^metrics/slow-queries/$', user_passes_test(
+        lambda user: user.is_staff)(SlowQueriesView.as_view()),
+        name='metrics_slow_queries_view'),
+
     ## Reports per Project
+    url(r'^project/(?P<project_slug>[^/]+)/heatmap/$',
+        login_required(reporting_view(HeatmapView.as_view())),
+        name='project_heatmap_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/category/'
+        + '(?P<category_slug>[^/]+)/heatmap/$',
+        login_required(reporting_view(HeatmapView.as_view())),
+        name='category_heatmap_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/location/'
+        + '(?P<location_slug>[^/]+)/heatmap/$',
+        login_required(reporting_view(HeatmapView.as_view())),
+        name='location_heatmap_view'),
+    url(r'^gaps/$',
+        login_required(reporting_view(GapReportView.as_view())),
+        name='gap_report_view'),
+    url(r'^statistics/$',
+        login_required(reporting_view(DurationStatisticsView.as_view())),
+        name='duration_statistics_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/statistics/$',
+        login_required(reporting_view(DurationStatisticsView.as_view())),
+        name='project_statistics_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/category/'
+        + '(?P<category_slug>[^/]+)/statistics/$',
+        login_required(reporting_view(DurationStatisticsView.as_view())),
+        name='category_statistics_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/location/'
+        + '(?P<location_slug>[^/]+)/statistics/$',
+        login_required(reporting_view(DurationStatisticsView.as_view())),
+        name='location_statistics_view'),
+    url(r'^project/(?P<project_slug>[^/]+)/billing/$',
+        login_required(reporting_view(BillingReportView.as_view())),
+        name='billing_report_view'),
+
+    ## Change feed
+    url(r'^changes/$', login_required(ChangeFeedView.as_view()),
+        name='change_feed_view'),
+    url(r'^sync/$', login_required(SyncView.as_view()), name='sync_view'),
 
 
 )
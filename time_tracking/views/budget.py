@@ -0,0 +1,155 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import CreateView, DeleteView, ListView
+from django.shortcuts import get_object_or_404
+
+from time_tracking.views.forms import BudgetForm
+from time_tracking.models import Project, Budget, BudgetCrossing
+from time_tracking.caching import CachedModelChoiceField
+
+
+class BudgetListView(ListView):
+    """
+        Lists the budgets and goals of a project along with the time consumed
+        in their current period and the thresholds that were crossed lately.
+    """
+    model = Budget
+    context_object_name = 'budgets'
+    recent_crossings = 10
+
+    def get(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view when the get
+            is called.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(BudgetListView, self).get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """
+            Limiting the budgets to the ones of the project.
+        """
+        return Budget.objects.filter(project=self.project).select_related(
+            'category')
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding the consumption of the budgets and the recent crossings.
+        """
+        context = super(BudgetListView, self).get_context_data(**kwargs)
+
+        budgets = []
+        for budget in context['budgets']:
+            budget.project = self.project
+            period = budget.current_period()
+            budgets.append({
+                'budget': budget,
+                'consumed_seconds': budget.consumed_seconds(period),
+                'percent': budget.percent(period),
+                'remaining_seconds': budget.remaining_seconds(period),
+            })
+
+        context['project'] = self.project
+        context['budgets'] = budgets
+        context['crossings'] = BudgetCrossing.objects.filter(
+            budget__project=self.project).select_related(
+            'budget', 'budget__category')[:self.recent_crossings]
+
+        return context
+
+
+class BudgetCreateView(CreateView):
+    """
+        Adds a budget or goal to a project.
+    """
+    form_class = BudgetForm
+    model = Budget
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(BudgetCreateView, self).dispatch(request, *args,
+            **kwargs)
+
+    def get_form(self, form_class):
+        """
+            Limiting the categories to the ones of the project, listed from
+            the cache.
+        """
+        form = super(BudgetCreateView, self).get_form(form_class)
+        CachedModelChoiceField.replace(form, 'category', self.project.pk)
+        return form
+
+    def form_valid(self, form):
+        """
+            Assigning the budget to the project.
+        """
+        form.instance.project = self.project
+        return super(BudgetCreateView, self).form_valid(form)
+
+    def get_success_url(self):
+        return self.project.get_budget_list_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(BudgetCreateView, self).get_context_data(**kwargs)
+
+        context['project'] = self.project
+        context['command'] = 'Add'
+
+        return context
+
+
+class BudgetDeleteView(DeleteView):
+    """
+        Deletes a budget of a project.
+    """
+    model = Budget
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(BudgetDeleteView, self).dispatch(request, *args,
+            **kwargs)
+
+    def get_queryset(self):
+        """
+            Limiting the budgets to the ones of the project.
+        """
+        return Budget.objects.filter(project=self.project)
+
+    def get_success_url(self):
+        return self.project.get_budget_list_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(BudgetDeleteView, self).get_context_data(**kwargs)
+
+        context['project'] = self.project
+
+        return context
@@ -23,7 +23,8 @@ from django.template.defaultfilters import slugify
 from django.shortcuts import get_object_or_404
 
 from time_tracking.views.forms import CategoryForm
-from time_tracking.models import Project, Category
+from time_tracking.views.mixins import RecordBreakdownMixin
+from time_tracking.models import Project, Category, TimeAggregate
 
 
 class CategoryCreateView(CreateView):
@@ -202,7 +203,7 @@ class CategoryDeleteView(DeleteView):
         return context      
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(RecordBreakdownMixin, DetailView):
     """
         Overriding the Detail View generic class to provide the record
         information that is to be displayed along with the rest of the
@@ -233,22 +234,16 @@ class CategoryDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         """
-            Adding additional context for:
-                Closed Records - records that have an end time
-                Open Records - records that do not have an ned time.
+            Adding the project and the metrics of the category, read from
+            the precomputed weekly totals, to the pages of open and closed
+            records.
         """
         context = super(CategoryDetailView, self).get_context_data(**kwargs)
 
-        ## Need to fetch the records that are associated with this category.
-        open_records = self.object.record_set.filter(end_time=None)
-
-        closed_records = self.object.record_set.exclude(end_time=None)
-
-        context['closed_records'] = closed_records
-        context['open_records'] = open_records
         context['project'] = self.project
         context['selected'] = self.object
+        if 'state' not in self.request.GET:
+            context['metrics'] = TimeAggregate.objects.summary(self.project,
+                category=self.object)
 
         return context
-
-
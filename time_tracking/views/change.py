@@ -0,0 +1,65 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import View
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse, HttpResponseBadRequest
+import json
+
+from time_tracking.models import Change
+
+## Number of changes per page, when the client doesn't ask for fewer.
+CHANGES_PER_PAGE = 500
+
+
+class ChangeFeedView(View):
+    """
+        Returns the changes of the projects of the user that come after the
+        after parameter (a sequence number, 0 to start from the beginning)
+        as JSON, at most limit of them.  last_sequence is the sequence
+        number to ask for the next page with, more tells whether there
+        already are more changes.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+            Read a page of changes from the change log.
+        """
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = min(int(request.GET.get('limit', CHANGES_PER_PAGE)),
+                CHANGES_PER_PAGE)
+        except ValueError:
+            return HttpResponseBadRequest('after and limit must be numbers')
+        if after < 0 or limit < 1:
+            return HttpResponseBadRequest('after and limit must be positive')
+
+        changes = [change.as_dict() for change in
+            Change.objects.after(request.user, after, limit + 1)]
+        more = len(changes) > limit
+        changes = changes[:limit]
+
+        last_sequence = changes[-1]['sequence'] if changes else after
+        return HttpResponse(json.dumps({
+            'changes': changes,
+            'last_sequence': last_sequence,
+            'more': more,
+            'next_url': '%s?after=%d&limit=%d' % (reverse('change_feed_view'),
+                last_sequence, limit),
+        }), content_type='application/json')
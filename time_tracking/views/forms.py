@@ -21,9 +21,17 @@ from django.template.defaultfilters import slugify
 from django import forms
 from django.forms import ModelForm
 from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
 from django.utils import timezone
-from time_tracking.models import Project, Record, Category, Location
+from django.utils.dateparse import parse_datetime
+from time_tracking.models import Project, Record, Category, Location, Budget
+from time_tracking.models import Webhook
 from time_tracking.models import convert_time
+from time_tracking.slow_queries import capture_slow_queries
+from time_tracking.caching import CachedChoicesMixin
+from time_tracking.billing import ROUNDING_CHOICES, NO_ROUNDING
+from time_tracking import webhooks
+import datetime
 import pytz
 
 
@@ -32,6 +40,7 @@ class ProjectForm(ModelForm):
         Form that will allow for the project object to have its slug overridden
     """
 
+    @capture_slow_queries('ProjectForm.clean')
     def clean(self):
         """
             Overriden to validate the model before it is saved to the database,
@@ -60,10 +69,11 @@ class ProjectForm(ModelForm):
 
     class Meta:
         model = Project
-        fields = ('name', 'template', 'description', )
+        fields = ('name', 'template', 'description', 'stale_record_hours',
+            'hourly_rate', )
 
 
-class RecordEditForm(ModelForm):
+class RecordEditForm(CachedChoicesMixin, ModelForm):
     """
         Form that will allow for the manipulation of the record objects.
     """
@@ -98,7 +108,7 @@ class RecordEditForm(ModelForm):
         }
 
 
-class RecordCreateForm(ModelForm):
+class RecordCreateForm(CachedChoicesMixin, ModelForm):
     """
         Form that will allow for the manipulation of the record objects.
     """
@@ -138,6 +148,7 @@ class CategoryForm(ModelForm):
         Form that will allow for the manipulation of the category objects.
     """
 
+    @capture_slow_queries('CategoryForm.clean')
     def clean(self):
         """
             Overriden to validate the model before it is saved to the database,
@@ -162,7 +173,7 @@ class CategoryForm(ModelForm):
 
     class Meta:
         model = Category
-        fields = ('name', 'description', )
+        fields = ('name', 'description', 'hourly_rate', )
 
 
 class LocationForm(ModelForm):
@@ -171,6 +182,7 @@ class LocationForm(ModelForm):
         overridden
     """
 
+    @capture_slow_queries('LocationForm.clean')
     def clean(self):
         """
             Overriden to validate the model before it is saved to the database,
@@ -195,4 +207,128 @@ class LocationForm(ModelForm):
 
     class Meta:
         model = Location
-        fields = ('name', 'address', 'description', ) 
+        fields = ('name', 'address', 'description', )
+
+
+class BudgetForm(CachedChoicesMixin, ModelForm):
+    """
+        Form that will allow for the manipulation of the budget objects.
+    """
+
+    class Meta:
+        model = Budget
+        fields = ('category', 'kind', 'period', 'hours', )
+
+
+class WebhookForm(ModelForm):
+    """
+        Form that will allow for the manipulation of the webhook objects.
+    """
+
+    class Meta:
+        model = Webhook
+        fields = ('url', 'active', )
+
+    def clean_url(self):
+        """
+            Only accept urls of public hosts, see webhooks.resolve.
+        """
+        url = self.cleaned_data['url']
+        try:
+            webhooks.resolve(url)
+        except ValueError as error:
+            raise ValidationError('%s' % error)
+        return url
+
+
+class BillingReportForm(forms.Form):
+    """
+        Period and rounding rules of a billing report.
+    """
+    INCREMENT_CHOICES = [(1, '1 minute'), (6, '6 minutes'),
+        (15, '15 minutes'), (30, '30 minutes'), (60, '1 hour')]
+
+    first_day = forms.DateField()
+    last_day = forms.DateField()
+    rounding = forms.ChoiceField(choices=ROUNDING_CHOICES,
+        initial=NO_ROUNDING)
+    increment = forms.TypedChoiceField(choices=INCREMENT_CHOICES, coerce=int,
+        initial=15, help_text='Billed time is rounded up to a multiple of it.')
+
+    def clean(self):
+        cleaned_data = self.cleaned_data
+
+        if ('first_day' in cleaned_data and 'last_day' in cleaned_data and
+                cleaned_data['last_day'] < cleaned_data['first_day']):
+            raise ValidationError("Last day cannot be before first day")
+
+        return cleaned_data
+
+
+class GapReportForm(forms.Form):
+    """
+        Period of the untracked time report.
+    """
+    first_day = forms.DateField()
+    last_day = forms.DateField()
+    min_minutes = forms.IntegerField(min_value=0, initial=5,
+        help_text='Shorter gaps are left out.')
+
+    def clean(self):
+        cleaned_data = self.cleaned_data
+
+        if ('first_day' in cleaned_data and 'last_day' in cleaned_data and
+                cleaned_data['last_day'] < cleaned_data['first_day']):
+            raise ValidationError("Last day cannot be before first day")
+
+        return cleaned_data
+
+
+class IsoDateTimeField(forms.DateTimeField):
+    """
+        Date time field reading ISO 8601 values, in the current time zone
+        when they don't have an offset.
+    """
+
+    def to_python(self, value):
+        if isinstance(value, datetime.datetime):
+            return value
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError(self.error_messages['invalid'])
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed,
+                timezone.get_current_timezone())
+        return parsed
+
+
+class SyncRecordForm(ModelForm):
+    """
+        Form validating the records sent back by the sync clients.
+    """
+    start_time = IsoDateTimeField()
+    end_time = IsoDateTimeField(required=False)
+
+    def __init__(self, project, *args, **kwargs):
+        super(SyncRecordForm, self).__init__(*args, **kwargs)
+        self.fields['category'].queryset = project.category_set.all()
+        self.fields['location'].queryset = project.location_set.all()
+
+    def clean(self):
+        cleaned_data = self.cleaned_data
+
+        if (cleaned_data.get('start_time') and cleaned_data.get('end_time')
+                and cleaned_data['end_time'] < cleaned_data['start_time']):
+            raise ValidationError("End time cannot be before start time")
+
+        return cleaned_data
+
+    class Meta:
+        model = Record
+        fields = ('start_time', 'start_time_tz', 'end_time', 'end_time_tz',
+            'brief_description', 'category', 'location', 'description')
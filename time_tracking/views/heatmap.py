@@ -0,0 +1,149 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import TemplateView
+from django.http import HttpResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+import datetime
+import json
+
+from time_tracking.models import Project, Category, Location, TimeAggregate
+from time_tracking.models import period_start
+
+## Number of intensity levels of the heatmap cells, besides empty cells.
+HEATMAP_LEVELS = 4
+
+
+def heatmap_years(totals, resolution, first_year, last_year):
+    """
+        Lay the (period, seconds) totals out as calendar years of rows of
+        cells.  Days are shown as weekday rows of week columns, weeks and
+        months as a single row.  Cells are dictionaries with the period, the
+        seconds and an intensity level, or None outside of the year.
+    """
+    seconds = dict(totals)
+    most = max(seconds.values() or [0])
+
+    def cell(period):
+        value = seconds.get(period, 0)
+        if value <= 0 or not most:
+            level = 0
+        else:
+            level = max(1, int(HEATMAP_LEVELS * value / float(most) + 0.5))
+        return {'period': period, 'seconds': value, 'level': level}
+
+    years = []
+    for year in range(first_year, last_year + 1):
+        first = datetime.date(year, 1, 1)
+        last = datetime.date(year, 12, 31)
+
+        if resolution == TimeAggregate.DAY:
+            rows = [[] for weekday in range(7)]
+            monday = period_start(TimeAggregate.WEEK, first)
+            while monday <= last:
+                for weekday in range(7):
+                    day = monday + datetime.timedelta(days=weekday)
+                    rows[weekday].append(cell(day)
+                        if first <= day <= last else None)
+                monday += datetime.timedelta(days=7)
+        elif resolution == TimeAggregate.WEEK:
+            monday = period_start(TimeAggregate.WEEK, first)
+            if monday < first:
+                monday += datetime.timedelta(days=7)
+            row = []
+            while monday <= last:
+                row.append(cell(monday))
+                monday += datetime.timedelta(days=7)
+            rows = [row]
+        else:
+            rows = [[cell(datetime.date(year, month, 1))
+                     for month in range(1, 13)]]
+
+        years.append({'year': year, 'rows': rows})
+
+    return years
+
+
+class HeatmapView(TemplateView):
+    """
+        Calendar heatmap of the time spent on a project, or on one of its
+        categories or locations, per day, week or month (resolution) over the
+        last few years (years).  Read from the precomputed totals, never from
+        the records.
+    """
+    template_name = 'time_tracking/heatmap.html'
+    default_years = 3
+    max_years = 10
+
+    def get_scope(self):
+        """
+            Return the project along with the category or location that the
+            heatmap is for.
+        """
+        project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=self.request.user)
+        category = location = None
+
+        if 'category_slug' in self.kwargs:
+            category = get_object_or_404(Category, project=project,
+                slug=self.kwargs['category_slug'])
+        elif 'location_slug' in self.kwargs:
+            location = get_object_or_404(Location, project=project,
+                slug=self.kwargs['location_slug'])
+
+        return project, category, location
+
+    def get(self, request, *args, **kwargs):
+        """
+            Render the heatmap, or its totals as JSON when it has been asked
+            for.
+        """
+        resolution = request.GET.get('resolution', TimeAggregate.DAY)
+        if resolution not in TimeAggregate.CALENDAR_RESOLUTIONS:
+            raise Http404
+
+        try:
+            years = int(request.GET.get('years', self.default_years))
+        except ValueError:
+            raise Http404
+        years = min(max(years, 1), self.max_years)
+
+        project, category, location = self.get_scope()
+
+        last_year = timezone.localtime(timezone.now()).year
+        first_year = last_year - years + 1
+        totals = TimeAggregate.objects.totals(project, resolution,
+            datetime.date(first_year, 1, 1), datetime.date(last_year, 12, 31),
+            category=category, location=location)
+
+        if request.GET.get('format') == 'json':
+            return HttpResponse(json.dumps([
+                {'period': period.isoformat(), 'seconds': seconds}
+                for period, seconds in totals]),
+                content_type='application/json')
+
+        return self.render_to_response(self.get_context_data(
+            project=project, category=category, location=location,
+            resolution=resolution,
+            resolutions=TimeAggregate.CALENDAR_RESOLUTIONS,
+            years=years,
+            heatmap=heatmap_years(totals, resolution, first_year,
+                last_year)))
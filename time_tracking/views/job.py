@@ -0,0 +1,76 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+
+from django.http import HttpResponse
+from django.views.generic import DetailView, ListView
+
+from time_tracking.models import Job
+
+
+class JobListView(ListView):
+    """
+        Lists the jobs of the user, most recent first.
+    """
+    model = Job
+    context_object_name = 'jobs'
+    paginate_by = 50
+
+    def get_queryset(self):
+        """
+            Limiting the list to the jobs owned by the user.
+        """
+        return Job.objects.filter(owner=self.request.user)
+
+
+class JobDetailView(DetailView):
+    """
+        Status page of a job, which is also available as JSON for polling by
+        adding format=json to the query string.
+    """
+    model = Job
+
+    def get_queryset(self):
+        """
+            Limiting the requests to only the objects that are owned by the
+            user that is making the request.
+        """
+        return Job.objects.filter(owner=self.request.user)
+
+    def render_to_response(self, context, **response_kwargs):
+        """
+            Return the status as JSON when it has been asked for.
+        """
+        if self.request.GET.get('format') == 'json':
+            job = self.object
+            status = {
+                'id': job.pk,
+                'name': job.name,
+                'status': job.status,
+                'progress': job.progress,
+                'total': job.total,
+                'percent_complete': job.percent_complete(),
+                'message': job.message,
+            }
+            return HttpResponse(json.dumps(status),
+                content_type='application/json')
+
+        return super(JobDetailView, self).render_to_response(context,
+            **response_kwargs)
@@ -22,6 +22,7 @@ from django.views.generic import ListView
 from django.template.defaultfilters import slugify
 
 from time_tracking.views.forms import LocationForm
+from time_tracking.views.mixins import RecordBreakdownMixin
 from time_tracking.models import Location, Project
 
 from django.shortcuts import get_object_or_404
@@ -29,17 +30,42 @@ from django.shortcuts import get_object_or_404
 
 class LocationListView(ListView):
     """
-        List view that will display a list of all of the projects.
+        List view that will display the locations of a project along with the
+        time spent at them, their number of records and when they were last
+        used.
     """
 
     model = Location
     context_object_name = 'locations'
 
+    def get(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view when the get
+            is called.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+
+        return super(LocationListView, self).get(request, *args, **kwargs)
+
     def get_queryset(self):
         """
-            Return the list of active projects to display.
+            Return the locations of the project with their usage, from a
+            single aggregated query.
         """
-        return self.model.objects.filter(owner=self.request.user)
+        return self.model.objects.with_usage().filter(
+            project=self.project).select_related('project')
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding the project to the context.
+        """
+        context = super(LocationListView, self).get_context_data(**kwargs)
+
+        context['project'] = self.project
+
+        return context
 
 
 class LocationCreateView(CreateView):
@@ -221,7 +247,7 @@ class LocationDeleteView(DeleteView):
         return self.project.get_absolute_url()
 
 
-class LocationDetailView(DetailView):
+class LocationDetailView(RecordBreakdownMixin, DetailView):
     """
         Overriding the Detail View generic class to provide the record
         information that is to be displayed along with the rest of the
@@ -251,8 +277,7 @@ class LocationDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         """
-            Adding additional context to the view in order to show the
-            project as well.
+            Adding the project to the paginated open and closed records.
         """
         context = super(LocationDetailView, self).get_context_data(**kwargs)
 
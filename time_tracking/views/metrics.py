@@ -0,0 +1,101 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.generic import TemplateView, View
+
+from time_tracking.metrics import view_metrics
+from time_tracking.slow_queries import slow_query_log, threshold_ms
+
+
+class MetricsView(TemplateView):
+    """
+        Staff page summarizing the measurements of the time_tracking views.
+    """
+    template_name = 'time_tracking/metrics.html'
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding the per view summary of the measurements.
+        """
+        context = super(MetricsView, self).get_context_data(**kwargs)
+
+        context['view_metrics'] = view_metrics.summary()
+        context['metrics_enabled'] = getattr(settings,
+            'TIME_TRACKING_METRICS', False)
+
+        return context
+
+
+class PrometheusMetricsView(View):
+    """
+        Exposes the view histograms in the Prometheus text format.  Staff
+        users can read it, as can a scraper that sends
+        settings.TIME_TRACKING_METRICS_TOKEN as a bearer token.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+            Render the histograms for an allowed request.
+        """
+        if not self.is_allowed(request):
+            return HttpResponseForbidden()
+
+        return HttpResponse(view_metrics.prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def is_allowed(self, request):
+        """
+            Staff users and requests with the metrics token are allowed.
+        """
+        if request.user.is_authenticated() and request.user.is_staff:
+            return True
+
+        token = getattr(settings, 'TIME_TRACKING_METRICS_TOKEN', None)
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(authorization,
+            'Bearer %s' % token)
+
+
+class SlowQueriesView(TemplateView):
+    """
+        Staff page listing the slow statements that have been captured along
+        with their query plans.  Posting to it clears the list.
+    """
+    template_name = 'time_tracking/slow_queries.html'
+
+    def post(self, request, *args, **kwargs):
+        """
+            Clear the captured statements.
+        """
+        slow_query_log.clear()
+        return self.get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding the captured statements and the threshold.
+        """
+        context = super(SlowQueriesView, self).get_context_data(**kwargs)
+
+        context['slow_queries'] = slow_query_log.all()
+        context['threshold_ms'] = threshold_ms()
+
+        return context
@@ -0,0 +1,125 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+import datetime
+
+from time_tracking.rows import RecordRow
+
+## Format of the start time in the page cursors, in UTC.
+CURSOR_FORMAT = '%Y%m%dT%H%M%S.%f'
+
+
+def encode_cursor(start_time, pk):
+    """
+        Cursor pointing right after the record with the start time and pk.
+    """
+    if timezone.is_aware(start_time):
+        start_time = timezone.make_naive(start_time, timezone.utc)
+    return '%s_%d' % (start_time.strftime(CURSOR_FORMAT), pk)
+
+
+def decode_cursor(cursor):
+    """
+        Return the start time and pk encoded by encode_cursor, raise
+        ValueError when the cursor isn't valid.
+    """
+    start_time, pk = cursor.split('_')
+    start_time = datetime.datetime.strptime(start_time, CURSOR_FORMAT)
+    return timezone.make_aware(start_time, timezone.utc), int(pk)
+
+
+class RecordBreakdownMixin(object):
+    """
+        Adds the first page of the open and of the closed records of the
+        object to the context of a detail view, latest first.  The following
+        pages are rendered on their own, with the record_page template, when
+        the state (open or closed) and the cursor after the last record
+        shown (after) are given.  Pages are found through the start time
+        index, so they cost the same however many records there are.  The
+        view sets the project of the object as self.project.
+    """
+    records_paginate_by = 25
+    record_page_template_name = 'time_tracking/record_page.html'
+
+    def get_template_names(self):
+        """
+            Render only the page of records when one is asked for.
+        """
+        if 'state' in self.request.GET:
+            return [self.record_page_template_name]
+        return super(RecordBreakdownMixin, self).get_template_names()
+
+    def get_record_page(self, state, after=None):
+        """
+            Return the records (as RecordRow objects) of the state that
+            were started before the cursor, and the url of the next page if
+            there is one.
+        """
+        records = self.object.record_set.order_by('-start_time', '-pk')
+        if state == 'open':
+            records = records.filter(end_time=None)
+        elif state == 'closed':
+            records = records.exclude(end_time=None)
+        else:
+            raise Http404
+
+        if after:
+            try:
+                start_time, pk = decode_cursor(after)
+            except ValueError:
+                raise Http404
+            records = records.filter(Q(start_time__lt=start_time) |
+                Q(start_time=start_time, pk__lt=pk))
+
+        project_slug = self.project.slug
+        rows = [RecordRow(project_slug, values) for values in
+            records.values_list(*RecordRow.FIELDS)[
+            :self.records_paginate_by + 1]]
+        more = len(rows) > self.records_paginate_by
+        rows = rows[:self.records_paginate_by]
+
+        next_url = None
+        if more:
+            next_url = '%s?state=%s&after=%s' % (self.request.path, state,
+                encode_cursor(rows[-1].start_time, rows[-1].pk))
+
+        return {'records': rows, 'next_url': next_url}
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding additional context for:
+                Open Records - first page of the records that do not have an
+                               end time
+                Closed Records - first page of the records that have an end
+                                 time
+            or only the page of records asked for.
+        """
+        context = super(RecordBreakdownMixin, self).get_context_data(**kwargs)
+
+        if 'state' in self.request.GET:
+            context['page'] = self.get_record_page(self.request.GET['state'],
+                self.request.GET.get('after'))
+        else:
+            context['open_records'] = self.get_record_page('open')
+            context['closed_records'] = self.get_record_page('closed')
+
+        return context
@@ -21,11 +21,16 @@ from django.views.generic import CreateView, DetailView, DeleteView, UpdateView
 from django.views.generic import ListView
 from django.template.defaultfilters import slugify
 from django.core.urlresolvers import reverse
+from django.http import HttpResponseRedirect, Http404
+from django.db.models import Sum
+import datetime
 
 from django.shortcuts import get_object_or_404
 
 from time_tracking.views.forms import ProjectForm
-from time_tracking.models import Project, Record, Category, Location
+from time_tracking.models import Project, Record, Category
+from time_tracking.rows import RecordRows
+from time_tracking import jobs
 
 
 class ProjectListView(ListView):
@@ -34,13 +39,15 @@ class ProjectListView(ListView):
     """
 
     model = Project
-    context_object_name = 'active_projects'
+    context_object_name = 'projects'
 
     def get_queryset(self):
         """
-            Return the list of active projects to display.
+            Return the list of active projects to display, along with the
+            totals of their records.
         """
-        return Project.objects.filter(template=False, owner=self.request.user)
+        return Project.objects.with_totals().filter(template=False,
+            owner=self.request.user, deleting=False)
 
     def get_context_data(self, **kwargs):
         """
@@ -50,7 +57,7 @@ class ProjectListView(ListView):
         context = super(ProjectListView, self).get_context_data(**kwargs)
 
         deactive_projects = Project.objects.filter(template=True,
-            owner=self.request.user)
+            owner=self.request.user, deleting=False)
 
         context['templates'] = deactive_projects
 
@@ -169,7 +176,9 @@ class ProjectEditView(UpdateView):
 
 class ProjectDeleteView(DeleteView):
     """
-        Deletes a project.
+        Deletes a project.  As the records of the project are deleted along
+        with it, the project is only hidden here and the deletion itself is
+        handed to a job.  The user is sent to the status page of that job.
     """
     model = Project
     slug_url_kwarg = 'project_slug'
@@ -197,6 +206,17 @@ class ProjectDeleteView(DeleteView):
         """
         return Project.objects.filter(owner=self.owner)
 
+    def delete(self, request, *args, **kwargs):
+        """
+            Enqueue the deletion of the project instead of deleting it within
+            the request.
+        """
+        self.object = self.get_object()
+        self.object.mark_deleting()
+        job = jobs.enqueue('delete_project', owner=request.user,
+            project_id=self.object.pk)
+        return HttpResponseRedirect(job.get_absolute_url())
+
     def get_success_url(self):
         return reverse('project_list_view')
     
@@ -236,6 +256,7 @@ class ProjectCopyView(CreateView):
             new_category = Category()
             new_category.name = category.name
             new_category.slug = category.slug
+            new_category.hourly_rate = category.hourly_rate
             new_category.project = self.object
             new_category.save()
 
@@ -291,9 +312,11 @@ class ProjectDetailView(DetailView):
     def get_queryset(self):
         """
             Limiting the requests to only the objects that are owned by the
-            user that is making the request.
+            user that is making the request, along with their totals.
+            Projects that are being deleted are left out.
         """
-        return Project.objects.filter(owner=self.request.user)
+        return Project.objects.with_totals().filter(owner=self.request.user,
+            deleting=False)
 
     def get_context_data(self, **kwargs):
         """
@@ -303,7 +326,8 @@ class ProjectDetailView(DetailView):
         """
         context = super(ProjectDetailView, self).get_context_data(**kwargs)
 
-        ## Need to fetch the records that are associated with this project.
+        ## Need to fetch the records that are associated with this project,
+        ## they are listed as lean rows read in chunks while rendering.
         open_records = Record.objects.filter(project=self.object,
             end_time=None)
 
@@ -312,23 +336,68 @@ class ProjectDetailView(DetailView):
         ).exclude(
             end_time=None)
 
-        context['closed_records'] = closed_records
-        context['open_records'] = open_records
+        context['closed_records'] = RecordRows(closed_records,
+            self.object.slug)
+        context['open_records'] = RecordRows(open_records, self.object.slug)
         context['project_overview'] = True
-        context['locations'] = Location.objects.filter(project=self.object)
         
+        category_totals = list(closed_records.order_by().values(
+            'category').annotate(total=Sum('duration_seconds')))
+        category_objects = Category.objects.in_bulk([total['category']
+            for total in category_totals if total['category'] is not None])
+
         categories = {}
-        for record in closed_records:
-            record_duration = (record.end_time-record.start_time).total_seconds()
-            if record.category in categories:
-                categories[record.category] += record_duration
-            else:
-                categories[record.category] = record_duration
-                
+        for total in category_totals:
+            category = category_objects.get(total['category'])
+            categories[category] = total['total'] or 0
+
         context['categories'] = categories
 
         return context
 
 
+class ProjectDayView(DetailView):
+    """
+        Shows the records of a project that were started on a day, in the
+        time zone they were started in, along with the total for the day.
+    """
 
+    model = Project
+    slug_url_kwarg = 'project_slug'
+    template_name = 'time_tracking/project_day.html'
 
+    def get_queryset(self):
+        """
+            Limiting the requests to only the objects that are owned by the
+            user that is making the request, except for the ones that are
+            being deleted.
+        """
+        return Project.objects.filter(owner=self.request.user,
+            deleting=False)
+
+    def get_context_data(self, **kwargs):
+        """
+            Adding the records of the day, found by the indexed start_date.
+        """
+        context = super(ProjectDayView, self).get_context_data(**kwargs)
+
+        try:
+            day = datetime.datetime.strptime(self.kwargs['day'],
+                '%Y-%m-%d').date()
+        except ValueError:
+            raise Http404
+
+        records = Record.objects.filter(project=self.object, start_date=day)
+
+        context['day'] = day
+        context['records'] = RecordRows(records, self.object.slug)
+        context['total_seconds'] = records.aggregate(
+            total=Sum('duration_seconds'))['total'] or 0
+        context['previous_day_url'] = reverse('project_day_view',
+            kwargs={'project_slug': self.object.slug,
+                    'day': (day - datetime.timedelta(days=1)).isoformat()})
+        context['next_day_url'] = reverse('project_day_view',
+            kwargs={'project_slug': self.object.slug,
+                    'day': (day + datetime.timedelta(days=1)).isoformat()})
+
+        return context
@@ -18,9 +18,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from django.views.generic import CreateView, DeleteView, UpdateView
-from django.views.generic import View
+from django.views.generic import View, TemplateView
+from django.core.urlresolvers import reverse
 from django.views.generic.detail import SingleObjectMixin
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseBadRequest
+import json
 import pytz
 
 from django.shortcuts import get_object_or_404
@@ -28,11 +31,27 @@ from django.shortcuts import get_object_or_404
 from time_tracking.views.forms import RecordEditForm
 from time_tracking.views.forms import convert_time, RecordCreateForm
 from time_tracking.views.project import ProjectDetailView
-from time_tracking.models import Project, Record, Category, Location
+from time_tracking.models import Project, Record
+from time_tracking.models import DescriptionSuggestion
+from time_tracking.caching import CachedModelChoiceField
 
 from django.utils import timezone
 
 
+def add_description_suggestions(form, project):
+    """
+        Point the brief description field of the record form at the
+        autocomplete endpoint and the suggestion list of the project.
+    """
+    form.fields['brief_description'].widget.attrs.update({
+        'list': 'brief_description_suggestions',
+        'autocomplete': 'off',
+        'data-autocomplete-url': project.get_description_autocomplete_url(),
+    })
+    form.description_suggestions = DescriptionSuggestion.objects.suggest(
+        project)
+
+
 class RecordCreateView(CreateView):
     """
         Overrideing the create view in order to store and retrieve the context
@@ -71,14 +90,14 @@ class RecordCreateView(CreateView):
         """
             Returns an instance of the form to be used in this view.  Overriden
             to limit the categories that are going to be used to the ones that
-            are allowed in the currently edited project.
+            are allowed in the currently edited project, listed from the
+            cache.
         """
         form = super(RecordCreateView, self).get_form(form_class)
 
-        form.fields['category'].queryset = Category.objects.filter(
-            project=self.project)
-        form.fields['location'].queryset = Location.objects.filter(
-            project=self.project)
+        CachedModelChoiceField.replace(form, 'category', self.project.pk)
+        CachedModelChoiceField.replace(form, 'location', self.project.pk)
+        add_description_suggestions(form, self.project)
 
         return form
 
@@ -160,10 +179,9 @@ class RecordEditView(UpdateView):
         """
         form = super(RecordEditView, self).get_form(form_class)
 
-        form.fields['category'].queryset = Category.objects.filter(
-            project=self.project)
-        form.fields['location'].queryset = Location.objects.filter(
-            project=self.project)
+        CachedModelChoiceField.replace(form, 'category', self.project.pk)
+        CachedModelChoiceField.replace(form, 'location', self.project.pk)
+        add_description_suggestions(form, self.project)
 
         return form
 
@@ -303,3 +321,83 @@ class RecordCloseView(View, SingleObjectMixin):
             owner=self.owner)
 
         return self.close(request, *args, **kwargs)
+
+
+class RecordAutocompleteView(View):
+    """
+        Returns the brief descriptions previously used in the project that
+        start with the q parameter as a JSON list, most frequently used first.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+            Look the suggestions up in the frequency table of the project.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+        except ValueError:
+            return HttpResponseBadRequest('limit must be a number')
+
+        suggestions = DescriptionSuggestion.objects.suggest(self.project,
+            request.GET.get('q', ''), limit)
+
+        return HttpResponse(json.dumps(suggestions),
+            content_type='application/json')
+
+
+class RunningRecordsView(TemplateView):
+    """
+        Lists the open records of all of the projects of the user along with
+        the time that has elapsed since they were started.  Fetched with a
+        single query, so the JSON version (format=json) can be polled.
+    """
+    template_name = 'time_tracking/running_records.html'
+
+    def get_records(self):
+        """
+            Return the open records of the user as dictionaries.
+        """
+        now = timezone.now()
+        records = Record.objects.filter(
+            project__owner=self.request.user,
+            project__deleting=False,
+            end_time=None
+        ).order_by('start_time').values('pk', 'brief_description',
+            'start_time', 'project__name', 'project__slug', 'category__name')
+
+        running = []
+        for record in records:
+            kwargs = {'project_slug': record['project__slug'],
+                      'pk': record['pk']}
+            running.append({
+                'id': record['pk'],
+                'brief_description': record['brief_description'],
+                'start_time': record['start_time'],
+                'elapsed_seconds': max(0, int(
+                    (now - record['start_time']).total_seconds())),
+                'project': record['project__name'],
+                'project_slug': record['project__slug'],
+                'category': record['category__name'],
+                'close_url': reverse('record_close_view', kwargs=kwargs),
+                'edit_url': reverse('record_edit_view', kwargs=kwargs),
+            })
+        return running
+
+    def get(self, request, *args, **kwargs):
+        """
+            Render the open records, as JSON when it has been asked for.
+        """
+        records = self.get_records()
+
+        if request.GET.get('format') == 'json':
+            for record in records:
+                record['start_time'] = record['start_time'].isoformat()
+            return HttpResponse(json.dumps(records),
+                content_type='application/json')
+
+        return self.render_to_response(self.get_context_data(
+            records=records))
@@ -0,0 +1,205 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import TemplateView
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.encoding import force_str
+from django.utils import timezone
+from django.db import router
+from decimal import Decimal
+import csv
+import json
+
+from time_tracking.views.forms import BillingReportForm, GapReportForm
+from time_tracking.models import Project, Record
+from time_tracking.billing import BillingReport
+from time_tracking.gaps import user_intervals, find_gaps, daily_gap_totals
+
+## Markers of billing_report.html where the streamed parts go.
+LINES_MARKER = '<!-- billing report lines -->'
+TOTALS_MARKER = '<!-- billing report totals -->'
+
+HOUR = Decimal('0.0001')
+
+
+def hours(seconds):
+    """
+        Seconds as a decimal number of hours.
+    """
+    if seconds is None:
+        return ''
+    return (Decimal(seconds) / 3600).quantize(HOUR)
+
+
+class Echo(object):
+    """
+        File-like object handing back what is written to it, so that the csv
+        writer can produce the rows one at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+class BillingReportView(TemplateView):
+    """
+        Billing report of a project for a period, as HTML or as CSV
+        (format=csv).  The report is streamed while the records are read, so
+        large periods are produced with bounded memory.
+    """
+    template_name = 'time_tracking/billing_report.html'
+    lines_per_chunk = 200
+
+    def get(self, request, *args, **kwargs):
+        """
+            Show the report form, and the report once it is valid.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+
+        form = BillingReportForm(request.GET or None)
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form,
+                project=self.project))
+
+        report = BillingReport(self.project,
+            form.cleaned_data['first_day'], form.cleaned_data['last_day'],
+            rounding=form.cleaned_data['rounding'],
+            increment=form.cleaned_data['increment'] * 60,
+            using=router.db_for_read(Record))
+
+        if request.GET.get('format') == 'csv':
+            response = StreamingHttpResponse(self.csv_rows(report),
+                content_type='text/csv')
+            response['Content-Disposition'] = (
+                'attachment; filename="%s-%s-%s.csv"' % (self.project.slug,
+                    report.first_day.isoformat(), report.last_day.isoformat()))
+            return response
+
+        response = self.render_to_response(self.get_context_data(form=form,
+            project=self.project, report=report,
+            csv_query=request.GET.copy().urlencode()))
+        page = response.rendered_content
+        return StreamingHttpResponse(self.html_chunks(report, page),
+            content_type=response['Content-Type'])
+
+    def html_chunks(self, report, page):
+        """
+            Yield the rendered page, with the lines of the report and then its
+            totals rendered in chunks in place of the markers.
+        """
+        head, rest = page.split(LINES_MARKER, 1)
+        middle, tail = rest.split(TOTALS_MARKER, 1)
+        yield head
+
+        lines = []
+        for line in report.lines():
+            lines.append(line)
+            if len(lines) >= self.lines_per_chunk:
+                yield render_to_string('time_tracking/billing_lines.html',
+                    {'lines': lines})
+                lines = []
+        if lines:
+            yield render_to_string('time_tracking/billing_lines.html',
+                {'lines': lines})
+
+        yield middle
+        yield render_to_string('time_tracking/billing_totals.html',
+            {'report': report})
+        yield tail
+
+    def csv_rows(self, report):
+        """
+            Yield the lines of the report and then its totals as CSV rows.
+        """
+        writer = csv.writer(Echo())
+
+        def row(values):
+            return writer.writerow([force_str(value) for value in values])
+
+        yield row(['line', 'day', 'start', 'end', 'category', 'description',
+            'tracked_hours', 'billed_hours', 'rate', 'amount'])
+
+        for line in report.lines():
+            if line['type'] == 'record':
+                yield row(['record', line['day'], line['start_time'],
+                    line['end_time'], line['category'], line['description'],
+                    hours(line['tracked_seconds']),
+                    hours(line['billed_seconds']), '', ''])
+            else:
+                yield row(['day', line['day'], '', '', line['category'], '',
+                    hours(line['tracked_seconds']),
+                    hours(line['billed_seconds']), line['rate'],
+                    line['amount']])
+
+        for line in report.sorted_subtotals():
+            yield row(['category', '', '', '', line['category'], '',
+                hours(line['tracked_seconds']),
+                hours(line['billed_seconds']), line['rate'], line['amount']])
+
+        yield row(['total', '', '', '', '', '',
+            hours(report.total['tracked_seconds']),
+            hours(report.total['billed_seconds']), '',
+            report.total['amount']])
+
+
+class GapReportView(TemplateView):
+    """
+        Untracked time between the records of the days of a period, across
+        all of the projects of the user, as a list of gaps and as daily
+        totals.  Days are the ones of the current time zone.  JSON is
+        returned when format=json.
+    """
+    template_name = 'time_tracking/gap_report.html'
+
+    def get(self, request, *args, **kwargs):
+        """
+            Show the report form, and the gaps once it is valid.
+        """
+        form = GapReportForm(request.GET or None)
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form))
+
+        first_day = form.cleaned_data['first_day']
+        last_day = form.cleaned_data['last_day']
+        time_zone = timezone.get_current_timezone()
+
+        gaps = list(find_gaps(user_intervals(request.user, first_day,
+            last_day, time_zone), first_day, last_day, time_zone,
+            min_seconds=form.cleaned_data['min_minutes'] * 60))
+        totals = daily_gap_totals(gaps, time_zone)
+
+        if request.GET.get('format') == 'json':
+            return HttpResponse(json.dumps({
+                'gaps': [{'start': start.isoformat(), 'end': end.isoformat(),
+                          'seconds': int((end - start).total_seconds())}
+                         for start, end in gaps],
+                'days': [{'day': day.isoformat(), 'seconds': seconds}
+                         for day, seconds in totals],
+            }), content_type='application/json')
+
+        return self.render_to_response(self.get_context_data(form=form,
+            gaps=[{'start': start, 'end': end,
+                   'seconds': int((end - start).total_seconds())}
+                  for start, end in gaps],
+            days=totals, report=True))
+
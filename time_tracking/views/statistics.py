@@ -0,0 +1,95 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import TemplateView
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+import json
+
+from time_tracking.models import Project, Category, Location, DurationBucket
+
+## Quantiles of the durations that are shown.
+QUANTILES = (('median', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+def duration_statistics(sketch):
+    """
+        Count, quantiles and histogram of the durations in the sketch.
+    """
+    statistics = {'count': sketch.count, 'histogram': []}
+    for name, q in QUANTILES:
+        value = sketch.quantile(q)
+        statistics[name] = None if value is None else int(round(value))
+
+    count = sketch.count
+    for lower, upper, bin_count in sketch.histogram():
+        statistics['histogram'].append({
+            'lower': lower, 'upper': upper, 'count': bin_count,
+            'percent': 100.0 * bin_count / count if count else 0,
+        })
+
+    return statistics
+
+
+class DurationStatisticsView(TemplateView):
+    """
+        Median, 90th and 99th percentile and histogram of the durations of
+        the closed records of a project, of one of its categories or
+        locations, or of all of the projects of the user merged together.
+        Read from the duration sketches, never from the records.
+    """
+    template_name = 'time_tracking/duration_statistics.html'
+
+    def get_scope(self):
+        """
+            Return the projects, category and location of the statistics.
+        """
+        if 'project_slug' not in self.kwargs:
+            return list(Project.objects.filter(owner=self.request.user,
+                deleting=False).values_list('pk', flat=True)), None, None, None
+
+        project = get_object_or_404(Project,
+            slug=self.kwargs['project_slug'], owner=self.request.user)
+        category = location = None
+
+        if 'category_slug' in self.kwargs:
+            category = get_object_or_404(Category, project=project,
+                slug=self.kwargs['category_slug'])
+        elif 'location_slug' in self.kwargs:
+            location = get_object_or_404(Location, project=project,
+                slug=self.kwargs['location_slug'])
+
+        return [project.pk], project, category, location
+
+    def get(self, request, *args, **kwargs):
+        """
+            Render the statistics, as JSON when it has been asked for.
+        """
+        projects, project, category, location = self.get_scope()
+
+        statistics = duration_statistics(DurationBucket.objects.sketch(
+            projects, category=category, location=location))
+
+        if request.GET.get('format') == 'json':
+            return HttpResponse(json.dumps(statistics),
+                content_type='application/json')
+
+        return self.render_to_response(self.get_context_data(
+            project=project, category=category, location=location,
+            statistics=statistics))
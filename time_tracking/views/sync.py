@@ -0,0 +1,156 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import View
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.middleware.csrf import get_token
+from django.utils.encoding import force_text
+import json
+
+from time_tracking.models import Project, Record, Change, ChangeEncoder
+from time_tracking.models import field_values
+from time_tracking.sync import sync_batch, SYNC_BATCH_SIZE
+from time_tracking.views.forms import SyncRecordForm
+
+
+def json_response(data):
+    return HttpResponse(json.dumps(data, cls=ChangeEncoder),
+        content_type='application/json')
+
+
+class SyncView(View):
+    """
+        Delta sync of the projects, categories, locations and records of the
+        user for offline clients.
+
+        GET returns the next batch for the token parameter: the objects that
+        changed since the token with their values and sequence number, the
+        ids of the ones that were deleted, and the token to ask for the next
+        batch with (more tells whether there is one already).  Without a
+        token a snapshot of all of the objects is sent first.
+
+        POST takes the records edited on the client back, as a JSON object
+        holding a list of records.  Each one has the id of the record (none
+        for new ones, which carry a client_id to be told their id with),
+        the sequence number of the version it was edited from, the changed
+        values by column name or deleted.  A record that has changed on the
+        server since that version is a conflict and is answered with its
+        current values instead of being saved.  Like every POST, it needs
+        the CSRF token, which GET sets as a cookie.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+            Return the next batch of changes.
+        """
+        try:
+            batch = sync_batch(request.user, request.GET.get('token'))
+        except ValueError:
+            return HttpResponseBadRequest('invalid sync token')
+
+        get_token(request)
+        return json_response(batch)
+
+    def post(self, request, *args, **kwargs):
+        """
+            Apply the edited records, each one on its own.
+        """
+        try:
+            edits = json.loads(request.body.decode('utf-8'))['records']
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest('records expected')
+        if not isinstance(edits, list) or len(edits) > SYNC_BATCH_SIZE:
+            return HttpResponseBadRequest('at most %d records expected' %
+                SYNC_BATCH_SIZE)
+
+        results = []
+        for edit in edits:
+            if not isinstance(edit, dict):
+                return HttpResponseBadRequest('records expected')
+            with transaction.commit_on_success():
+                results.append(self.apply(edit))
+
+        return json_response({'results': results})
+
+    def current(self, record):
+        """
+            The values of the record and its sequence number.
+        """
+        values = field_values(record)
+        values['sequence'] = Change.objects.latest_sequences('record',
+            [record.pk]).get(record.pk, 0)
+        return values
+
+    def apply(self, edit):
+        """
+            Create, update or delete a record as the client asks and return
+            the outcome.
+        """
+        result = {'client_id': edit.get('client_id'), 'id': edit.get('id')}
+        values = edit.get('data') or {}
+
+        if edit.get('id') is None:
+            try:
+                project = Project.objects.get(pk=values.get('project_id'),
+                    owner=self.request.user, deleting=False)
+            except (Project.DoesNotExist, ValueError, TypeError):
+                result.update(status='invalid',
+                    errors={'project_id': ['Unknown project']})
+                return result
+            record = Record(project=project)
+        else:
+            try:
+                record = Record.objects.select_for_update().select_related(
+                    'project').get(pk=edit['id'],
+                    project__owner=self.request.user,
+                    project__deleting=False)
+            except (Record.DoesNotExist, ValueError, TypeError):
+                result.update(status='conflict', current=None)
+                return result
+
+            current = self.current(record)
+            if current['sequence'] != edit.get('sequence'):
+                result.update(status='conflict', current=current)
+                return result
+
+            if edit.get('deleted'):
+                record.delete()
+                result['status'] = 'deleted'
+                return result
+
+        data = {}
+        for name in SyncRecordForm._meta.fields:
+            column = name + '_id' if name in ('category', 'location') else name
+            if column in values:
+                data[name] = values[column]
+            elif record.pk is not None:
+                data[name] = getattr(record, column)
+
+        form = SyncRecordForm(record.project, data, instance=record)
+        if not form.is_valid():
+            result.update(status='invalid', errors=dict((name,
+                [force_text(error) for error in errors])
+                for name, errors in form.errors.items()))
+            return result
+
+        record = form.save()
+        result.update(status='saved', id=record.pk,
+            sequence=self.current(record)['sequence'])
+        return result
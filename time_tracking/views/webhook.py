@@ -0,0 +1,126 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.views.generic import CreateView, DeleteView, ListView
+from django.shortcuts import get_object_or_404
+
+from time_tracking.views.forms import WebhookForm
+from time_tracking.models import Project, Webhook
+
+
+class WebhookListView(ListView):
+    """
+        Lists the webhooks of a project.
+    """
+    model = Webhook
+    context_object_name = 'webhooks'
+
+    def get(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view when the get
+            is called.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(WebhookListView, self).get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """
+            Limiting the webhooks to the ones of the project.
+        """
+        return Webhook.objects.filter(project=self.project)
+
+    def get_context_data(self, **kwargs):
+        context = super(WebhookListView, self).get_context_data(**kwargs)
+
+        for webhook in context['webhooks']:
+            webhook.project = self.project
+        context['project'] = self.project
+
+        return context
+
+
+class WebhookCreateView(CreateView):
+    """
+        Adds a webhook to a project.
+    """
+    form_class = WebhookForm
+    model = Webhook
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(WebhookCreateView, self).dispatch(request, *args,
+            **kwargs)
+
+    def form_valid(self, form):
+        """
+            Assigning the webhook to the project.
+        """
+        form.instance.project = self.project
+        return super(WebhookCreateView, self).form_valid(form)
+
+    def get_success_url(self):
+        return self.project.get_webhook_list_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(WebhookCreateView, self).get_context_data(**kwargs)
+
+        context['project'] = self.project
+        context['command'] = 'Add'
+
+        return context
+
+
+class WebhookDeleteView(DeleteView):
+    """
+        Deletes a webhook of a project.
+    """
+    model = Webhook
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+            Adding the project object to the base of this view.
+        """
+        self.project = get_object_or_404(Project,
+            slug=self.kwargs.get('project_slug', None),
+            owner=request.user)
+        return super(WebhookDeleteView, self).dispatch(request, *args,
+            **kwargs)
+
+    def get_queryset(self):
+        """
+            Limiting the webhooks to the ones of the project.
+        """
+        return Webhook.objects.filter(project=self.project)
+
+    def get_success_url(self):
+        return self.project.get_webhook_list_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(WebhookDeleteView, self).get_context_data(**kwargs)
+
+        context['project'] = self.project
+
+        return context
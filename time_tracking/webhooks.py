@@ -0,0 +1,382 @@
+"""
+time_tracking provides time tracking capabilities to be used in the
+django framework.
+Copyright (C) 2013 Robert Robinson rerobins@meerkatlabs.org
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+import binascii
+import hashlib
+import hmac
+import logging
+import socket
+import threading
+import time
+
+try:
+    from http import client as http_client
+    from urllib.parse import urlsplit
+except ImportError:
+    import httplib as http_client
+    from urlparse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+CLOSED = 'closed'
+DELETED = 'deleted'
+
+SIGNATURE_HEADER = 'X-Time-Tracking-Signature'
+
+## Networks (address, prefix length) that webhooks may not be posted to:
+## this host, private, shared, link local (cloud metadata), multicast and
+## reserved addresses.
+BLOCKED_IPV4 = (
+    ('0.0.0.0', 8), ('10.0.0.0', 8), ('100.64.0.0', 10), ('127.0.0.0', 8),
+    ('169.254.0.0', 16), ('172.16.0.0', 12), ('192.0.0.0', 24),
+    ('192.168.0.0', 16), ('198.18.0.0', 15), ('224.0.0.0', 3),
+)
+BLOCKED_IPV6 = (
+    ('fc00::', 7), ('fe80::', 10), ('ff00::', 8),
+)
+## IPv6 networks embedding an IPv4 address in their last 32 bits, :: and
+## ::1 included.
+IPV4_IN_IPV6 = (('::ffff:0:0', 96), ('64:ff9b::', 96), ('::', 96))
+
+
+def setting(name, default):
+    return getattr(settings, 'TIME_TRACKING_WEBHOOK_%s' % name, default)
+
+
+def address_number(family, address):
+    return int(binascii.hexlify(socket.inet_pton(family, address)), 16)
+
+
+def in_networks(family, number, networks, bits):
+    for network, prefix in networks:
+        shift = bits - prefix
+        if number >> shift == address_number(family, network) >> shift:
+            return True
+    return False
+
+
+def is_public_address(address):
+    """
+        True unless the IPv4 or IPv6 address belongs to this host, a private
+        network or one of the other blocked networks.
+    """
+    try:
+        number = address_number(socket.AF_INET, address)
+    except (socket.error, ValueError):
+        number = address_number(socket.AF_INET6, address.split('%')[0])
+        if in_networks(socket.AF_INET6, number, IPV4_IN_IPV6, 128):
+            number &= 0xffffffff
+            if not number:
+                return False
+        else:
+            return not in_networks(socket.AF_INET6, number, BLOCKED_IPV6,
+                                   128)
+    return not in_networks(socket.AF_INET, number, BLOCKED_IPV4, 32)
+
+
+def resolve(url):
+    """
+        Return the scheme, host, port and path of the webhook url along with
+        the address to connect to.  Raise ValueError when it isn't an http
+        url or when its host resolves to an address that isn't public,
+        unless settings.TIME_TRACKING_WEBHOOK_ALLOW_PRIVATE is set.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('Only http and https urls are allowed')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(
+            parts.hostname, port, 0, socket.SOCK_STREAM)]
+    except socket.error:
+        raise ValueError('The host can not be resolved')
+    if not setting('ALLOW_PRIVATE', False):
+        for address in addresses:
+            if not is_public_address(address):
+                raise ValueError('The host is not a public address')
+
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return parts.scheme, parts.hostname, port, path, addresses[0]
+
+
+def sign(secret, body):
+    """
+        Value of the signature header of the body: its HMAC-SHA256 with the
+        secret of the webhook.
+    """
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body,
+        hashlib.sha256).hexdigest()
+
+
+class PinnedHTTPConnection(http_client.HTTPConnection):
+    """
+        Connection to the address that was checked, whatever the host
+        resolves to by then.
+    """
+
+    def __init__(self, host, port, address, timeout):
+        http_client.HTTPConnection.__init__(self, host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port),
+            self.timeout)
+
+
+class PinnedHTTPSConnection(http_client.HTTPSConnection):
+    """
+        TLS version of PinnedHTTPConnection, the certificate is checked
+        against the host.
+    """
+
+    def __init__(self, host, port, address, timeout):
+        http_client.HTTPSConnection.__init__(self, host, port,
+            timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port),
+            self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def post(url, secret, body):
+    """
+        Post the body to the webhook, signed with its secret.  Raise an
+        exception when it fails.
+    """
+    scheme, host, port, path, address = resolve(url)
+    connection_class = (PinnedHTTPSConnection if scheme == 'https'
+                        else PinnedHTTPConnection)
+    connection = connection_class(host, port, address,
+        setting('TIMEOUT', 10))
+    try:
+        connection.request('POST', path, body, {
+            'Content-Type': 'application/json',
+            SIGNATURE_HEADER: sign(secret, body),
+        })
+        response = connection.getresponse()
+        response.read()
+        if not 200 <= response.status < 300:
+            raise IOError('HTTP status %d' % response.status)
+    finally:
+        connection.close()
+
+
+class Endpoint(object):
+    """
+        Events waiting to be delivered to a webhook, coalesced per object,
+        and the thread delivering them.  The thread posts a batch when it is
+        full or its oldest event has waited for long enough, and retries a
+        failed batch with an exponential backoff.  It stops once it has been
+        idle for a while.
+    """
+
+    def __init__(self, dispatcher, url, secret):
+        self.dispatcher = dispatcher
+        self.url = url
+        self.secret = secret
+        self.condition = threading.Condition()
+        self.events = OrderedDict()
+        self.since = None
+        self.batch = None
+        self.attempts = 0
+        self.retry_at = None
+
+    def start(self):
+        thread = threading.Thread(target=self.work,
+            name='time_tracking-webhook')
+        thread.daemon = True
+        thread.start()
+
+    def add(self, key, action, payload):
+        """
+            Add the event of the object, merging it with the ones that are
+            already waiting, all of which carry the latest payload: updates
+            are folded into the created and closed events, so an object
+            that is created and closed within the batch gets both, and an
+            object created within the batch is left out altogether when it
+            is deleted again.
+        """
+        with self.condition:
+            if not self.events:
+                self.since = time.time()
+
+            previous = [event[0] for event in self.events.pop(key, ())]
+            if action == DELETED:
+                if CREATED in previous:
+                    return
+                actions = [DELETED]
+            else:
+                actions = [kept for kept in (CREATED, CLOSED)
+                           if kept in previous or kept == action] or [action]
+            self.events[key] = [(kept, payload) for kept in actions]
+            self.condition.notify()
+
+    def next_due(self):
+        """
+            When the next batch is to be posted, None when there is none.
+        """
+        if self.batch is not None:
+            return self.retry_at
+        if not self.events:
+            return None
+        if len(self.events) >= setting('BATCH_SIZE', 100):
+            return self.since
+        return self.since + setting('BATCH_SECONDS', 1)
+
+    def take_batch(self):
+        """
+            Move the events that are waiting, up to the batch size, to the
+            batch that is delivered next.
+        """
+        size = setting('BATCH_SIZE', 100)
+        self.batch = []
+        for key in list(self.events):
+            if self.batch and len(self.batch) + len(self.events[key]) > size:
+                break
+            self.batch.extend(self.events.pop(key))
+        self.since = time.time()
+        self.attempts = 0
+
+    def body(self):
+        """
+            JSON body of the batch, the payloads are JSON already.
+        """
+        return ('{"events": [%s]}' % ', '.join(
+            '{"event": "%s", "data": %s}' % (action, payload)
+            for action, payload in self.batch)).encode('utf-8')
+
+    def wait(self):
+        """
+            Wait until there is a batch to post and return its body, None
+            when the thread stops.
+        """
+        idle_seconds = setting('IDLE_SECONDS', 60)
+        while True:
+            with self.condition:
+                idle_since = time.time()
+                while True:
+                    now = time.time()
+                    due = self.next_due()
+                    if due is not None and due <= now:
+                        if self.batch is None:
+                            self.take_batch()
+                        return self.body()
+                    if due is None and now - idle_since >= idle_seconds:
+                        break
+                    if due is None:
+                        self.condition.wait(idle_since + idle_seconds - now)
+                    else:
+                        idle_since = now
+                        self.condition.wait(due - now)
+            if self.dispatcher.retire(self):
+                return None
+
+    def delivered(self, error):
+        """
+            Forget the batch once it has been posted, or schedule a retry.
+        """
+        with self.condition:
+            if error is None:
+                self.batch = None
+                return
+
+            self.attempts += 1
+            if self.attempts > setting('RETRIES', 5):
+                logger.error('Dropped %d webhook events for %s: %s',
+                    len(self.batch), self.url, error)
+                self.batch = None
+            else:
+                delay = setting('RETRY_SECONDS', 2) * 2 ** (self.attempts - 1)
+                self.retry_at = time.time() + delay
+                logger.warning('Webhook %s failed (%s), retrying in %s s',
+                    self.url, error, delay)
+
+    def work(self):
+        """
+            Main loop of the thread.
+        """
+        while True:
+            body = self.wait()
+            if body is None:
+                return
+            try:
+                post(self.url, self.secret, body)
+            except ValueError as error:
+                logger.error('Dropped webhook events for %s: %s', self.url,
+                    error)
+                with self.condition:
+                    self.batch = None
+            except Exception as error:
+                self.delivered(error)
+            else:
+                self.delivered(None)
+
+
+class WebhookDispatcher(object):
+    """
+        Delivers the record events to the webhooks.  send only adds the
+        event to the in memory queue of every webhook, so that the requests
+        never wait for a webhook.  Every webhook has a thread of its own,
+        so that a slow one doesn't hold the others up.  The events queued
+        when the process exits are lost.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def send(self, webhooks, key, action, payload):
+        """
+            Queue the event (action) of the object identified by key for the
+            webhooks, (url, secret) pairs, payload being the JSON of the
+            object.
+        """
+        for url, secret in webhooks:
+            with self.lock:
+                endpoint = self.endpoints.get((url, secret))
+                if endpoint is None:
+                    endpoint = Endpoint(self, url, secret)
+                    self.endpoints[(url, secret)] = endpoint
+                    endpoint.start()
+                endpoint.add(key, action, payload)
+
+    def retire(self, endpoint):
+        """
+            Forget the endpoint unless events were added to it meanwhile.
+            Called by its thread, which stops when this returns True.
+        """
+        with self.lock:
+            with endpoint.condition:
+                if endpoint.next_due() is not None:
+                    return False
+                del self.endpoints[(endpoint.url, endpoint.secret)]
+                return True
+
+
+dispatcher = WebhookDispatcher()